@@ -0,0 +1,30 @@
+"""
+Compare the time to load pages by the backends of digitizer.core.load_page
+
+    python benchmarks/bench_loader.py [pdf]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'digitizer'))
+import core
+
+
+def main(pdf):
+    print('{:>5} '.format('page') + ' '.join(
+        '{:>10} {:>12}'.format('paths', backend + ' [s]')
+        for backend in core.BACKENDS))
+    for page in range(core.n_pages(pdf)):
+        txt = []
+        for backend in core.BACKENDS:
+            t = time.perf_counter()
+            paths = core.load_page(pdf, page, backend=backend)
+            t = time.perf_counter() - t
+            txt.append('{:>10} {:>12.4f}'.format(len(paths.paths), t))
+        print('{:>5} '.format(page) + ' '.join(txt))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(__file__), '..', 'example_pdfs', '1908.10464.pdf'))
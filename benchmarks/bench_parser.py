@@ -0,0 +1,117 @@
+"""
+Compare the svg path-data parser in digitizer.core with the former
+split(' ')-based one.
+
+    python benchmarks/bench_parser.py [pdf]
+
+The former parser only understands space-separated path data, so both
+parsers are timed on the path data rewritten in that layout, and the
+current parser is also timed on the original (compact) data.
+"""
+import os
+import re
+import sys
+import time
+from xml.dom import minidom
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'digitizer'))
+import core
+
+
+def legacy_compute_abs_path(d, transform):
+    txts = d.strip().split(' ')
+
+    mode = 'M'
+    paths = []
+    coord = [0, 0]
+    idx = 0
+    for txt in txts:
+        if len(txt) == 1:
+            mode = txt
+        else:
+            if mode in 'MLCmlc':
+                if mode in 'MLC':
+                    coord[idx] = float(txt)
+                else:
+                    coord[idx] += float(txt)
+                if idx == 1:
+                    paths.append(np.array(coord))
+                    idx = 0
+                else:
+                    idx = 1
+            elif mode in 'zZ':
+                paths.append(np.array(paths[0]))
+                idx = 0
+            elif mode in 'hH':
+                if mode == 'H':
+                    coord[0] = float(txt)
+                else:
+                    coord[0] += float(txt)
+                paths.append(np.array(coord))
+                idx = 0
+            elif mode in 'vV':
+                if mode == 'V':
+                    coord[1] = float(txt)
+                else:
+                    coord[1] += float(txt)
+                paths.append(np.array(coord))
+                idx = 0
+    transform = transform[transform.find('matrix(') + 7:-1].split(',')
+    a, b, c, d, e, f = [float(t) for t in transform]
+    scale = np.array([[a, b], [c, d]])
+    offset = np.array([e, f])
+    return [scale @ path + offset for path in paths]
+
+
+_TOKEN = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+
+def spaced(d):
+    """ rewrite the path data in the space-separated layout """
+    return ' '.join(
+        t if t.isalpha() else '{:.6f}'.format(float(t))
+        for t in _TOKEN.findall(d))
+
+
+def legacy_compute_abs_paths(ds, transforms):
+    return [legacy_compute_abs_path(d, t) for d, t in zip(ds, transforms)]
+
+
+def timeit(func, items, repeat=3):
+    ds = [d for d, _ in items]
+    transforms = [t for _, t in items]
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func(ds, transforms)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main(pdf):
+    print('{:>5} {:>7} {:>12} {:>12} {:>12}'.format(
+        'page', 'paths', 'legacy [s]', 'new [s]', 'compact [s]'))
+    total = np.zeros(3)
+    for page in range(core.n_pages(pdf)):
+        doc = minidom.parseString(core._to_svg(pdf, page))
+        items = [
+            (path.getAttribute('d'), path.getAttribute('transform'))
+            for path in doc.getElementsByTagName('path')
+            if len(path.attributes.keys()) > 2]
+        items_spaced = [(spaced(d), t) for d, t in items]
+        times = np.array([
+            timeit(legacy_compute_abs_paths, items_spaced),
+            timeit(core._compute_abs_paths, items_spaced),
+            timeit(core._compute_abs_paths, items),
+        ])
+        total += times
+        print('{:>5} {:>7} {:>12.4f} {:>12.4f} {:>12.4f}'.format(
+            page, len(items), *times))
+    print('{:>5} {:>7} {:>12.4f} {:>12.4f} {:>12.4f}'.format(
+        'total', '', *total))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(__file__), '..', 'example_pdfs', '1908.10464.pdf'))
@@ -0,0 +1,268 @@
+"""
+Benchmarks of loading, querying, grouping and drawing pages, on the example
+pdfs and on synthetic pages with 1k to 1M paths.
+
+    python benchmarks/bench_suite.py -o results.json
+    python benchmarks/bench_suite.py --sizes 1000 10000 --no-pdf
+    python benchmarks/bench_suite.py --compare old.json new.json
+
+The results are written as json, with the best time of the repeats in
+seconds and the peak memory allocated by python and numpy in bytes for each
+benchmark, so that the results of two versions can be compared.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'digitizer'))
+import core
+
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#000000']
+
+
+def synthetic_svg(n_paths, seed=0, width=612, height=792):
+    """
+    An svg page in the form of PyMuPDF, with n_paths paths.
+    Half of them are square markers and the others are lines of 2 to 50
+    points, drawn in a few styles.
+    """
+    rng = np.random.default_rng(seed)
+    lines = [
+        '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+        'width="{0}pt" height="{1}pt" viewBox="0 0 {0} {1}">'.format(
+            width, height)]
+    transform = 'matrix(1,0,0,-1,0,{})'.format(height)
+    for i in range(n_paths):
+        color = COLORS[i % len(COLORS)]
+        x, y = rng.uniform(0, width), rng.uniform(0, height)
+        if i % 2 == 0:
+            d = 'M{:.3f} {:.3f}h3v3h-3Z'.format(x, y)
+            style = 'fill="{}"'.format(color)
+        else:
+            steps = rng.normal(0, 3, size=(rng.integers(1, 50), 2))
+            d = 'M {:.3f} {:.3f} '.format(x, y) + ' '.join(
+                'l {:.3f} {:.3f}'.format(*step) for step in steps)
+            style = ('fill="none" stroke="{}" stroke-width="1" '
+                     'stroke-linecap="butt"'.format(color))
+        lines.append('<path transform="{}" d="{}" {}/>'.format(
+            transform, d, style))
+    lines.append('</svg>')
+    return '\n'.join(lines)
+
+
+def measure(func, repeat=3, memory=True):
+    """
+    The best time of repeat runs of func, and its peak memory
+    """
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    result = {'time': min(times)}
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def bench_paths(paths, svg, repeat, n_queries=None, seed=0):
+    """
+    Benchmarks on a loaded page.
+    n_queries: the number of the points queried. By default, it is
+        reduced for large pages.
+    """
+    if n_queries is None:
+        n_queries = int(np.clip(10**7 // max(len(paths.vertices), 1), 1, 100))
+    rng = np.random.default_rng(seed)
+    bbox = paths.bbox[np.isfinite(paths.bbox).all(axis=1)]
+    lower = paths._to_inch(bbox[:, :2].min(axis=0))
+    upper = paths._to_inch(bbox[:, 2:].max(axis=0))
+    points = rng.uniform(lower, upper, size=(n_queries, 2))
+    # a box around each point
+    boxes = points[:, np.newaxis] + rng.uniform(
+        -1, 1, size=(n_queries, 2, 2)) * 0.5 * (upper - lower)
+    selected = [paths.find_nearest(point) for point in points[:10]]
+    ds = [path.attributes['d'] for path in paths.paths]
+    transforms = [path.attributes['transform'] for path in paths.paths]
+    if any(d is None for d in ds):
+        ds = transforms = None
+
+    results = {}
+
+    def per_query(name, func, n, memory=True):
+        result = measure(func, repeat, memory)
+        result['time'] /= n
+        results[name] = result
+
+    per_query('find_nearest', lambda: [
+        paths.find_nearest(point) for point in points], n_queries)
+    per_query('find_inside', lambda: [
+        paths.find_inside(*box) for box in boxes], n_queries)
+    # the index is built at the first call
+    paths._style_index = None
+    results['group_first'] = measure(
+        lambda: paths.group(selected[0]), 1, memory=False)
+    per_query('group', lambda: [
+        paths.group(path) for path in selected], len(selected))
+    per_query('appended_svd', lambda: [
+        paths.appended_svd(path, svg0=svg) for path in selected],
+        len(selected))
+    per_query('overlay_svg', lambda: [
+        paths.overlay_svg(path) for path in selected], len(selected))
+    if ds is not None:
+        sample = list(range(0, len(ds), max(len(ds) // 1000, 1)))
+        per_query('compute_abs_path', lambda: [
+            core._compute_abs_path(ds[i], transforms[i]) for i in sample],
+            len(sample))
+        results['compute_abs_paths'] = measure(
+            lambda: core._compute_abs_paths(ds, transforms), repeat)
+    return results
+
+
+def bench_pdf(pdf, repeat):
+    """
+    Benchmarks on each page of pdf
+    """
+    results = []
+    for page in range(core.n_pages(pdf)):
+        result = {'name': '{}:{}'.format(os.path.basename(pdf), page)}
+
+        def to_svg():
+            core.clear_cache()
+            return core._to_svg(pdf, page)
+
+        result['to_svg'] = measure(to_svg, repeat)
+        svg = core._to_svg(pdf, page)
+        result['paths_svg'] = measure(lambda: core.Paths(svg), repeat)
+
+        def load_drawings():
+            core.clear_cache()
+            return core.load_page(pdf, page)
+
+        result['paths_drawings'] = measure(load_drawings, repeat)
+        paths = core.Paths(svg)
+        result['n_paths'] = len(paths.paths)
+        result['n_vertices'] = len(paths.vertices)
+        result.update(bench_paths(paths, svg, repeat))
+        results.append(result)
+        print_result(result)
+    return results
+
+
+def bench_synthetic(n_paths, repeat):
+    svg = synthetic_svg(n_paths)
+    result = {'name': 'synthetic:{}'.format(n_paths),
+              'svg_bytes': len(svg)}
+    result['paths_svg'] = measure(lambda: core.Paths(svg), repeat)
+    paths = core.Paths(svg)
+    result['n_paths'] = len(paths.paths)
+    result['n_vertices'] = len(paths.vertices)
+    result.update(bench_paths(paths, svg, repeat))
+    print_result(result)
+    return result
+
+
+def print_result(result):
+    print(result['name'], file=sys.stderr)
+    for key, value in result.items():
+        if isinstance(value, dict):
+            print('  {:<20} {:>12.3e} s {:>12} B'.format(
+                key, value['time'], value.get('peak_memory', '')),
+                file=sys.stderr)
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+            capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit, 'python': platform.python_version(),
+        'numpy': np.__version__, 'platform': platform.platform(),
+        'parser_version': core.PARSER_VERSION,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(old, new, threshold=1.2):
+    """
+    Print the ratios new / old of the times and peak memories, marking
+    those exceeding threshold. Returns the number of the marked ones.
+    """
+    old = {r['name']: r for r in old['results']}
+    n = 0
+    for result in new['results']:
+        if result['name'] not in old:
+            continue
+        print(result['name'])
+        for key, value in result.items():
+            before = old[result['name']].get(key)
+            if not isinstance(value, dict) or not isinstance(before, dict):
+                continue
+            for metric in ['time', 'peak_memory']:
+                if not before.get(metric) or metric not in value:
+                    continue
+                ratio = value[metric] / before[metric]
+                mark = ' <--' if ratio > threshold else ''
+                n += bool(mark)
+                print('  {:<20} {:<12} {:>8.2f}{}'.format(
+                    key, metric, ratio, mark))
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--pdf', nargs='*', default=None,
+                        help='pdf files. example_pdfs/* by default')
+    parser.add_argument('--no-pdf', action='store_true')
+    parser.add_argument('--sizes', type=int, nargs='*',
+                        default=[1000, 10000, 100000, 1000000],
+                        help='the numbers of paths of the synthetic pages')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-o', '--output', default=None,
+                        help='json file to write the results')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two results')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        return 1 if compare(old, new) else 0
+
+    results = []
+    if not args.no_pdf:
+        pdfs = args.pdf or sorted(
+            glob.glob(os.path.join(ROOT, 'example_pdfs', '*.pdf')))
+        for pdf in pdfs:
+            results.extend(bench_pdf(pdf, args.repeat))
+    for n_paths in args.sizes:
+        results.append(bench_synthetic(n_paths, args.repeat))
+
+    output = {'environment': environment(), 'results': results}
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=1)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=1)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,9 @@
-from . import gui
\ No newline at end of file
+import importlib
+
+
+def __getattr__(name):
+    # the gui requires Qt, which is not needed in the headless use
+    if name == 'gui':
+        return importlib.import_module('.gui', __name__)
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name))
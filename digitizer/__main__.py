@@ -0,0 +1,10 @@
+import sys
+
+try:
+    from .batch import main
+except ImportError:
+    from batch import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""
+Automatic calibration of the axes of a figure from its tick marks and their
+numeric labels.
+
+The ticks are the short segments perpendicular to an axis aligned in a row.
+The numbers in the page text next to them are joined to the ticks, and the
+linear or log mapping is fitted to the pairs.
+"""
+import collections
+import re
+import numpy as np
+
+try:
+    from . import core
+except ImportError:
+    import core
+
+
+Labels = collections.namedtuple('Labels', ['bbox', 'value', 'text'])
+AxisFit = collections.namedtuple(
+    'AxisFit', ['scale', 'slope', 'intercept', 'ticks', 'values',
+                'confidence'])
+AutoCalibration = collections.namedtuple(
+    'AutoCalibration', ['calibration', 'confidence', 'x', 'y'])
+
+_MINUS = str.maketrans({'\u2212': '-', '\u2013': '-', '\u2012': '-',
+                        '\u2010': '-'})
+_SUPERSCRIPTS = ('\u2070\u00b9\u00b2\u00b3\u2074\u2075\u2076\u2077'
+                 '\u2078\u2079\u207b')
+_SUPERSCRIPT = str.maketrans(_SUPERSCRIPTS, '0123456789-')
+_FLOAT = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_POWER = re.compile(r'({0})\^\{{?({0})\}}?'.format(_FLOAT))
+
+
+def parse_number(text):
+    """
+    The value of a tick label, e.g. '0.5', '\u22121', '1e3', '10^3' or
+    '10\u00b3', or None if it is not a number.
+    """
+    text = text.strip().strip('$').translate(_MINUS).replace(' ', '')
+    base = text.rstrip(_SUPERSCRIPTS)
+    if base != text:
+        text = base + '^' + text[len(base):].translate(_SUPERSCRIPT)
+    if re.fullmatch(_FLOAT, text):
+        return float(text)
+    match = _POWER.fullmatch(text)
+    if match is not None:
+        return float(match.group(1))**float(match.group(2))
+    return None
+
+
+def _tokens(blocks):
+    """
+    Words in the lines of PyMuPDF rawdict, (x0, y0, x1, y1, text, size).
+    A raised smaller word just after another is its exponent, 'base^exp'.
+    """
+    for block in blocks:
+        for line in block.get('lines', []):
+            words = []
+            for span in line['spans']:
+                word = None
+                for char in span['chars'] + [None]:
+                    if char is None or char['c'].isspace():
+                        if word is not None:
+                            words.append(word)
+                        word = None
+                    elif word is None:
+                        word = list(char['bbox']) + [char['c'], span['size']]
+                    else:
+                        x0, y0, x1, y1 = char['bbox']
+                        word[:5] = (min(word[0], x0), min(word[1], y0),
+                                    max(word[2], x1), max(word[3], y1),
+                                    word[4] + char['c'])
+            merged = []
+            for word in words:
+                if merged:
+                    last = merged[-1]
+                    gap = word[0] - last[2]
+                    raised = (0.5 * (word[1] + word[3]) <
+                              0.5 * (last[1] + last[3]))
+                    if (gap < 0.3 * last[5] and word[5] < 0.9 * last[5] and
+                            raised):
+                        last[4] = last[4] + '^' + word[4]
+                        last[2] = max(last[2], word[2])
+                        last[1] = min(last[1], word[1])
+                        continue
+                    if gap < 0.1 * last[5] and word[5] == last[5]:
+                        last[4] = last[4] + word[4]
+                        last[2], last[3] = word[2], max(last[3], word[3])
+                        continue
+                merged.append(list(word))
+            yield from merged
+
+
+def labels_from_text(blocks):
+    """
+    Numeric labels in the blocks of PyMuPDF Page.get_text('rawdict')
+    """
+    bbox, value, text = [], [], []
+    for token in _tokens(blocks):
+        number = parse_number(token[4])
+        if number is not None and np.isfinite(number):
+            bbox.append(token[:4])
+            value.append(number)
+            text.append(token[4])
+    return Labels(np.array(bbox, dtype=float).reshape(-1, 4),
+                  np.array(value, dtype=float), text)
+
+
+def load_labels(pdf, page):
+    """
+    Numeric labels in a page of pdf, in the page coordinate.
+    """
+    def load():
+        with core._open(pdf) as doc:
+            blocks = doc[int(page)].get_text('rawdict')['blocks']
+        return labels_from_text(blocks)
+    return core._cached_page(
+        core._file_key(pdf) + (int(page), 'labels'), load)
+
+
+def _inside(points, region):
+    if region is None:
+        return np.ones(len(points), dtype=bool)
+    region = np.asarray(region, dtype=float).reshape(2, 2)
+    lower, upper = region.min(axis=0), region.max(axis=0)
+    return np.all((lower <= points) & (points <= upper), axis=-1)
+
+
+def tick_rows(paths, axis, region=None, tick_length=(1.0, 15.0),
+              min_ticks=3, tolerance=1e-2):
+    """
+    Rows of ticks on the x (axis=0) or y (axis=1) axis.
+
+    The ticks are segments perpendicular to the axis with a length in
+    tick_length, and a row is the ticks spanning the same range.
+    Returns a list of (positions, (lower, upper)), where positions are the
+    sorted positions of the ticks along the axis and lower, upper is the
+    range they span across the axis.
+    """
+    x0, x1, _ = paths.segments
+    d = np.abs(x1 - x0)
+    length = d[:, 1 - axis]
+    is_tick = ((d[:, axis] <= tolerance) & (tick_length[0] <= length) &
+               (length <= tick_length[1]) &
+               _inside(x0, region) & _inside(x1, region))
+    position = x0[is_tick, axis]
+    lower = np.minimum(x0[is_tick, 1 - axis], x1[is_tick, 1 - axis])
+    upper = np.maximum(x0[is_tick, 1 - axis], x1[is_tick, 1 - axis])
+    if len(position) == 0:
+        return []
+    # group by the range
+    key = np.round(np.stack([lower, upper], axis=1) / 0.1).astype(np.int64)
+    _, row = np.unique(key, axis=0, return_inverse=True)
+    row = row.reshape(-1)
+    rows = []
+    for i in range(row.max() + 1):
+        positions = np.unique(np.round(position[row == i], 3))
+        span = (lower[row == i].min(), upper[row == i].max())
+        # the ticks of figures side by side are separated at a large gap
+        gap = np.diff(positions)
+        if len(gap) > 0:
+            split = np.flatnonzero(gap > 3 * np.median(gap)) + 1
+        else:
+            split = []
+        for positions in np.split(positions, split):
+            if len(positions) >= min_ticks:
+                rows.append((positions, span))
+    return rows
+
+
+def _join(positions, span, labels, axis):
+    """
+    Pairs of the ticks and the labels next to them.
+    Returns the indices of the ticks and those of the labels.
+    """
+    if len(labels.value) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    bbox = labels.bbox
+    center = 0.5 * (bbox[:, :2] + bbox[:, 2:])
+    size = bbox[:, 2:] - bbox[:, :2]
+    height = size[:, 1]
+    lower, upper = span
+    across = center[:, 1 - axis]
+    # the distance from the row of ticks to the labels on each side
+    gap_after = across - upper
+    gap_before = lower - across
+    limit = (2.5 if axis == 0 else 1.0) * height + 0.5 * size[:, 1 - axis]
+    best = None
+    for gap in (gap_after, gap_before):
+        near = np.flatnonzero((gap > 0) & (gap < limit))
+        if len(near) == 0:
+            continue
+        # the closest tick to each label along the axis
+        distance = np.abs(center[near, axis][:, np.newaxis] - positions)
+        tick = np.argmin(distance, axis=1)
+        ok = distance[np.arange(len(near)), tick] < np.maximum(
+            0.5 * size[near, axis], 0.5 * height[near])
+        tick, near = tick[ok], near[ok]
+        if len(tick) == 0:
+            continue
+        # one label for each tick, the closest one across the axis
+        order = np.lexsort([gap[near], tick])
+        tick, near = tick[order], near[order]
+        first = np.concatenate([[True], tick[1:] != tick[:-1]])
+        tick, near = tick[first], near[first]
+        if best is None or len(tick) > len(best[0]):
+            best = (tick, near)
+    if best is None:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return best
+
+
+def _candidates(positions, values, increasing):
+    """
+    The values with the signs recovered. The minus signs of the labels are
+    often drawn as paths rather than text, so that the labels on one side
+    of zero may lack them. The values are taken to be increasing or
+    decreasing with the positions.
+    """
+    yield values
+    if len(values) >= 3 and (values >= 0).all() and (values == 0).any():
+        zero = positions[values == 0].mean()
+        if increasing:
+            yield np.where(positions < zero, -values, values)
+        else:
+            yield np.where(positions > zero, -values, values)
+
+
+def fit_axis(positions, values, increasing=True):
+    """
+    Fit the linear or log mapping from the positions to the values.
+    increasing: whether the values usually increase with the positions,
+        which is False for the y axis in the page coordinate.
+    Returns AxisFit or None if it cannot be fitted.
+    """
+    positions = np.asarray(positions, dtype=float)
+    best = None
+    n = len(positions)
+    if n < 2 or np.ptp(positions) == 0:
+        return None
+    candidates = _candidates(positions, np.asarray(values, float), increasing)
+    for candidate in candidates:
+        for scale in ('linear', 'log'):
+            if scale == 'log':
+                if (candidate <= 0).any():
+                    continue
+                y = np.log10(candidate)
+            else:
+                y = candidate
+            if np.ptp(y) == 0:
+                continue
+            slope, intercept = np.polyfit(positions, y, 1)
+            residual = y - (slope * positions + intercept)
+            r2 = 1 - np.sum(residual**2) / np.sum((y - y.mean())**2)
+            confidence = max(r2, 0.0) * (n - 1) / (n + 1)
+            # the log scale is taken only if it is better
+            if best is None or confidence > best.confidence + 1e-9:
+                best = AxisFit(scale, slope, intercept, positions, candidate,
+                               confidence)
+    return best
+
+
+def _fit_row(positions, ticks, values, increasing, max_runs=40):
+    """
+    The best fit among the runs of consecutive labelled ticks, since a row
+    may contain the ticks of several figures.
+    The confidence is reduced by the fraction of the ticks without labels.
+    """
+    order = np.argsort(ticks)
+    ticks, values = ticks[order], values[order]
+    n = len(ticks)
+    if n <= max_runs:
+        runs = [(i, j) for i in range(n) for j in range(i + 2, n + 1)
+                if j - i >= min(3, n)]
+    else:
+        runs = [(0, n)]
+    best = None
+    for i, j in runs:
+        fit = fit_axis(ticks[i:j], values[i:j], increasing)
+        if fit is None:
+            continue
+        n_ticks = np.sum((ticks[i] <= positions) & (positions <= ticks[j - 1]))
+        fit = fit._replace(confidence=fit.confidence * (j - i) / n_ticks)
+        if best is None or fit.confidence > best.confidence:
+            best = fit
+    return best
+
+
+def calibrate_axis(paths, labels, axis, region=None, **kwargs):
+    """
+    The best AxisFit among the rows of ticks on an axis, or None.
+    """
+    best = None
+    label_in = _inside(0.5 * (labels.bbox[:, :2] + labels.bbox[:, 2:]),
+                       region)
+    labels = Labels(labels.bbox[label_in], labels.value[label_in],
+                    [t for t, i in zip(labels.text, label_in) if i])
+    for positions, span in tick_rows(paths, axis, region, **kwargs):
+        tick, label = _join(positions, span, labels, axis)
+        fit = _fit_row(positions, positions[tick], labels.value[label],
+                       increasing=axis == 0)
+        if fit is not None and (best is None or
+                                fit.confidence > best.confidence):
+            best = fit
+    return best
+
+
+def calibrate(paths, labels, region=None, **kwargs):
+    """
+    Calibrate the axes of a figure from the ticks in paths and the numeric
+    labels.
+
+    region: (x0, y0, x1, y1) of the figure in the page coordinate, or the
+        index of a region in paths.regions. The whole page if None.
+    Returns AutoCalibration, whose calibration is None unless both axes are
+    found. confidence is between 0 and 1, the smaller of the two axes.
+    """
+    if np.ndim(region) == 0 and region is not None:
+        # the labels are outside of the ticks
+        margin = paths.region_margin
+        region = paths.regions[int(region)] + [-margin, -margin,
+                                               margin, margin]
+    fits = [calibrate_axis(paths, labels, axis, region, **kwargs)
+            for axis in (0, 1)]
+    if any(fit is None for fit in fits):
+        return AutoCalibration(None, 0.0, *fits)
+    x, y = fits
+    calibration = core.Calibration(
+        np.diag([x.slope, y.slope]), [x.intercept, y.intercept],
+        xscale=x.scale, yscale=y.scale)
+    return AutoCalibration(calibration, min(x.confidence, y.confidence), x, y)
+
+
+def calibrate_page(pdf, page, backend='drawings', region=None, **kwargs):
+    """
+    calibrate() a page of pdf
+    """
+    return calibrate(core.load_page(pdf, page, backend=backend),
+                     load_labels(pdf, page), region, **kwargs)
@@ -0,0 +1,466 @@
+"""
+Digitize figures in many pdf files without the gui.
+
+    python -m digitizer --spec spec.json --output out.csv papers/
+
+The spec is a json object describing what to extract from each file,
+
+    {
+        "page": 0,                  # or a list of pages
+        "figure": 0,                # only paths in this figure region
+        "region": [x0, y0, x1, y1], # only paths inside this box
+        "style": {"stroke": "#ff0000"},  # only paths with this style
+        "point": [x, y],            # the path nearest to this point
+        "group": true,              # all the paths sharing its style
+        "marker": false,            # the centers instead of the vertices,
+                                    # grouping the paths of the same shape
+        "decimate": 0.01,           # or [dx, dy], simplify each path within
+                                    # this distance in the calibrated values
+        "calibration": {
+            "x": [[pic0, real0], [pic1, real1]], "xscale": "linear",
+            "y": [[pic0, real0], [pic1, real1]], "yscale": "log"
+        }
+    }
+
+The calibration is any form read by core.Calibration.from_dict, or "auto"
+to calibrate the axes from the ticks and their labels. Then the pages
+calibrated with confidence less than "min_confidence" (0.5 by default)
+fail. The ticks are searched in the figure, which may also be a box
+[x0, y0, x1, y1].
+
+The figures are the regions of core.Paths.regions, numbered from the top
+left of the page.
+
+All the positions are in the page coordinate, i.e. that of the raw values.
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import time
+import numpy as np
+
+try:
+    from . import core, autocalibrate, export, decimate
+except ImportError:
+    import core
+    import autocalibrate
+    import export
+    import decimate
+
+
+def find_pdfs(sources):
+    """
+    Expand directories in sources into the pdf files they contain.
+    """
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            files.extend(sorted(glob.glob(
+                os.path.join(source, '**', '*.pdf'), recursive=True)))
+        else:
+            files.append(source)
+    return files
+
+
+def _mask(paths, spec):
+    """
+    Paths satisfying the figure, region and style of spec
+    """
+    mask = np.ones(len(paths.paths), dtype=bool)
+    if _region(spec) is not None:
+        mask &= paths.region_id == _region(spec)
+    if spec.get('region') is not None:
+        x = np.array(spec['region'], dtype=float).reshape(2, 2)
+        xmin, xmax = np.min(x, axis=0), np.max(x, axis=0)
+        mask &= (np.all(xmin <= paths.bbox[:, :2], axis=-1) &
+                 np.all(paths.bbox[:, 2:] <= xmax, axis=-1))
+    if spec.get('style'):
+        items = set(core._normalize_style(spec['style']))
+        ids = [i for i, style in enumerate(paths.styles)
+               if items <= set(style)]
+        mask &= np.isin(paths.style_id, ids)
+    return mask
+
+
+def _region(spec):
+    figure = spec.get('figure')
+    return figure if np.ndim(figure) == 0 and figure is not None else None
+
+
+def _nearest(paths, point, mask, region=None):
+    """
+    Index of the path nearest to point among those in mask, found by
+    Paths.find_k_nearest as in the gui and the server
+    """
+    if not mask.any():
+        return None
+    in_region = np.ones(len(paths.paths), dtype=bool) if region is None \
+        else paths.region_id == region
+    # the paths in the order of the distance, if mask is narrower
+    k = 1 if (mask == in_region).all() else len(paths.paths)
+    for path in paths.find_k_nearest(paths._to_inch(point), k, region):
+        if mask[path.index]:
+            return path.index
+    return None
+
+
+def select(paths, spec):
+    """
+    Indices of the paths specified by spec.
+    """
+    mask = _mask(paths, spec)
+    if spec.get('point') is not None:
+        i = _nearest(paths, np.array(spec['point'], dtype=float), mask,
+                     _region(spec))
+        if i is None:
+            return np.zeros(0, dtype=int)
+        selected = np.array([i])
+    elif spec.get('style'):
+        selected = np.flatnonzero(mask)
+    elif spec.get('region') is not None:
+        # the largest path inside the region, as in the gui
+        inside = np.flatnonzero(mask & (np.diff(paths.offsets) > 0))
+        if len(inside) == 0:
+            return inside
+        selected = inside[[np.argmax(paths.size2[inside])]]
+    else:
+        selected = np.flatnonzero(mask)
+
+    if spec.get('group') and len(selected) > 0:
+        if spec.get('marker'):
+            # the markers of the same shape
+            group = np.isin(paths.series_id, paths.series_id[selected])
+        else:
+            group = np.isin(paths.style_id, paths.style_id[selected])
+        selected = np.flatnonzero(mask & group)
+    return selected
+
+
+def extract(paths, spec):
+    """
+    Returns the indices of the paths and the x, y values specified by spec.
+    """
+    selected = select(paths, spec)
+    if spec.get('marker'):
+        index = selected
+        xy = paths.centers[selected]
+    else:
+        index = np.repeat(selected, [len(paths.paths[i].abs_path)
+                                     for i in selected])
+        xy = np.concatenate(
+            [paths.paths[i].abs_path for i in selected] +
+            [np.zeros((0, 2))], axis=0)
+    if spec.get('calibration'):
+        xy = core.Calibration.from_dict(spec['calibration']).transform(xy)
+    if spec.get('decimate') and not spec.get('marker'):
+        # each path separately, after the calibration
+        offsets = np.concatenate(
+            [[0], np.cumsum([len(paths.paths[i].abs_path) for i in selected])])
+        kept = decimate.rdp(xy, spec['decimate'], offsets)
+        index, xy = index[kept], xy[kept]
+    return index, xy[:, 0], xy[:, 1]
+
+
+@contextlib.contextmanager
+def _time_limit(seconds):
+    """
+    Raises TimeoutError if the block takes longer than seconds.
+    Only available where SIGALRM is.
+    """
+    if not seconds or not hasattr(signal, 'SIGALRM'):
+        yield
+        return
+
+    def handler(signum, frame):
+        raise TimeoutError('timed out after {} s'.format(seconds))
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def process(pdf, spec, backend='drawings', timeout=None, cache_dir=None):
+    """
+    Extract the values specified by spec from pdf.
+
+    Returns a list of (page, index, x, y), one for each page.
+    """
+    if cache_dir is not None:
+        try:
+            from . import cache
+        except ImportError:
+            import cache
+        load_page = cache.GeometryCache(cache_dir).load_page
+    else:
+        load_page = core.load_page
+
+    pages = spec.get('page', 0)
+    if np.ndim(pages) == 0:
+        pages = [pages]
+    results = []
+    with _time_limit(timeout):
+        for page in pages:
+            paths = load_page(pdf, page, backend=backend)
+            page_spec = spec
+            if spec.get('calibration') == 'auto':
+                page_spec = dict(spec, calibration=_auto_calibration(
+                    paths, pdf, page, spec))
+            results.append((int(page), ) + extract(paths, page_spec))
+    return results
+
+
+def _auto_calibration(paths, pdf, page, spec):
+    result = autocalibrate.calibrate(
+        paths, autocalibrate.load_labels(pdf, page), spec.get('figure'))
+    min_confidence = spec.get('min_confidence', 0.5)
+    if result.confidence < min_confidence:
+        raise ValueError(
+            'the axes of page {} are not found with confidence {} or '
+            'higher ({:.2f})'.format(page, min_confidence, result.confidence))
+    return result.calibration.to_dict()
+
+
+# seconds a worker may run over the timeout, e.g. stuck in the native code
+# where SIGALRM is not handled, before it is killed
+_GRACE = 5.0
+
+
+def _worker(connection, pdf, spec, backend, timeout, cache_dir):
+    """
+    process in a worker process, sending the result or the error to
+    connection
+    """
+    # each worker opens only its own file
+    core.set_cache_size(documents=1, pages=4)
+    try:
+        result = process(pdf, spec, backend, timeout, cache_dir)
+    except Exception as e:
+        result = e
+    try:
+        connection.send(result)
+    except Exception as e:
+        # an error which is not picklable
+        connection.send(RuntimeError(repr(e)))
+    finally:
+        connection.close()
+
+
+class CSVWriter:
+    """
+    Writes the results into a csv file with columns file, page, path, x, y.
+    """
+    def __init__(self, filename):
+        self.file = open(filename, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['file', 'page', 'path', 'x', 'y'])
+
+    def write(self, pdf, page, index, x, y):
+        self.writer.writerows(zip(
+            [pdf] * len(x), [page] * len(x), index.tolist(), x.tolist(),
+            y.tolist()))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SeriesWriter:
+    """
+    Writes the results by an exporter of export, e.g. into a npz file,
+    as the series {name}_p{page} with columns path, x and y for each file.
+    """
+    def __init__(self, filename, metadata=None):
+        self.exporter = export.open_exporter(filename, metadata)
+        self.prefixes = set()
+
+    def _prefix(self, pdf, page):
+        name = os.path.splitext(os.path.basename(pdf))[0]
+        prefix = '{}_p{}'.format(name, page)
+        n = 0
+        # files with the same name
+        while prefix in self.prefixes:
+            n += 1
+            prefix = '{}-{}_p{}'.format(name, n, page)
+        self.prefixes.add(prefix)
+        return prefix
+
+    def write(self, pdf, page, index, x, y):
+        self.exporter.write(self._prefix(pdf, page), path=index, x=x, y=y)
+
+    def close(self):
+        self.exporter.close()
+
+
+def open_writer(filename, metadata=None):
+    """
+    CSVWriter for a csv file, or SeriesWriter for the other formats of
+    export
+    """
+    if filename.endswith('.csv'):
+        return CSVWriter(filename)
+    return SeriesWriter(filename, metadata)
+
+
+def run(files, spec, output, jobs=None, backend='drawings', timeout=None,
+        cache_dir=None, progress=sys.stderr):
+    """
+    Process files in parallel, writing the results into output as they
+    finish.
+    jobs: the number of worker processes. If 0, process in this process.
+
+    Returns a dict of the files that failed and their errors.
+    """
+    writer = open_writer(output, metadata={'spec': spec})
+    failed = {}
+
+    def report(i, pdf, result):
+        if isinstance(result, BaseException):
+            failed[pdf] = result
+            status = 'failed: {}'.format(result)
+        else:
+            for page, index, x, y in result:
+                writer.write(pdf, page, index, x, y)
+            status = '{} points'.format(sum(len(r[2]) for r in result))
+        if progress is not None:
+            print('[{}/{}] {}: {}'.format(i, len(files), pdf, status),
+                  file=progress, flush=True)
+
+    try:
+        if jobs == 0:
+            for i, pdf in enumerate(files, 1):
+                try:
+                    result = process(pdf, spec, backend, timeout, cache_dir)
+                except Exception as e:
+                    result = e
+                report(i, pdf, result)
+            return failed
+
+        # a process for each file, so that a file stuck over the timeout is
+        # killed without the others
+        jobs = jobs or os.cpu_count() or 1
+        context = multiprocessing.get_context()
+        running = {}
+        queue = iter(files)
+        done = 0
+        try:
+            while True:
+                for pdf in queue:
+                    receiver, sender = context.Pipe(duplex=False)
+                    worker = context.Process(
+                        target=_worker, daemon=True,
+                        args=(sender, pdf, spec, backend, timeout, cache_dir))
+                    worker.start()
+                    sender.close()
+                    running[receiver] = (pdf, worker, time.monotonic())
+                    if len(running) >= jobs:
+                        break
+                if len(running) == 0:
+                    break
+                for receiver in multiprocessing.connection.wait(
+                        list(running), timeout=1.0):
+                    pdf, worker, _ = running.pop(receiver)
+                    try:
+                        result = receiver.recv()
+                    except EOFError:
+                        result = None
+                    receiver.close()
+                    worker.join()
+                    if result is None:
+                        result = RuntimeError('the worker exited with code '
+                                              '{}'.format(worker.exitcode))
+                    done += 1
+                    report(done, pdf, result)
+                if timeout:
+                    now = time.monotonic()
+                    for receiver, (pdf, worker, start) in list(
+                            running.items()):
+                        if now - start > timeout + _GRACE:
+                            del running[receiver]
+                            worker.kill()
+                            worker.join()
+                            receiver.close()
+                            done += 1
+                            report(done, pdf, TimeoutError(
+                                'timed out after {} s'.format(timeout)))
+        finally:
+            for receiver, (pdf, worker, start) in running.items():
+                worker.kill()
+                worker.join()
+                receiver.close()
+    finally:
+        writer.close()
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m digitizer',
+        description='Digitize figures in pdf files.')
+    parser.add_argument('sources', nargs='*',
+                        help='pdf files or directories containing them')
+    parser.add_argument('--list', help='a file listing pdf files, one per '
+                        'line')
+    parser.add_argument('--spec', help='json file describing what to '
+                        'extract')
+    parser.add_argument('--page', type=int, nargs='+', help='pages')
+    parser.add_argument('--region', type=float, nargs=4,
+                        metavar=('X0', 'Y0', 'X1', 'Y1'))
+    parser.add_argument('--point', type=float, nargs=2, metavar=('X', 'Y'))
+    parser.add_argument('--style', action='append', default=[],
+                        metavar='KEY=VALUE')
+    parser.add_argument('--figure', type=int, default=None,
+                        help='index of the figure in the page')
+    parser.add_argument('--group', action='store_true', default=None)
+    parser.add_argument('--marker', action='store_true', default=None)
+    parser.add_argument('--decimate', type=float, default=None,
+                        metavar='TOLERANCE',
+                        help='simplify the paths within this distance')
+    parser.add_argument('-o', '--output', default='digitized.csv',
+                        help='.csv, .npz, .h5, .parquet file or a '
+                        'directory of .npy files')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='the number of processes')
+    parser.add_argument('--backend', choices=core.BACKENDS,
+                        default='drawings')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds allowed for each file')
+    parser.add_argument('--cache-dir', default=None,
+                        help='use the geometry cache in this directory')
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    spec = {}
+    if args.spec is not None:
+        with open(args.spec) as f:
+            spec = json.load(f)
+    for key in ['page', 'figure', 'region', 'point', 'group', 'marker',
+                'decimate']:
+        if getattr(args, key) is not None:
+            spec[key] = getattr(args, key)
+    if args.style:
+        spec['style'] = dict(s.split('=', 1) for s in args.style)
+
+    sources = list(args.sources)
+    if args.list is not None:
+        with open(args.list) as f:
+            sources.extend(line.strip() for line in f if line.strip())
+    files = find_pdfs(sources)
+    if len(files) == 0:
+        parser.error('no pdf files are given')
+
+    failed = run(files, spec, args.output, jobs=args.jobs,
+                 backend=args.backend, timeout=args.timeout,
+                 cache_dir=args.cache_dir,
+                 progress=None if args.quiet else sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,284 @@
+"""
+Persistent cache of the geometry of pdf pages.
+
+Each page is stored in a directory of .npy files, which are memory-mapped
+when loaded, so that a cached page is read without any parsing.
+
+    python -m digitizer.cache info
+    python -m digitizer.cache purge [pdf ...]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+try:
+    from . import core
+except ImportError:
+    import core
+
+
+DEFAULT_DIRECTORY = os.environ.get(
+    'DIGITIZER_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'digitizer'))
+DEFAULT_MAX_SIZE = 1 << 30
+_ARRAYS = ('vertices', 'offsets', 'style_id', 'bbox')
+# the file keeping the estimated total size of a cache directory
+_SIZE_FILE = 'size'
+# content hashes of the files, keyed by (path, mtime, size)
+_hashes = {}
+
+
+def content_hash(pdf):
+    """
+    sha256 of the file content
+    """
+    stat = os.stat(pdf)
+    key = (os.path.abspath(pdf), stat.st_mtime_ns, stat.st_size)
+    if key not in _hashes:
+        sha = hashlib.sha256()
+        with open(pdf, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        _hashes[key] = sha.hexdigest()
+    return _hashes[key]
+
+
+def _size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(directory) for f in files)
+
+
+class GeometryCache:
+    """
+    Cache of the vertices, bounding boxes and styles of pages, keyed by the
+    content hash of the pdf, the page number, the curve tolerance and the
+    parser version.
+
+    directory: where the cache is stored
+    max_size: total size in bytes. The least recently used pages are
+        removed beyond this.
+    """
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or DEFAULT_DIRECTORY
+        self.max_size = max_size
+
+    def _entry(self, pdf, page, backend, dtype, curve_tolerance=None):
+        if curve_tolerance is None:
+            curve_tolerance = core.CURVE_TOLERANCE
+        return os.path.join(
+            self.directory, content_hash(pdf),
+            'p{}-{}-{}-t{!r}-v{}'.format(
+                int(page), backend, np.dtype(dtype).str,
+                float(curve_tolerance), core.PARSER_VERSION))
+
+    def load(self, pdf, page, backend='drawings', dtype=np.float64,
+             curve_tolerance=None):
+        """
+        Returns the cached Paths, or None if not cached.
+        """
+        entry = self._entry(pdf, page, backend, dtype, curve_tolerance)
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+            arrays = {
+                name: np.load(os.path.join(entry, name + '.npy'),
+                              mmap_mode='r')
+                for name in _ARRAYS}
+        except (OSError, ValueError):
+            return None
+        try:
+            # mark as recently used
+            os.utime(entry)
+        except OSError:
+            # removed by another process, while the arrays are still mapped
+            pass
+        paths = core.Paths.from_arrays(
+            arrays['vertices'], arrays['offsets'], meta['styles'],
+            style_id=arrays['style_id'], bbox=arrays['bbox'],
+            unit=meta['unit'], dtype=dtype)
+        if meta.get('page_box') is not None:
+            paths.page_box = np.array(meta['page_box'])
+        paths.source = (pdf, int(page))
+        return paths
+
+    def save(self, paths, pdf, page, backend='drawings',
+             curve_tolerance=None):
+        """
+        Store paths read from page of pdf.
+        """
+        entry = self._entry(pdf, page, backend, paths.vertices.dtype,
+                            curve_tolerance)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # before the entry is added, as it is measured if not estimated yet
+        estimate = self._estimated_size()
+        # write in a temporary directory and rename it, so that other
+        # processes never see incomplete entries
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry))
+        try:
+            for name in _ARRAYS:
+                np.save(os.path.join(tmp, name + '.npy'),
+                        np.ascontiguousarray(getattr(paths, name)))
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump({
+                    'pdf': os.path.basename(pdf), 'page': int(page),
+                    'backend': backend, 'unit': paths.unit,
+                    'styles': [list(style) for style in paths.styles],
+                    'page_box': None if paths.page_box is None else
+                    paths.page_box.tolist(),
+                }, f)
+            os.rename(tmp, entry)
+        except OSError:
+            # it may be stored by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        # the whole cache is walked only when the estimate exceeds max_size
+        total = estimate + _size(entry)
+        if total > self.max_size:
+            self.evict()
+        else:
+            self._write_size(total)
+
+    def load_page(self, pdf, page, backend='drawings', dtype=np.float64,
+                  curve_tolerance=None):
+        """
+        Same as core.load_page, but the result is read from and stored in
+        this cache. The Paths is also kept in the page cache of core, so
+        that the same Paths is returned for the recently loaded pages.
+        """
+        if backend not in core.BACKENDS:
+            raise ValueError('backend must be one of {}. Given {}'.format(
+                core.BACKENDS, backend))
+        if curve_tolerance is None:
+            curve_tolerance = core.CURVE_TOLERANCE
+
+        def load():
+            paths = self.load(pdf, page, backend, dtype, curve_tolerance)
+            if paths is None:
+                paths = core._load_page(pdf, page, backend, dtype,
+                                        curve_tolerance)
+                self.save(paths, pdf, page, backend, curve_tolerance)
+            return paths
+        return core._cached_page(core._page_key(
+            pdf, page, backend, dtype, curve_tolerance), load)
+
+    def _estimated_size(self):
+        """
+        The total size recorded by the last save or evict, which may miss
+        the entries changed by other processes since then.
+        """
+        try:
+            with open(os.path.join(self.directory, _SIZE_FILE)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return self.size()
+
+    def _write_size(self, total):
+        # replaced at once, so that other processes read the whole number
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(int(total)))
+            os.replace(tmp, os.path.join(self.directory, _SIZE_FILE))
+        except OSError:
+            pass
+
+    def entries(self):
+        """
+        The cached pages, from the least recently used one.
+        """
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for digest in os.listdir(self.directory):
+            if not os.path.isdir(os.path.join(self.directory, digest)):
+                continue
+            for name in os.listdir(os.path.join(self.directory, digest)):
+                entry = os.path.join(self.directory, digest, name)
+                try:
+                    with open(os.path.join(entry, 'meta.json')) as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                result.append({
+                    'path': entry, 'hash': digest, 'pdf': meta['pdf'],
+                    'page': meta['page'], 'backend': meta['backend'],
+                    'size': _size(entry),
+                    'atime': os.path.getmtime(entry)})
+        return sorted(result, key=lambda e: e['atime'])
+
+    def size(self):
+        return sum(e['size'] for e in self.entries())
+
+    def evict(self, max_size=None):
+        """
+        Remove the least recently used pages until the cache gets smaller
+        than max_size.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        entries = self.entries()
+        total = sum(e['size'] for e in entries)
+        for e in entries:
+            if total <= max_size:
+                break
+            self._remove(e['path'])
+            total -= e['size']
+        if os.path.isdir(self.directory):
+            self._write_size(total)
+
+    def purge(self, pdf=None):
+        """
+        Remove all the pages, or only those of pdf.
+        """
+        if pdf is None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        else:
+            shutil.rmtree(os.path.join(self.directory, content_hash(pdf)),
+                          ignore_errors=True)
+            # measured again at the next save
+            try:
+                os.remove(os.path.join(self.directory, _SIZE_FILE))
+            except OSError:
+                pass
+
+    def _remove(self, entry):
+        shutil.rmtree(entry, ignore_errors=True)
+        parent = os.path.dirname(entry)
+        if len(os.listdir(parent)) == 0:
+            os.rmdir(parent)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m digitizer.cache',
+        description='Inspect or purge the geometry cache.')
+    parser.add_argument('--dir', default=None, help='cache directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('info', help='list the cached pages')
+    purge = subparsers.add_parser('purge', help='remove the cached pages')
+    purge.add_argument('pdf', nargs='*',
+                       help='remove only the pages of these files')
+    args = parser.parse_args(argv)
+
+    cache = GeometryCache(args.dir)
+    if args.command == 'info':
+        entries = cache.entries()
+        for e in entries:
+            print('{:>10} {} page {} ({})  {}'.format(
+                e['size'], e['pdf'], e['page'], e['backend'], e['hash']))
+        print('{} pages, {} bytes in {}'.format(
+            len(entries), sum(e['size'] for e in entries), cache.directory))
+    elif args.pdf:
+        for pdf in args.pdf:
+            cache.purge(pdf)
+    else:
+        cache.purge()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,153 +1,1323 @@
-import copy
-from xml.dom import minidom
+import atexit
+import collections
+import contextlib
+import functools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+from xml.etree import ElementTree
 import numpy as np
-import fitz
 
 try:
-    from . import geometry
+    from . import geometry, decimate, hittest
 except ImportError:
     import geometry
+    import decimate
+    import hittest
+
+
+class _LRUCache:
+    """
+    A thread-safe cache that discards the least recently used items.
+    on_evict is called with the discarded values.
+    """
+    def __init__(self, maxsize, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._items = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            self._evict(self.maxsize)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict(maxsize)
+
+    def clear(self):
+        self._evict(0)
+
+    def _evict(self, size):
+        with self._lock:
+            while len(self._items) > size:
+                _, value = self._items.popitem(last=False)
+                if self.on_evict is not None:
+                    self.on_evict(value)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+# opened documents and loaded pages, keyed by (file path, mtime, ...)
+_documents = _LRUCache(maxsize=4, on_evict=lambda doc: doc.close())
+_pages = _LRUCache(maxsize=16)
+# PyMuPDF documents should not be used from multiple threads at once
+_document_lock = threading.RLock()
+
+
+def _file_key(pdf):
+    return os.path.abspath(pdf), os.stat(pdf).st_mtime_ns
+
+
+@contextlib.contextmanager
+def _open(pdf):
+    """
+    Open pdf, reusing the document opened previously.
+    """
+    key = _file_key(pdf)
+    with _document_lock:
+        doc = _documents.get(key)
+        if doc is None:
+            # PyMuPDF takes a while to import, and is not needed for the
+            # pages in the caches
+            import fitz
+            doc = fitz.open(pdf)
+            _documents.put(key, doc)
+        yield doc
+
+
+def set_cache_size(documents=None, pages=None):
+    """
+    Set the number of the opened documents and the loaded pages to be kept.
+    """
+    with _document_lock:
+        if documents is not None:
+            _documents.resize(documents)
+        if pages is not None:
+            _pages.resize(pages)
+
+
+def clear_cache():
+    """
+    Close the opened documents and discard the loaded pages.
+    """
+    with _document_lock:
+        _documents.clear()
+        _pages.clear()
+
+
+# key -> [lock, number of the threads using it] of the pages being loaded,
+# so that a page requested by several threads at once is loaded only once
+_loading = {}
+_loading_lock = threading.Lock()
+
+
+def _cached_page(key, load, cache=True):
+    """
+    Returns the page cached with key, or load it.
+    If cache is False, the loaded page is not kept.
+    """
+    value = _pages.get(key)
+    if value is not None:
+        return value
+    if not cache:
+        return load()
+    with _loading_lock:
+        loading = _loading.setdefault(key, [threading.Lock(), 0])
+        loading[1] += 1
+    try:
+        with loading[0]:
+            value = _pages.get(key)
+            if value is None:
+                value = load()
+                _pages.put(key, value)
+    finally:
+        with _loading_lock:
+            loading[1] -= 1
+            if loading[1] == 0:
+                del _loading[key]
+    return value
+
+
+class _Profiler:
+    """
+    Records the wall time of the stages of the pipeline.
+    Nothing is recorded unless enabled.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._null = contextlib.nullcontext()
+
+    def stage(self, name, **args):
+        """
+        Context manager recording the block as a stage named name.
+        args are recorded with it, e.g. page.
+        """
+        if not self.enabled:
+            return self._null
+        return self._stage(name, args)
+
+    @contextlib.contextmanager
+    def _stage(self, name, args):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        # the stages inherit the page of the outer stage
+        if 'page' not in args and stack and 'page' in stack[-1]['args']:
+            args['page'] = stack[-1]['args']['page']
+        frame = {'args': args, 'peak': 0}
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            if memory:
+                peak = max(tracemalloc.get_traced_memory()[1], frame['peak'])
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+                args['peak_memory'] = peak - current
+            self.record(name, start, duration, **args)
+
+    def record(self, name, start, duration, **args):
+        """
+        Record a stage started at start (time.perf_counter()) and took
+        duration seconds.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.events.append((name, start, duration, threading.get_ident(),
+                                args))
+
+
+_profiler = _Profiler()
+
+
+def _profiled(name):
+    """
+    Decorator recording the function calls as a stage
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profiler.enabled:
+                return func(*args, **kwargs)
+            with _profiler.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profile_stage(name, **args):
+    """
+    Context manager recording the block as a stage, e.g. in the gui.
+    """
+    return _profiler.stage(name, **args)
+
+
+def profile_event(name, start, duration, **args):
+    """
+    Record a stage measured elsewhere, e.g. an asynchronous one.
+    start is time.perf_counter() at the beginning.
+    """
+    _profiler.record(name, start, duration, **args)
+
+
+def enable_profiling(memory=False):
+    """
+    Start recording the time spent in each stage of loading and querying
+    pages. If memory is True, the peak memory of each stage is also
+    recorded with tracemalloc, which slows everything down.
+    """
+    _profiler.enabled = True
+    _profiler.memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable_profiling():
+    if _profiler.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _profiler.enabled = False
+    _profiler.memory = False
+
+
+def reset_profile():
+    with _profiler._lock:
+        _profiler.events = []
+
+
+def profile_report():
+    """
+    Summary of the recorded stages, a dict of
+    {page: {stage: {'count', 'total', 'max', ['peak_memory']}}}.
+    The stages outside of any page have page None.
+    Times are in seconds and inclusive of the nested stages.
+    """
+    report = {}
+    with _profiler._lock:
+        events = list(_profiler.events)
+    for name, _, duration, _, args in events:
+        stages = report.setdefault(args.get('page'), {})
+        stat = stages.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        stat['count'] += 1
+        stat['total'] += duration
+        stat['max'] = max(stat['max'], duration)
+        if 'peak_memory' in args:
+            stat['peak_memory'] = max(
+                stat.get('peak_memory', 0), args['peak_memory'])
+    return report
+
+
+def format_profile(report=None):
+    """
+    The report as a text table
+    """
+    report = profile_report() if report is None else report
+    lines = ['{:<6} {:<24} {:>7} {:>11} {:>11} {:>12}'.format(
+        'page', 'stage', 'count', 'total [s]', 'max [s]', 'memory [B]')]
+    for page in sorted(report, key=lambda p: (p is not None, p)):
+        stages = report[page]
+        for name in sorted(stages, key=lambda n: -stages[n]['total']):
+            stat = stages[name]
+            lines.append('{:<6} {:<24} {:>7} {:>11.4f} {:>11.4f} {:>12}'.format(
+                '-' if page is None else page, name, stat['count'],
+                stat['total'], stat['max'], stat.get('peak_memory', '')))
+    return '\n'.join(lines)
+
+
+def save_trace(filename):
+    """
+    Write the recorded stages in the Chrome trace format, which can be
+    opened by chrome://tracing or https://ui.perfetto.dev
+    """
+    with _profiler._lock:
+        events = list(_profiler.events)
+    trace = [{
+        'name': name, 'cat': 'digitizer', 'ph': 'X', 'pid': os.getpid(),
+        'tid': tid, 'ts': start * 1e6, 'dur': duration * 1e6,
+        'args': {k: v for k, v in args.items() if v is not None}}
+        for name, start, duration, tid, args in events]
+    with open(filename, 'w') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+
+def _profile_from_environment():
+    """
+    DIGITIZER_PROFILE=1 enables the profiling, and DIGITIZER_PROFILE=memory
+    also records the memory. The report is printed at exit, or written as
+    Chrome trace if DIGITIZER_PROFILE_TRACE is given.
+    """
+    mode = os.environ.get('DIGITIZER_PROFILE', '')
+    if mode in ('', '0'):
+        return
+    enable_profiling(memory=mode == 'memory')
+    trace = os.environ.get('DIGITIZER_PROFILE_TRACE')
+    if trace:
+        atexit.register(save_trace, trace)
+    else:
+        atexit.register(lambda: print(format_profile()))
+
+
+_profile_from_environment()
 
 
 def n_pages(pdf):
-    with fitz.open(pdf) as doc:
-        return len(list(doc.pages()))
-    
-def _to_svg(pdf, page, figure_num=0):
-    with fitz.open(pdf) as doc:
-        return list(doc.pages())[page].getSVGimage(
-            text_as_path=False
-        )
-
-
-def _compute_abs_path(path):
-    d = path.getAttribute('d')
-    txts = d.strip().split(' ')
-
-    mode = 'M'
-    paths = []
-    coord = [0, 0]
-    idx = 0
-    for txt in txts:
-        if len(txt) == 1:
-            mode = txt
-        else:
-            if mode in 'MLCmlc':
-                if mode in 'MLC':
-                    coord[idx] = float(txt)
-                else:
-                    coord[idx] += float(txt)
-                if idx == 1:
-                    paths.append(np.array(coord))
-                    idx = 0
-                else:
-                    idx = 1
-            elif mode in 'zZ':
-                paths.append(np.array(paths[0]))
-                idx = 0
-            elif mode in 'hH':
-                if mode == 'H':
-                    coord[0] = float(txt)
-                else:
-                    coord[0] += float(txt)
-                paths.append(np.array(coord))
-                idx = 0
-            elif mode in 'vV':
-                if mode == 'V':
-                    coord[1] = float(txt)
-                else:
-                    coord[1] += float(txt)
-                paths.append(np.array(coord))
-                idx = 0
-    # consider transform
-    transform = path.getAttribute('transform')
-    if transform is not None:
-        transform = transform[transform.find('matrix(') + 7:-1].split(',')
-        a, b, c, d, e, f = [float(t) for t in transform]
-        scale = np.array([[a, b], [c, d]])
-        offset = np.array([e, f])
-        paths = [scale @ path + offset for path in paths]
-    
+    with _open(pdf) as doc:
+        return len(doc)
+
+
+def _to_svg(pdf, page, figure_num=0, cache=True):
+    """
+    The svg image of a page. If cache is False, the image is not kept in
+    the cache of the pages.
+    """
+    def load():
+        with _profiler.stage('to_svg', page=int(page)), _open(pdf) as doc:
+            return doc[int(page)].getSVGimage(text_as_path=False)
+    return _cached_page(_file_key(pdf) + (int(page), 'svg'), load, cache)
+
+
+# the ways to read the paths from pdf
+BACKENDS = ('drawings', 'svg')
+# version of the geometry made by the parsers, which is increased when the
+# results of the parsers change
+PARSER_VERSION = 3
+
+
+def load_page(pdf, page, backend='drawings', dtype=np.float64,
+              curve_tolerance=None, **kwargs):
+    """
+    Read the paths in a page of pdf.
+    The recently loaded pages are cached and the same Paths is returned.
+
+    backend: 'drawings' reads the vector drawings directly from PyMuPDF.
+        'svg' parses the svg image of the page.
+    curve_tolerance: the curves are approximated by polylines within this
+        distance in pt. CURVE_TOLERANCE by default.
+    kwargs: passed to Paths for the svg backend, e.g. stream and memory_limit
+    """
+    if backend not in BACKENDS:
+        raise ValueError('backend must be one of {}. Given {}'.format(
+            BACKENDS, backend))
+    if curve_tolerance is None:
+        curve_tolerance = CURVE_TOLERANCE
+    key = _page_key(pdf, page, backend, dtype, curve_tolerance, kwargs)
+    with _profiler.stage('load_page', page=int(page)):
+        return _cached_page(key, lambda: _load_page(
+            pdf, page, backend, dtype, curve_tolerance, **kwargs))
+
+
+def _page_key(pdf, page, backend, dtype, curve_tolerance, kwargs=None):
+    """
+    The key of the Paths of a page in the page cache
+    """
+    return _file_key(pdf) + (
+        int(page), 'paths', backend, np.dtype(dtype).str, curve_tolerance,
+        tuple(sorted((kwargs or {}).items())))
+
+
+def _load_page(pdf, page, backend, dtype, curve_tolerance=None, **kwargs):
+    if backend == 'svg':
+        # the whole svg is not kept in the stream mode
+        svg = _to_svg(pdf, page, cache=not kwargs.get('stream', False))
+        paths = Paths(svg, dtype=dtype,
+                      curve_tolerance=curve_tolerance, **kwargs)
+    else:
+        with _profiler.stage('get_drawings'), _open(pdf) as doc:
+            page_obj = doc[int(page)]
+            # get_cdrawings is faster but not available in older PyMuPDF
+            drawings = getattr(page_obj, 'get_cdrawings', None)
+            drawings = drawings() if drawings else page_obj.get_drawings()
+            rect = page_obj.rect
+        paths = Paths.from_drawings(drawings, dtype=dtype,
+                                    curve_tolerance=curve_tolerance)
+        paths.page_box = np.array([rect.x0, rect.y0, rect.x1, rect.y1])
+    paths.source = (pdf, int(page))
     return paths
 
 
+def _color(rgb):
+    if rgb is None:
+        return 'none'
+    return '#{:02x}{:02x}{:02x}'.format(
+        *[int(round(255 * c)) for c in rgb])
+
+
+def _drawing_style(drawing):
+    """
+    Convert the style of a PyMuPDF drawing to svg attributes
+    """
+    style = {'fill': _color(drawing.get('fill'))}
+    if drawing.get('fill') is not None:
+        style['fill-opacity'] = '{:g}'.format(drawing.get('fill_opacity', 1))
+        if drawing.get('even_odd'):
+            style['fill-rule'] = 'evenodd'
+    style['stroke'] = _color(drawing.get('color'))
+    if drawing.get('color') is not None:
+        style['stroke-width'] = '{:g}'.format(drawing.get('width') or 1)
+        style['stroke-opacity'] = '{:g}'.format(
+            drawing.get('stroke_opacity', 1))
+        if drawing.get('dashes') not in (None, '[] 0'):
+            style['stroke-dasharray'] = drawing['dashes']
+        if drawing.get('lineCap') is not None:
+            style['stroke-linecap'] = ['butt', 'round', 'square'][
+                int(max(drawing['lineCap']))]
+        if drawing.get('lineJoin') is not None:
+            style['stroke-linejoin'] = ['miter', 'round', 'bevel'][
+                int(drawing['lineJoin'])]
+    return style
+
+
+def _drawing_vertices(drawing):
+    """
+    The on-curve vertices of a PyMuPDF drawing, and its curves as a list of
+    (index of the end vertex, first control point, second control point)
+    """
+    points = []
+    curves = []
+    # the start of the current subpath, which closePath returns to
+    subpath = None
+    for item in drawing['items']:
+        if item[0] in ('l', 'c'):
+            start, end = tuple(item[1]), tuple(item[-1])
+            if len(points) == 0 or points[-1] != start:
+                subpath = start
+                points.append(start)
+            points.append(end)
+            if item[0] == 'c':
+                curves.append((len(points) - 1, tuple(item[2]),
+                               tuple(item[3])))
+        elif item[0] == 're':
+            x0, y0, x1, y1 = tuple(item[1])
+            subpath = (x0, y0)
+            points += [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
+        elif item[0] == 'qu':
+            ul, ur, ll, lr = [tuple(p) for p in item[1]]
+            subpath = ul
+            points += [ul, ur, lr, ll, ul]
+    if drawing.get('closePath') and len(points) > 0:
+        points.append(subpath)
+    return points, curves
+
+
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_ARC = re.compile(r'[Aa][^MmZzLlHhVvCcSsQqTtAa]*')
+_TRANSFORM = re.compile(
+    r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+# the largest distance between the curves and the polylines approximating
+# them, in the page unit
+CURVE_TOLERANCE = 0.1
+_MAX_CURVE_SEGMENTS = 1024
+# "|" separates the path data of different paths
+_COMMANDS = 'MmZzLlHhVvCcSsQqTtAa|'
+
+# classes of characters in the path data
+_SEPARATOR, _DIGIT, _DOT, _SIGN, _EXPONENT, _COMMAND = range(6)
+_CHAR_CLASS = np.full(256, _SEPARATOR, dtype=np.int8)
+_CHAR_CLASS[np.frombuffer(b'0123456789', dtype=np.uint8)] = _DIGIT
+_CHAR_CLASS[ord('.')] = _DOT
+_CHAR_CLASS[np.frombuffer(b'+-', dtype=np.uint8)] = _SIGN
+_CHAR_CLASS[np.frombuffer(b'eE', dtype=np.uint8)] = _EXPONENT
+_CHAR_CLASS[np.frombuffer(_COMMANDS.encode(), dtype=np.uint8)] = _COMMAND
+# properties of the commands
+_UPPER = np.arange(256, dtype=np.uint8)
+_UPPER[np.frombuffer(_COMMANDS.lower().encode(), dtype=np.uint8)] = \
+    np.frombuffer(_COMMANDS.upper().encode(), dtype=np.uint8)
+_IS_RELATIVE = np.zeros(256, dtype=bool)
+_IS_RELATIVE[np.frombuffer(b'mzlhvcsqta', dtype=np.uint8)] = True
+# number of arguments for each command
+_N_ARGS = np.zeros(256, dtype=np.int64)
+for _command, _n in zip('MLHVCSQTA', [2, 2, 1, 1, 6, 4, 4, 2, 7]):
+    _N_ARGS[ord(_command)] = _N_ARGS[ord(_command.lower())] = _n
+
+
+def _separate_arc_flags(d):
+    """
+    The flags of arcs can be written without separators, e.g.
+    "a1 1 0 00 1 1". This inserts the separators.
+    """
+    def separate(match):
+        args = _NUMBER.findall(match.group()[1:])
+        txt = []
+        for number in args:
+            while len(txt) % 7 in (3, 4) and len(number) > 1:
+                txt.append(number[0])
+                number = number[1:]
+            txt.append(number)
+        return match.group()[0] + ' '.join(txt) + ' '
+    return _ARC.sub(separate, d)
+
+
+def _lex(text):
+    """
+    Split the path data into tokens.
+
+    Returns the characters at the start of the tokens, if they are commands,
+    and the values of the numbers.
+    """
+    chars = np.frombuffer(text.encode(), dtype=np.uint8)
+    cls = _CHAR_CLASS[chars]
+    is_number = cls != _SEPARATOR
+    is_number &= cls != _COMMAND
+    # a number starts after a non-number character or with a sign
+    starts = np.empty_like(is_number)
+    starts[0] = is_number[0]
+    starts[1:] = is_number[1:] & ~is_number[:-1]
+    glued = np.zeros_like(is_number)
+    glued[1:] = (cls[1:] == _SIGN) & is_number[:-1] & (cls[:-1] != _EXPONENT)
+    starts |= glued
+    # the second dot in a number starts a new number, e.g. "1.5.5"
+    first = np.flatnonzero(starts)
+    is_dot = cls == _DOT
+    if (len(first) > 0 and
+            np.add.reduceat(is_dot, first, dtype=np.int64).max() > 1):
+        dots = np.cumsum(is_dot)
+        number_id = np.maximum(np.cumsum(starts) - 1, 0)
+        dots_before = dots - (dots - is_dot)[first][number_id]
+        glued |= is_dot & (dots_before > 1)
+        starts |= glued
+
+    # format the numbers so that np.fromstring can read them
+    spaced = np.where(is_number, chars, ord(' ')).astype(np.uint8)
+    spaced = np.insert(spaced, np.flatnonzero(glued), ord(' '))
+    values = np.fromstring(spaced.tobytes().decode(), sep=' ')
+
+    is_command = cls == _COMMAND
+    position = np.flatnonzero(starts | is_command)
+    is_command = is_command[position]
+    numbers = np.zeros(len(position))
+    numbers[~is_command] = values
+    return chars[position], is_command, numbers
+
+
+def _cumsum_from(values, is_absolute):
+    """
+    Cumulative sum of values, which restarts from the absolute values.
+    The first value must be absolute.
+    """
+    cumsum = np.cumsum(np.where(is_absolute, 0.0, values))
+    last = np.maximum.accumulate(
+        np.where(is_absolute, np.arange(len(values)), 0))
+    return values[last] + cumsum - cumsum[last]
+
+
+def _parse_paths(ds):
+    """
+    Parse a list of svg path data at once.
+
+    Returns the on-curve vertices of all the paths in an array (n, 2), the
+    offsets, where the vertices of i-th path are
+    vertices[offsets[i]:offsets[i + 1]], and the curves.
+    The end points of curves and arcs are included, but not their control
+    points. The curves are (end, c1, c2), the index of the end vertex of
+    each Bézier curve and its control points in the cubic form.
+    Arcs are not included in the curves.
+    """
+    ds = [_separate_arc_flags(d) if 'a' in d or 'A' in d else d for d in ds]
+    chars, is_command, numbers = _lex('|' + '|'.join(ds))
+
+    # the command of each token
+    token = np.arange(len(chars))
+    command_idx = np.maximum.accumulate(np.where(is_command, token, 0))
+    command = chars[command_idx]
+    upper = _UPPER[command]
+    n_args = _N_ARGS[command]
+    arg_idx = token - command_idx - 1
+    # a vertex is made by the last argument of each command, closepath and
+    # the start of each path
+    is_vertex = np.where(
+        is_command, (upper == ord('Z')) | (upper == ord('|')),
+        (n_args > 0) & (arg_idx % np.maximum(n_args, 1) == n_args - 1))
+    idx = np.flatnonzero(is_vertex)
+    upper = upper[idx]
+    is_relative = _IS_RELATIVE[command[idx]]
+    is_path_start = upper == ord('|')
+    is_close = upper == ord('Z')
+    is_h = upper == ord('H')
+    is_v = upper == ord('V')
+
+    x = np.where(is_v, 0.0, numbers[np.where(is_h, idx, idx - 1)])
+    y = np.where(is_h, 0.0, numbers[idx])
+    x[is_path_start | is_close] = 0.0
+    y[is_path_start | is_close] = 0.0
+    is_absolute_x = (~is_relative & ~is_v) | is_path_start | is_close
+    is_absolute_y = (~is_relative & ~is_h) | is_path_start | is_close
+
+    # closepath goes back to the start of the subpath, i.e. the first vertex
+    # of the last moveto. As moveto may be relative to this, iterate until
+    # it converges.
+    vertex = np.arange(len(idx))
+    is_subpath_start = is_path_start | (
+        (upper == ord('M')) & (arg_idx[idx] == 1))
+    subpath_start = np.maximum.accumulate(
+        np.where(is_subpath_start, vertex, 0))[is_close]
+    for _ in range(np.count_nonzero(is_close) + 1):
+        abs_x = _cumsum_from(x, is_absolute_x)
+        abs_y = _cumsum_from(y, is_absolute_y)
+        if (np.array_equal(x[is_close], abs_x[subpath_start]) and
+                np.array_equal(y[is_close], abs_y[subpath_start])):
+            break
+        x[is_close] = abs_x[subpath_start]
+        y[is_close] = abs_y[subpath_start]
+
+    path_idx = np.cumsum(is_path_start) - 1
+    offsets = np.zeros(len(ds) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(path_idx[~is_path_start], minlength=len(ds)),
+              out=offsets[1:])
+    vertices = np.stack([abs_x, abs_y], axis=-1)
+    c1, c2, curve = _control_points(
+        vertices, upper, is_relative, idx, numbers)
+    index = np.cumsum(~is_path_start) - 1
+    return vertices[~is_path_start], offsets, (index[curve], c1, c2)
+
+
+def _control_points(vertices, upper, is_relative, idx, numbers):
+    """
+    The control points of the curves in the parsed path data, in the cubic
+    form. Returns c1, c2 and the indices of the end vertices of the curves.
+    """
+    curve = np.flatnonzero(
+        (upper == ord('C')) | (upper == ord('S')) | (upper == ord('Q')) |
+        (upper == ord('T')))
+    command = upper[curve]
+    start, end = vertices[curve - 1], vertices[curve]
+    last = idx[curve]
+
+    def argument(i):
+        # the i-th pair of the arguments of the commands
+        j = np.clip(last - 1 - 2 * (_N_ARGS[command] // 2 - 1 - i), 0,
+                    max(len(numbers) - 2, 0))
+        point = np.stack([numbers[j], numbers[j + 1]], axis=-1)
+        return np.where(is_relative[curve][:, np.newaxis],
+                        point + start, point)
+
+    is_cubic = (command == ord('C')) | (command == ord('S'))
+    c1 = argument(0)
+    c2 = np.where(is_cubic[:, np.newaxis], argument(1), np.nan)
+    # the reflections of the last control points of the previous curves
+    previous = np.full((len(vertices), 2), np.nan)
+    previous[curve[command == ord('C')]] = c2[command == ord('C')]
+    is_s = command == ord('S')
+    previous[curve[is_s]] = c2[is_s] = c1[is_s]
+    reflected = previous[curve[is_s] - 1]
+    c1[is_s] = np.where(np.isnan(reflected), start[is_s],
+                        2 * start[is_s] - reflected)
+    # quadratic curves, in which T reflects the previous control point
+    previous[:] = np.nan
+    is_q = command == ord('Q')
+    previous[curve[is_q]] = c1[is_q]
+    for i in np.flatnonzero(command == ord('T')):
+        reflected = previous[curve[i] - 1]
+        c1[i] = start[i] if np.isnan(reflected).any() else (
+            2 * start[i] - reflected)
+        previous[curve[i]] = c1[i]
+    is_quadratic = ~is_cubic
+    q = c1[is_quadratic]
+    c1[is_quadratic] = start[is_quadratic] + 2 / 3 * (
+        q - start[is_quadratic])
+    c2[is_quadratic] = end[is_quadratic] + 2 / 3 * (q - end[is_quadratic])
+    return c1, c2, curve
+
+
+def _flatten(vertices, offsets, curves, tolerance=None):
+    """
+    Insert the points on the cubic Bézier curves before their end vertices,
+    so that the polylines deviate from the curves by at most tolerance.
+
+    curves: (end, c1, c2), the index of the end vertex of each curve and its
+        control points. A curve starts at the previous vertex.
+    The number of the segments of each curve is given by the bound of
+    Wang's formula, and all the curves are evaluated at once.
+    Returns the vertices and the offsets.
+    """
+    tolerance = CURVE_TOLERANCE if tolerance is None else tolerance
+    end, c1, c2 = curves
+    counts = np.diff(offsets)
+    is_first = np.zeros(len(vertices), dtype=bool)
+    is_first[offsets[:-1][counts > 0]] = True
+    keep = ~is_first[end]
+    end, c1, c2 = end[keep], c1[keep], c2[keep]
+    if len(end) == 0:
+        return vertices, offsets
+    p0 = vertices[end - 1].astype(float)
+    p3 = vertices[end].astype(float)
+    bend = np.maximum(np.linalg.norm(p0 - 2 * c1 + c2, axis=-1),
+                      np.linalg.norm(c1 - 2 * c2 + p3, axis=-1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = np.ceil(np.sqrt(0.75 * bend / tolerance))
+    n = np.clip(np.nan_to_num(n, nan=1, posinf=_MAX_CURVE_SEGMENTS), 1,
+                _MAX_CURVE_SEGMENTS).astype(np.int64)
+    extra = n - 1
+    if extra.sum() == 0:
+        return vertices, offsets
+    # the parameters t of the inserted points
+    curve = np.repeat(np.arange(len(end)), extra)
+    step = np.arange(len(curve)) - np.repeat(np.cumsum(extra) - extra, extra)
+    t = ((step + 1) / n[curve])[:, np.newaxis]
+    s = 1 - t
+    points = (s**3 * p0[curve] + 3 * s**2 * t * c1[curve] +
+              3 * s * t**2 * c2[curve] + t**3 * p3[curve])
+
+    # the number of the points inserted before each vertex
+    inserted = np.zeros(len(vertices) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(end, extra, minlength=len(vertices)).astype(
+        np.int64), out=inserted[1:])
+    result = np.empty((len(vertices) + len(points), 2), dtype=vertices.dtype)
+    position = np.arange(len(vertices)) + inserted[1:]
+    result[position] = vertices
+    result[position[end][curve] - extra[curve] + step] = points
+    return result, offsets + inserted[offsets]
+
+
+def _parse_path_data(d):
+    """
+    Parse svg path data and return the on-curve vertices in an array (n, 2).
+    """
+    return _parse_paths([d])[0]
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_transform(transform):
+    """
+    Parse the svg transform attribute and return (A, b) so that the
+    transformed vertices are vertices @ A + b.
+    """
+    matrix = np.eye(3)
+    for name, args in _TRANSFORM.findall(transform or ''):
+        args = [float(v) for v in _NUMBER.findall(args)]
+        if name == 'matrix':
+            a, b, c, d, e, f = args
+        elif name == 'translate':
+            a, b, c, d, e, f = 1, 0, 0, 1, args[0], (args + [0])[1]
+        elif name == 'scale':
+            a, b, c, d, e, f = args[0], 0, 0, (args * 2)[1], 0, 0
+        elif name == 'rotate':
+            angle = np.deg2rad(args[0])
+            cx, cy = (args + [0, 0])[1:3]
+            cos, sin = np.cos(angle), np.sin(angle)
+            a, b, c, d = cos, sin, -sin, cos
+            e = cx - cos * cx + sin * cy
+            f = cy - sin * cx - cos * cy
+        elif name == 'skewX':
+            a, b, c, d, e, f = 1, 0, np.tan(np.deg2rad(args[0])), 1, 0, 0
+        else:
+            a, b, c, d, e, f = 1, np.tan(np.deg2rad(args[0])), 0, 1, 0, 0
+        # the last transform in the list is applied first
+        matrix = np.array([[a, b, 0], [c, d, 0], [e, f, 1]]) @ matrix
+    return matrix[:2, :2], matrix[2, :2]
+
+
+@_profiled('compute_abs_paths')
+def _compute_abs_paths(ds, transforms, curve_tolerance=None):
+    """
+    Compute the vertices of paths in the page coordinate, with the curves
+    flattened within curve_tolerance in the page unit.
+    Returns the vertices of all the paths and their offsets.
+    """
+    vertices, offsets, (end, c1, c2) = _parse_paths(ds)
+    # transform all the vertices by a single batched matmul
+    unique, inverse = np.unique(
+        np.array(transforms, dtype=object).astype(str), return_inverse=True)
+    matrices = np.zeros((len(unique), 3, 2))
+    # PyMuPDF writes a single matrix, which are read at once
+    is_matrix = np.char.startswith(unique, 'matrix(') & (
+        np.char.count(unique, '(') == 1)
+    if is_matrix.any():
+        args = ' '.join(unique[is_matrix]).replace(',', ' ')
+        matrices[is_matrix] = np.fromstring(
+            re.sub(r'[^-+\d.eE ]', ' ', args), sep=' ').reshape(-1, 3, 2)
+    for i in np.flatnonzero(~is_matrix):
+        scale, offset = _parse_transform(unique[i])
+        matrices[i, :2] = scale
+        matrices[i, 2] = offset
+    matrices = matrices[inverse.ravel()]
+    scale, offset = matrices[:, :2], matrices[:, 2]
+    path_idx = np.repeat(np.arange(len(ds)), np.diff(offsets))
+    vertices = np.einsum(
+        'ni,nij->nj', vertices, scale[path_idx]) + offset[path_idx]
+    c1, c2 = [np.einsum('ni,nij->nj', c, scale[path_idx[end]]) +
+              offset[path_idx[end]] for c in (c1, c2)]
+    return _flatten(vertices, offsets, (end, c1, c2), curve_tolerance)
+
+
+def _compute_abs_path(d, transform=None, curve_tolerance=None):
+    """
+    Compute the vertices of a path in the page coordinate
+    """
+    return _compute_abs_paths([d], [transform], curve_tolerance)[0]
+
+
+def _unit(length):
+    """
+    The unit of svg length. PyMuPDF writes the page size in pt, with or
+    without the unit.
+    """
+    unit = _NUMBER.sub('', length, count=1).strip()
+    return unit if unit else 'pt'
+
+
+_ATTRIBUTE_ENTITIES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+    '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+
+
+def _quoteattr(value):
+    """
+    value quoted as an xml attribute, as xml.sax.saxutils.quoteattr, which
+    takes long to import with urllib
+    """
+    return '"{}"'.format(str(value).translate(_ATTRIBUTE_ENTITIES))
+
+
+def _iterparse(source, size=1 << 16):
+    """
+    Yields the start and end events of the elements in an svg, given as a
+    string or a file object, without copying it.
+    """
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    if hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(size), source.read(0))
+    else:
+        chunks = (source[i:i + size] for i in range(0, len(source), size))
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+_NUMERIC_STYLES = {
+    'fill-opacity', 'opacity', 'stroke-dashoffset', 'stroke-miterlimit',
+    'stroke-opacity', 'stroke-width'}
+_COLOR_NAMES = {
+    'black': '#000000', 'white': '#ffffff', 'red': '#ff0000',
+    'green': '#008000', 'blue': '#0000ff', 'transparent': 'none'}
+_RGB = re.compile(
+    r'rgb\(\s*([^,\s]+)\s*,\s*([^,\s]+)\s*,\s*([^,\s)]+)\s*\)')
+
+
+def _normalize_number(value):
+    try:
+        return '{:g}'.format(float(value))
+    except ValueError:
+        return value
+
+
+def _normalize_color(value):
+    value = _COLOR_NAMES.get(value, value)
+    if re.fullmatch('#[0-9a-f]{3}', value):
+        return '#' + ''.join(c * 2 for c in value[1:])
+    match = _RGB.fullmatch(value)
+    if match is not None:
+        rgb = [float(v[:-1]) * 2.55 if v.endswith('%') else float(v)
+               for v in match.groups()]
+        return '#{:02x}{:02x}{:02x}'.format(*[int(round(c)) for c in rgb])
+    return value
+
+
+def _normalize_style(style):
+    """
+    Normalize the svg style attributes, so that the same style has the same
+    representation.
+    The properties in the style attribute are expanded, and the colors and
+    the numbers are written in the same way as _drawing_style.
+    """
+    style = dict(style)
+    if 'style' in style:
+        for item in style.pop('style').split(';'):
+            if ':' in item:
+                key, value = item.split(':', 1)
+                style.setdefault(key.strip(), value)
+    result = {}
+    for key, value in style.items():
+        key = key.strip().lower()
+        value = ' '.join(str(value).split())
+        if key in _NUMERIC_STYLES:
+            value = _normalize_number(value)
+        elif key in ('fill', 'stroke', 'color'):
+            value = _normalize_color(value.lower())
+        elif key == 'stroke-dasharray':
+            value = ' '.join(_normalize_number(v)
+                             for v in value.replace(',', ' ').split())
+        result[key] = value
+    return tuple(sorted(result.items()))
+
+
+def _index_by(ids, n):
+    """
+    Indices of the items having each id, i.e. a list of n arrays
+    """
+    order = np.argsort(ids, kind='stable')
+    counts = np.bincount(ids, minlength=n)
+    return np.split(order, np.cumsum(counts)[:-1])
+
+
+def _mix64(x):
+    """
+    Mix the bits of uint64 array x (splitmix64), to hash a combination of
+    integers
+    """
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+class _StyleTable:
+    """
+    Interns the styles of paths
+    """
+    def __init__(self):
+        self.styles = []
+        self.ids = {}
+        self._style_id = []
+
+    def append(self, style):
+        # the styles are often repeated without change
+        key = tuple(sorted(style.items()))
+        if key not in self.ids:
+            normalized = _normalize_style(style)
+            if normalized not in self.ids:
+                self.ids[normalized] = len(self.styles)
+                self.styles.append(normalized)
+            self.ids[key] = self.ids[normalized]
+        self._style_id.append(self.ids[key])
+
+    @property
+    def style_id(self):
+        return np.array(self._style_id, dtype=np.int32)
+
+
+class _VertexBuffer:
+    """
+    Accumulates vertices. Once they exceed memory_limit in bytes, they are
+    written to a temporary file, which is read as np.memmap at the end.
+    """
+    def __init__(self, dtype, memory_limit=None):
+        self.dtype = np.dtype(dtype)
+        self.memory_limit = memory_limit
+        self.chunks = []
+        self.nbytes = 0
+        self.size = 0
+        self.file = None
+
+    def append(self, vertices):
+        vertices = np.ascontiguousarray(vertices, dtype=self.dtype)
+        self.size += len(vertices)
+        self.nbytes += vertices.nbytes
+        if (self.file is None and self.memory_limit is not None and
+                self.nbytes > self.memory_limit):
+            # spill to disk
+            self.file = tempfile.TemporaryFile(prefix='digitizer_')
+            for chunk in self.chunks:
+                chunk.tofile(self.file)
+            self.chunks = []
+        if self.file is not None:
+            vertices.tofile(self.file)
+        else:
+            self.chunks.append(vertices)
+
+    def finish(self):
+        if self.file is None:
+            if len(self.chunks) == 0:
+                return np.zeros((0, 2), dtype=self.dtype)
+            return np.concatenate(self.chunks, axis=0)
+        self.file.flush()
+        if self.size == 0:
+            return np.zeros((0, 2), dtype=self.dtype)
+        return np.memmap(self.file, dtype=self.dtype, mode='r',
+                         shape=(self.size, 2))
+
+
 class Path:
-    def __init__(self, path):
-        self.path = path
-        self._abs_path = None
+    """
+    A light-weight view of a path stored in Paths
+    """
+    __slots__ = ('parent', 'index')
+
+    def __init__(self, parent, index):
+        self.parent = parent
+        self.index = index
 
     @property
     def abs_path(self):
-        if self._abs_path is None:
-            # compute self._abs_path
-            self._abs_path = _compute_abs_path(self.path)
-        return self._abs_path
+        start, stop = self.parent.offsets[self.index:self.index + 2]
+        return self.parent.vertices[start:stop]
+
+    @property
+    def style_id(self):
+        return self.parent.style_id[self.index]
+
+    @property
+    def attributes(self):
+        """
+        The svg attributes of this path
+        """
+        attrs = dict(self.parent.styles[self.style_id])
+        attrs['d'] = self.parent.d[self.index]
+        attrs['transform'] = self.parent.transform[self.index]
+        return attrs
 
     def distance2(self, point):
         """
         Return nearest distance
         """
-        if len(self.abs_path) == 0:
+        abs_path = self.abs_path
+        if len(abs_path) == 0:
             return np.nan
-        elif len(self.abs_path) == 1:
+        elif len(abs_path) == 1:
             # if this path is a single point
-            dx = self.abs_path[0] - point
-            return dx @ dx        
-        
-        distances = [
-            geometry.distance2(
-                point, self.abs_path[i], self.abs_path[i+1]) 
-            for i in range(len(self.abs_path) - 1)]
-        return np.min(distances)
+            return geometry.distance2(point, abs_path[0])
+        return np.nanmin(
+            geometry.distance2(point, abs_path[:-1], abs_path[1:]))
 
     def closest_point(self, point):
         """
         Return the nearest point and distace
         """
-        if len(self.abs_path) == 0:
+        abs_path = self.abs_path
+        if len(abs_path) == 0:
+            return np.nan
+        idx = np.nanargmin(geometry.distance2(point, abs_path))
+        return abs_path[idx]
+
+    def projection(self, point):
+        """
+        Return the point on this path closest to the given point
+        """
+        abs_path = self.abs_path
+        if len(abs_path) == 0:
             return np.nan
-        idx = np.nanargmin([
-            geometry.distance2(point, path)
-            for path in self.abs_path
-        ])
-        return self.abs_path[idx]
+        if len(abs_path) == 1:
+            return abs_path[0]
+        x0, x1 = abs_path[:-1], abs_path[1:]
+        idx = np.nanargmin(geometry.distance2(point, x0, x1))
+        return geometry.project(point, x0[idx], x1[idx])[1]
 
     def is_inside(self, xmin, xmax):
-        return all([
-            ((xmin <= path) * (path <= xmax)).all() 
-            for path in self.abs_path
-        ])
-    
+        bbox = self.parent.bbox[self.index]
+        return bool((xmin <= bbox[:2]).all() and (bbox[2:] <= xmax).all())
+
     @property
     def size2(self):
-        if len(self.abs_path) == 0:
-            return 0
-        dx = np.nanmax(self.abs_path, axis=0) - np.nanmin(self.abs_path)
-        return dx @ dx
+        return self.parent.size2[self.index]
 
     @property
     def center(self):
-        abs_path = np.stack(self.abs_path, axis=0)
-        return 0.5 * (
-            np.nanmax(abs_path, axis=0) + np.nanmin(abs_path, axis=0)
-        )
+        return self.parent.centers[self.index]
 
 
 class Paths:
     """
     A collection of paths
+
+    All the vertices are stored in a single array, `vertices`, and the
+    vertices of i-th path are vertices[offsets[i]:offsets[i + 1]].
     """
-    def __init__(self, svg_txt):
-        self.svg = svg_txt
-        doc = minidom.parseString(svg_txt)
-        # common attribute: style, d, id
-        self.paths = [
-            Path(path) for path in doc.getElementsByTagName('path')
-            if len(path.attributes.keys()) > 2]
-        # only consider paths having other than transform and d
-        width = doc.getElementsByTagName('svg')[0].getAttribute('width')
-        self.unit = width[-4:]        
-        
+    # precision of the shapes compared in shape_signature, in the page unit
+    shape_tolerance = 1e-2
+    # the paths separated by more than region_gap belong to different
+    # regions, and those within region_margin of an axis frame to its figure
+    region_gap = 7.2
+    region_margin = 36.0
+    # the smallest axis frame
+    min_frame = 36.0
+    # the highlighted paths with more vertices are drawn simplified within
+    # overlay_tolerance, in the page unit
+    overlay_max_vertices = 20000
+    overlay_tolerance = 0.5
+    # resolution of hit_buffer
+    hit_dpi = 72
+
+    @_profiled('parse_svg')
+    def __init__(self, svg_txt, dtype=np.float64, stream=False,
+                 memory_limit=None, chunk_size=1 << 18, curve_tolerance=None):
+        """
+        svg_txt: svg image as a string or a file object
+        stream: If True, only the geometry and the style of the paths are
+            kept, and the svg and the path data are dropped.
+            The svg is generated again from the source pdf if necessary.
+        memory_limit: If the vertices exceed this size in bytes, they are
+            moved to a temporary file and read via np.memmap.
+        chunk_size: size of the path data in bytes parsed at once
+        curve_tolerance: the curves are approximated by polylines within
+            this distance in the page unit. CURVE_TOLERANCE by default.
+        """
+        if hasattr(svg_txt, 'read'):
+            self._svg = None
+        else:
+            self._svg = None if stream else svg_txt
+        # (pdf, page) this page is read from
+        self.source = None
+
+        buffer = _VertexBuffer(dtype, memory_limit)
+        counts = []
+        styles = _StyleTable()
+        d, transform = [], []
+        chunk_d, chunk_transform = [], []
+        chunk_bytes = 0
+
+        def parse_chunk():
+            vertices, offsets = _compute_abs_paths(
+                chunk_d, chunk_transform, curve_tolerance)
+            buffer.append(vertices)
+            counts.append(np.diff(offsets))
+            if not stream:
+                d.extend(chunk_d)
+                transform.extend(chunk_transform)
+            chunk_d.clear()
+            chunk_transform.clear()
+
+        # parse the svg incrementally, discarding the parsed elements
+        width = None
+        view_box = None
+        parents = []
+        for event, element in _iterparse(svg_txt):
+            if event == 'start':
+                if width is None:
+                    width = element.get('width', '')
+                    view_box = element.get('viewBox')
+                parents.append(element)
+                continue
+            parents.pop()
+            # common attribute: style, d, id
+            # only consider paths having other than transform and d
+            if (element.tag.rsplit('}', 1)[-1] == 'path' and
+                    len(element.attrib) > 2):
+                attrs = dict(element.attrib)
+                chunk_d.append(attrs.pop('d', ''))
+                chunk_transform.append(attrs.pop('transform', ''))
+                styles.append(attrs)
+                chunk_bytes += len(chunk_d[-1])
+                if chunk_bytes >= chunk_size:
+                    parse_chunk()
+                    chunk_bytes = 0
+            if len(parents) > 0:
+                del parents[-1][-1]
+        parse_chunk()
+
+        counts = np.concatenate(counts)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        self._setup(
+            buffer.finish(), offsets, styles.style_id, styles.styles,
+            unit=_unit(width or ''), dtype=dtype,
+            d=None if stream else d, transform=None if stream else transform)
+        if view_box:
+            x, y, w, h = map(float, _NUMBER.findall(view_box)[:4])
+            self.page_box = np.array([x, y, x + w, y + h])
+
+    @classmethod
+    def from_arrays(cls, vertices, offsets, styles, style_id=None, unit='pt',
+                    svg=None, dtype=np.float64, d=None, transform=None,
+                    bbox=None):
+        """
+        Construct from the vertices of all the paths (n, 2), their offsets
+        and a list of style dicts, one for each path.
+        If style_id is given, styles is the list of the distinct styles
+        and style_id is the index of the style of each path.
+        bbox: the bounding boxes (xmin, ymin, xmax, ymax) of the paths, which
+            are computed if not given.
+        """
+        obj = cls.__new__(cls)
+        obj._svg = svg
+        obj.source = None
+        if style_id is None:
+            table = _StyleTable()
+            for style in styles:
+                table.append(style)
+            style_id, styles = table.style_id, table.styles
+        obj._setup(vertices, offsets, style_id, styles, unit=unit,
+                   dtype=dtype, d=d, transform=transform, bbox=bbox)
+        return obj
+
+    @classmethod
+    @_profiled('from_drawings')
+    def from_drawings(cls, drawings, dtype=np.float64, curve_tolerance=None):
+        """
+        Construct from the vector drawings of PyMuPDF,
+        i.e. Page.get_drawings().
+        curve_tolerance: as in Paths
+        """
+        converted = [_drawing_vertices(drawing) for drawing in drawings]
+        vertices = [v for v, _ in converted]
+        curves = [c for _, c in converted]
+        offsets = np.zeros(len(vertices) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in vertices], out=offsets[1:])
+        vertices = np.array(
+            [x for v in vertices for x in v], dtype=dtype).reshape(-1, 2)
+        end = np.array([offsets[i] + c[0] for i, curve in enumerate(curves)
+                        for c in curve], dtype=np.int64)
+        c1, c2 = [np.array([c[j] for curve in curves for c in curve],
+                           dtype=float).reshape(-1, 2) for j in (1, 2)]
+        vertices, offsets = _flatten(
+            vertices, offsets, (end, c1, c2), curve_tolerance)
+        styles = [_drawing_style(drawing) for drawing in drawings]
+        return cls.from_arrays(vertices, offsets, styles, dtype=dtype)
+
+    @property
+    def svg(self):
+        """
+        The svg image of this page. If it is not given, it is generated from
+        the source pdf at the first access.
+        """
+        if self._svg is None and self.source is not None:
+            self._svg = _to_svg(*self.source)
+        return self._svg
+
+    def _setup(self, vertices, offsets, style_id, styles, unit, dtype,
+               d=None, transform=None, bbox=None):
+        self.unit = unit
+        # (xmin, ymin, xmax, ymax) of the page, if known
+        self.page_box = None
+        self.vertices = np.asarray(vertices, dtype=dtype).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        n = len(self.offsets) - 1
+        self.style_id = np.asarray(style_id, dtype=np.int32)
+        self.styles = [tuple(sorted(dict(style).items())) for style in styles]
+
+        self.d = d if d is not None else [None] * n
+        self.transform = transform if transform is not None else [None] * n
+        self._compute_bbox(bbox)
+        self.paths = [Path(self, i) for i in range(n)]
+        self._segments = None
+        self._style_index = None
+        self._series_id = None
+        self._series_index = None
+        self._regions = None
+        self._region_id = None
+        self._region_index = None
+        self._region_segments = {}
+        self._level_of_detail = None
+        self._hit_buffer = None
+
+    @_profiled('compute_bbox')
+    def _compute_bbox(self, bbox=None):
+        """
+        Compute the bounding boxes, centers and sizes of all the paths.
+        The bounding boxes are not computed if given.
+        """
+        counts = np.diff(self.offsets)
+        nonempty = counts > 0
+        if bbox is not None:
+            self.bbox = bbox
+        else:
+            self.bbox = np.full(
+                (len(counts), 4), np.nan, dtype=self.vertices.dtype)
+        if bbox is None and nonempty.any():
+            starts = self.offsets[:-1][nonempty]
+            self.bbox[nonempty, :2] = np.fmin.reduceat(
+                self.vertices, starts, axis=0)
+            self.bbox[nonempty, 2:] = np.fmax.reduceat(
+                self.vertices, starts, axis=0)
+        self.centers = 0.5 * (self.bbox[:, :2] + self.bbox[:, 2:])
+        dx = self.bbox[:, 2:] - self.bbox[:, :2]
+        self.size2 = np.where(nonempty, np.sum(dx**2, axis=-1), 0)
+
+    @property
+    def segments(self):
+        """
+        All the segments in this page, (x0, x1, owner), where owner is the
+        index of the path each segment belongs to.
+        A path with a single point is a segment with x0 == x1.
+        """
+        if self._segments is None:
+            counts = np.diff(self.offsets)
+            owner = np.repeat(np.arange(len(counts)), counts)
+            # a segment connects consecutive vertices of the same path
+            start = np.flatnonzero(owner[:-1] == owner[1:])
+            stop = start + 1
+            single = self.offsets[:-1][counts == 1]
+            start = np.concatenate([start, single])
+            stop = np.concatenate([stop, single])
+            order = np.argsort(start, kind='stable')
+            start, stop = start[order], stop[order]
+            self._segments = (
+                self.vertices[start], self.vertices[stop], owner[start])
+        return self._segments
+
     def _to_inch(self, val):
         if self.unit[-2:] == 'pt':
             return val / 72
@@ -160,28 +1330,62 @@ class Paths:
         else:
             raise NotImplementedError
 
-    def find_nearest(self, point):
+    def find_nearest(self, point, region=None):
         """
         Find the nearest path with given points = (x, y) with unit inch
         
         if node is True, we find the closest node
+        region: only the paths in the region of this index if given
         """
-        point = self._from_inch(np.array(point))
-        distances = [path.distance2(point) for path in self.paths]
-        if len(distances) == 0:
+        paths = self.find_k_nearest(point, k=1, region=region)
+        if len(paths) == 0:
             return None
-        i = np.nanargmin(distances)
-        
-        return self.paths[i]
+        return paths[0]
+
+    @_profiled('find_nearest')
+    def find_k_nearest(self, point, k, region=None):
+        """
+        Find k paths nearest to the given point = (x, y) with unit inch,
+        sorted by the distance.
+        region: only the paths in the region of this index if given
+        """
+        point = self._from_inch(np.array(point))
+        x0, x1, owner = self._region_segments_of(region)
+        if len(owner) == 0:
+            return []
+        # distance to the closest segment of each path
+        starts = np.flatnonzero(np.diff(owner, prepend=-1))
+        distances = np.fmin.reduceat(
+            geometry.distance2(point, x0, x1), starts)
+        idx, distances = geometry.argsmallest(distances, k)
+        return [self.paths[i] for i in owner[starts[idx]]]
+
+    @property
+    def hit_buffer(self):
+        """
+        hittest.HitBuffer of this page at hit_dpi, for find_nearest by a
+        lookup of the pixels around the point
+        """
+        if self._hit_buffer is None:
+            with profile_stage('hit_buffer'):
+                self._hit_buffer = hittest.HitBuffer(self, self.hit_dpi)
+        return self._hit_buffer
 
-    def find_inside(self, point0, point1):
+    @_profiled('find_inside')
+    def find_inside(self, point0, point1, region=None):
         x = self._from_inch(np.stack([point0, point1], axis=0))
         xmin, xmax = np.min(x, axis=0), np.max(x, axis=0)
-        
-        paths = [path for path in self.paths if path.is_inside(xmin, xmax)]
-        if len(paths) > 0:
-            idx = np.argmax([path.size2 for path in paths])
-            return paths[idx]
+
+        candidates = self._region_paths(region)
+        bbox = self.bbox if candidates is None else self.bbox[candidates]
+        inside = np.flatnonzero(
+            np.all(xmin <= bbox[:, :2], axis=-1) &
+            np.all(bbox[:, 2:] <= xmax, axis=-1))
+        if candidates is not None:
+            inside = candidates[inside]
+        if len(inside) > 0:
+            idx = np.argmax(self.size2[inside])
+            return self.paths[inside[idx]]
         else:
             return None
 
@@ -189,63 +1393,562 @@ class Paths:
         point = self._from_inch(np.array(point))
         return path.closest_point(point)
 
-    def appended_svd(self, given_path, point=None, svg0=None):
-        if svg0 is None:
-            svg0 = self.svg[:self.svg.find('</svg>')]
-        txt = svg0
+    def _path_to_svg(self, path, **attrs):
+        """
+        Returns the svg element of path, with the attributes overwritten
+        """
+        attributes = path.attributes
+        if attributes['d'] is None:
+            # draw the polyline in the page coordinate
+            attributes['d'] = 'M ' + ' L '.join(
+                '{} {}'.format(*x) for x in path.abs_path)
+            attributes['transform'] = 'matrix(1,0,0,1,0,0)'
+        attributes.update(attrs)
+        return '<path {}/>'.format(' '.join(
+            '{}={}'.format(k, _quoteattr(v)) for k, v in attributes.items()
+            if v is not None))
+
+    @_profiled('overlay_svg')
+    def overlay_svg(self, given_path, point=None):
+        """
+        Returns the svg elements highlighting given_path and point, which are
+        drawn over the page.
+        """
         color = '#FF0000'
-        # copy
         if not isinstance(given_path, list):
             given_path = [given_path]
-        # keep oritinal attributes
-        attrs = []
-        for p in given_path:
-            attrs.append(
-                {k: v for k, v in p.path.attributes.items()}
-            )
-
-        path = copy.copy(given_path[0].path)
-        for p in given_path:
-            path = copy.copy(p.path)
-            path.setAttribute('stroke', color)
-            path.setAttribute('stroke-width', '3')
-            path.setAttribute('fill', 'none')
-            txt = txt + path.toxml() + '\n'
+
+        attrs = {'stroke': color, 'fill': 'none', 'stroke-width': '3'}
+        if sum(len(p.abs_path) for p in given_path) > self.overlay_max_vertices:
+            elements = [
+                self._path_to_svg(
+                    p, d='M ' + ' L '.join('{} {}'.format(*x) for x in v),
+                    transform='matrix(1,0,0,1,0,0)', **attrs)
+                for p, v in zip(given_path, self.decimated(
+                    [p.index for p in given_path],
+                    self.overlay_max_vertices))]
+        else:
+            elements = [self._path_to_svg(p, **attrs) for p in given_path]
 
         if point is not None:
             # draw the point
             dp = 0.1
-            path = copy.copy(given_path[0].path)
-            path.setAttribute('d', 
-            'M {} {} v {} h {} v -{} z'.format(
-                *(point - dp), dp, dp, dp))
-            path.setAttribute('stroke-width', '3')
-            path.setAttribute('stroke-linejoin', "round")
-            path.setAttribute(
-                'transform',
-                "matrix(1,0,0,1,0,0)")
-
-            txt = txt + path.toxml()
-        txt = txt + '\n</svg>'
-        
-        # make sure the original path does not change
-        for p, a in zip(given_path, attrs):
-            keys = list(p.path.attributes.keys())
-            for k in keys:
-                p.path.removeAttribute(k)
-
-            for k, v in a.items():
-                p.path.setAttribute(k, v)
-        return txt
-
-    def group(self, path):
-        """
-        returns a list of paths sharing the same style
-        """
-        attrs = {k: v for k, v in path.path.attributes.items()
-                 if k not in ['d', 'transform']}
-        paths = []
-        for path in self.paths:
-            if all(attrs[k] == path.path.getAttribute(k) for k in attrs.keys()):
-                paths.append(path)
-        return paths
\ No newline at end of file
+            elements.append(self._path_to_svg(
+                given_path[0],
+                d='M {} {} v {} h {} v -{} z'.format(*(point - dp), dp, dp, dp),
+                transform='matrix(1,0,0,1,0,0)',
+                **{'stroke-width': '3', 'stroke-linejoin': 'round'}))
+        return '\n'.join(elements)
+
+    @property
+    def level_of_detail(self):
+        """
+        decimate.LevelOfDetail of all the vertices, from overlay_tolerance
+        """
+        if self._level_of_detail is None:
+            self._level_of_detail = decimate.LevelOfDetail(
+                self.vertices, self.overlay_tolerance, self.offsets)
+        return self._level_of_detail
+
+    @_profiled('decimated')
+    def decimated(self, index, max_vertices):
+        """
+        The vertices of the paths of index at the finest level of detail
+        with at most max_vertices vertices in total
+        """
+        index = np.asarray(index, dtype=np.int64)
+        starts, stops = self.offsets[index], self.offsets[index + 1]
+        if stops.sum() - starts.sum() <= max_vertices:
+            return [self.vertices[a:b] for a, b in zip(starts, stops)]
+        lod = self.level_of_detail
+        for kept in lod.indices:
+            lo = np.searchsorted(kept, starts)
+            hi = np.searchsorted(kept, stops)
+            if (hi - lo).sum() <= max_vertices:
+                break
+        return [self.vertices[kept[a:b]] for a, b in zip(lo, hi)]
+
+    @_profiled('appended_svd')
+    def appended_svd(self, given_path, point=None, svg0=None):
+        if svg0 is None:
+            svg0 = self.svg[:self.svg.find('</svg>')]
+        return svg0 + self.overlay_svg(given_path, point) + '\n</svg>'
+
+    @property
+    def style_index(self):
+        """
+        Indices of the paths having each style, i.e.
+        style_index[i] is the array of the paths with styles[i].
+        """
+        if self._style_index is None:
+            self._style_index = _index_by(self.style_id, len(self.styles))
+        return self._style_index
+
+    def style_groups(self):
+        """
+        Returns a list of (style_id, number of paths, style dict) for all the
+        styles, from the most common one.
+        """
+        counts = np.array([len(idx) for idx in self.style_index], dtype=int)
+        return [(int(i), int(counts[i]), dict(self.styles[i]))
+                for i in np.argsort(-counts, kind='stable') if counts[i] > 0]
+
+    def shape_signature(self, tolerance=None):
+        """
+        A hash of the shape of each path, which is the same for the paths
+        translated from each other, e.g. the markers of a scatter plot.
+        The vertices relative to the corner of the bounding box are compared
+        at the precision of tolerance in the page unit.
+        """
+        tolerance = self.shape_tolerance if tolerance is None else tolerance
+        counts = np.diff(self.offsets)
+        nonempty = counts > 0
+        owner = np.repeat(np.arange(len(counts)), counts)
+        relative = self.vertices - self.bbox[owner, :2]
+        quantized = np.round(np.nan_to_num(relative) / tolerance).astype(
+            np.int64).view(np.uint64)
+        # position of each vertex in its path
+        position = np.arange(len(owner)) - self.offsets[owner]
+        with np.errstate(over='ignore'):
+            h = _mix64(quantized[:, 0] ^ _mix64(
+                quantized[:, 1] ^ _mix64(position.view(np.uint64))))
+            signature = np.zeros(len(counts), dtype=np.uint64)
+            if nonempty.any():
+                signature[nonempty] = np.add.reduceat(
+                    h, self.offsets[:-1][nonempty])
+            size = np.round(np.nan_to_num(
+                self.bbox[:, 2:] - self.bbox[:, :2]) / tolerance).astype(
+                    np.int64).view(np.uint64)
+            return _mix64(signature ^ _mix64(
+                counts.view(np.uint64) ^ _mix64(size[:, 0] ^ _mix64(
+                    size[:, 1]))))
+
+    @property
+    def series_id(self):
+        """
+        Index of the series of each path, i.e. the set of the paths with the
+        same style and the same shape.
+        """
+        if self._series_id is None:
+            signature = self.shape_signature()
+            key = np.stack([self.style_id.astype(np.uint64), signature],
+                           axis=1)
+            _, self._series_id = np.unique(key, axis=0, return_inverse=True)
+            self._series_id = self._series_id.reshape(-1)
+        return self._series_id
+
+    @property
+    def series_index(self):
+        """
+        Indices of the paths in each series
+        """
+        if self._series_index is None:
+            n = self.series_id.max() + 1 if len(self.series_id) > 0 else 0
+            self._series_index = _index_by(self.series_id, n)
+        return self._series_index
+
+    def group_index(self, path, shape=False, region=None):
+        """
+        Indices of the paths sharing the same style as path, in the region
+        of the index if given.
+        If shape is True, only those having the same shape are included.
+        """
+        if shape:
+            index = self.series_index[self.series_id[path.index]]
+        else:
+            index = self.style_index[path.style_id]
+        if region is not None:
+            index = index[self.region_id[index] == region]
+        return index
+
+    @_profiled('group')
+    def group(self, path, shape=False, region=None):
+        """
+        returns a list of paths sharing the same style.
+        If shape is True, only the paths having the same shape, e.g. the
+        markers of a series, are returned.
+        """
+        return [self.paths[i] for i in self.group_index(path, shape, region)]
+
+    def group_centers(self, path, shape=True, region=None):
+        """
+        The centers of the paths in the group of path, (n, 2)
+        """
+        return self.centers[self.group_index(path, shape, region)]
+
+    def frames(self, tolerance=0.5):
+        """
+        The axis frames in this page, (m, 4) array of (xmin, ymin, xmax, ymax).
+
+        A frame is an axis-aligned rectangle not filled with a color, or the
+        box of a horizontal and a vertical line sharing an end, i.e. the
+        spines, larger than min_frame. The frames containing another, e.g.
+        the background of a figure, are excluded.
+        """
+        counts = np.diff(self.offsets)
+        size = self.bbox[:, 2:] - self.bbox[:, :2]
+        with np.errstate(invalid='ignore'):
+            large = np.all(size >= self.min_frame, axis=-1)
+        # not the bars of a bar chart
+        plain = np.array([
+            dict(style).get('fill', 'none') in ('none', '#ffffff')
+            for style in self.styles], dtype=bool)
+        if len(plain) > 0:
+            large &= plain[self.style_id]
+        boxes = []
+        # rectangles: all of 4 or 5 vertices are on the bounding box
+        rect = np.flatnonzero(large & (counts >= 4) & (counts <= 5))
+        if len(rect) > 0:
+            owner = np.repeat(rect, counts[rect])
+            vertices = self.vertices[np.concatenate(
+                [np.arange(self.offsets[i], self.offsets[i + 1])
+                 for i in rect])]
+            bbox = self.bbox[owner]
+            on_edge = np.all(np.minimum(
+                np.abs(vertices - bbox[:, :2]),
+                np.abs(vertices - bbox[:, 2:])) <= tolerance, axis=-1)
+            starts = np.concatenate([[0], np.cumsum(counts[rect])[:-1]])
+            boxes.append(self.bbox[rect[
+                np.logical_and.reduceat(on_edge, starts)]])
+        # spines: the lines sharing an end
+        lines = (counts == 2) & np.any(size >= self.min_frame, axis=-1)
+        horizontal = np.flatnonzero(lines & (size[:, 1] <= tolerance))
+        vertical = np.flatnonzero(lines & (size[:, 0] <= tolerance))
+        if 0 < len(horizontal) * len(vertical) <= 10**6:
+            ends_h = self.bbox[horizontal].reshape(-1, 2, 2)[:, :, 0]
+            ends_v = self.bbox[vertical].reshape(-1, 2, 2)[:, :, 1]
+            # the x of a vertical line at an end of a horizontal one, and
+            # the y of the horizontal line at an end of the vertical one
+            shared = (
+                np.any(np.abs(ends_h[:, np.newaxis, :] -
+                              self.bbox[vertical, 0][:, np.newaxis]) <=
+                       tolerance, axis=-1) &
+                np.any(np.abs(ends_v[np.newaxis, :, :] -
+                              self.bbox[horizontal, 1][:, np.newaxis,
+                                                       np.newaxis]) <=
+                       tolerance, axis=-1))
+            h, v = np.nonzero(shared)
+            boxes.append(np.concatenate([
+                np.minimum(self.bbox[horizontal[h], :2],
+                           self.bbox[vertical[v], :2]),
+                np.maximum(self.bbox[horizontal[h], 2:],
+                           self.bbox[vertical[v], 2:])], axis=1))
+        boxes = [b for b in boxes if len(b) > 0]
+        if len(boxes) == 0:
+            return np.zeros((0, 4))
+        boxes = np.unique(np.concatenate(boxes, axis=0), axis=0)
+        boxes = boxes[np.all(boxes[:, 2:] - boxes[:, :2] >= self.min_frame,
+                             axis=-1)]
+        # contains[i, j]: boxes[i] contains boxes[j]
+        contains = (
+            np.all(boxes[:, np.newaxis, :2] <= boxes[:, :2] + tolerance,
+                   axis=-1) &
+            np.all(boxes[:, 2:] <= boxes[:, np.newaxis, 2:] + tolerance,
+                   axis=-1))
+        np.fill_diagonal(contains, False)
+        same = contains & contains.T
+        drop = np.any(contains & ~same, axis=1) | np.any(
+            np.triu(same).T, axis=1)
+        return boxes[~drop]
+
+    def _components(self, valid):
+        """
+        Label of the connected component of the paths on a grid of
+        region_gap, where the paths overlapping or closer than region_gap
+        are connected.
+        """
+        bbox = self.bbox[valid]
+        origin = bbox[:, :2].min(axis=0)
+        extent = bbox[:, 2:].max(axis=0) - origin
+        gap = max(self.region_gap, extent.max() / 1024, 1e-9)
+        cells = np.floor((bbox - np.tile(origin, 2)) / gap).astype(np.int64)
+        shape = tuple(cells[:, 2:].max(axis=0) + 2)
+        # the cells covered by the paths, by the cumulative sum of corners
+        size = (shape[0] + 1) * (shape[1] + 1)
+        cover = np.zeros(size, dtype=np.int64)
+        for (ix, iy), sign in [((0, 1), 1), ((2, 1), -1), ((0, 3), -1),
+                               ((2, 3), 1)]:
+            flat = ((cells[:, ix] + (ix == 2)) * (shape[1] + 1) +
+                    cells[:, iy] + (iy == 3))
+            cover += sign * np.bincount(flat, minlength=size)
+        cover = cover.reshape(shape[0] + 1, shape[1] + 1)
+        occupied = np.cumsum(np.cumsum(cover, axis=0), axis=1)[
+            :shape[0], :shape[1]] > 0
+        # propagate the largest label to the neighbouring cells
+        label = np.where(occupied, np.arange(occupied.size).reshape(shape),
+                         -1)
+        while True:
+            padded = np.pad(label, 1, constant_values=-1)
+            neighbour = np.max([
+                padded[1 + dx:1 + dx + shape[0], 1 + dy:1 + dy + shape[1]]
+                for dx in (-1, 0, 1) for dy in (-1, 0, 1)], axis=0)
+            updated = np.where(occupied, neighbour, -1)
+            if (updated == label).all():
+                break
+            label = updated
+        center = np.floor((self.centers[valid] - origin) / gap).astype(
+            np.int64)
+        return label[center[:, 0], center[:, 1]]
+
+    @_profiled('segment_regions')
+    def _segment_regions(self):
+        """
+        Cluster the paths into the regions of the figures.
+
+        The paths are first separated at the gaps larger than region_gap.
+        The paths in a cluster containing axis frames are assigned to the
+        frame containing most of their vertices, or to the nearest one
+        within region_margin, and the rest of the cluster is a region of
+        its own. The paths containing a frame, e.g. the background, belong
+        to no region.
+        """
+        n = len(self.paths)
+        region_id = np.full(n, -1, dtype=np.int64)
+        valid = np.flatnonzero(np.all(np.isfinite(self.bbox), axis=-1))
+        if len(valid) == 0:
+            self._regions = np.zeros((0, 4), dtype=self.bbox.dtype)
+            self._region_id = region_id
+            return
+        frames = self.frames()
+        component = self._components(valid)
+        # a key of the region of each valid path, frame index or
+        # len(frames) + component
+        key = len(frames) + component
+        if len(frames) > 0:
+            bbox = self.bbox[valid]
+            container = np.any(
+                np.all(bbox[:, np.newaxis, :2] < frames[:, :2], axis=-1) &
+                np.all(frames[:, 2:] < bbox[:, np.newaxis, 2:], axis=-1),
+                axis=1)
+            # the number of the vertices of each path inside each frame
+            counts = np.diff(self.offsets)
+            owner = np.repeat(np.arange(n), counts)
+            n_inside = np.stack([
+                np.bincount(owner, np.all(
+                    (frame[:2] <= self.vertices) &
+                    (self.vertices <= frame[2:]), axis=-1),
+                    minlength=n)[valid]
+                for frame in frames], axis=1)
+            distance = np.linalg.norm(np.maximum(np.maximum(
+                frames[:, :2] - self.centers[valid][:, np.newaxis],
+                self.centers[valid][:, np.newaxis] - frames[:, 2:]), 0),
+                axis=-1)
+            nearest = np.argmin(distance, axis=1)
+            near = distance[np.arange(len(valid)), nearest] <= (
+                self.region_margin)
+            key = np.where(near, nearest, key)
+            has_inside = n_inside.max(axis=1) > 0
+            key = np.where(has_inside, np.argmax(n_inside, axis=1), key)
+            key = np.where(container, -1, key)
+        keep = key >= 0
+        valid, key = valid[keep], key[keep]
+        unique, key = np.unique(key, return_inverse=True)
+        key = key.reshape(-1)
+        m = len(unique)
+        order = np.argsort(key, kind='stable')
+        starts = np.searchsorted(key[order], np.arange(m))
+        bbox = self.bbox[valid[order]]
+        regions = np.concatenate([
+            np.minimum.reduceat(bbox[:, :2], starts, axis=0),
+            np.maximum.reduceat(bbox[:, 2:], starts, axis=0)], axis=1)
+        # the lines clipped by a frame may extend outside it
+        framed = unique < len(frames)
+        if framed.any():
+            frame = frames[unique[framed]]
+            regions[framed, :2] = np.maximum(
+                regions[framed, :2], frame[:, :2] - self.region_margin)
+            regions[framed, 2:] = np.minimum(
+                regions[framed, 2:], frame[:, 2:] + self.region_margin)
+        # in the order of reading, from the top and then from the left
+        order = np.lexsort([regions[:, 0],
+                            np.round(regions[:, 1] / self.region_margin)])
+        rank = np.empty(m, dtype=np.int64)
+        rank[order] = np.arange(m)
+        region_id[valid] = rank[key]
+        self._regions = regions[order]
+        self._region_id = region_id
+
+    @property
+    def regions(self):
+        """
+        The bounding boxes (xmin, ymin, xmax, ymax) of the figure regions in
+        this page, in the order of reading.
+        """
+        if self._regions is None:
+            self._segment_regions()
+        return self._regions
+
+    @property
+    def region_id(self):
+        """
+        Index of the region each path belongs to, or -1 for no region.
+        """
+        if self._region_id is None:
+            self._segment_regions()
+        return self._region_id
+
+    @property
+    def region_index(self):
+        """
+        Indices of the paths in each region
+        """
+        if self._region_index is None:
+            valid = np.flatnonzero(self.region_id >= 0)
+            index = _index_by(self.region_id[valid], len(self.regions))
+            self._region_index = [valid[i] for i in index]
+        return self._region_index
+
+    def region_at(self, point):
+        """
+        Index of the region at point = (x, y) with unit inch, i.e. the
+        smallest one containing it, or None.
+        """
+        point = self._from_inch(np.array(point))
+        regions = self.regions
+        inside = np.flatnonzero(
+            np.all(regions[:, :2] <= point, axis=-1) &
+            np.all(point <= regions[:, 2:], axis=-1))
+        if len(inside) == 0:
+            return None
+        area = np.prod(regions[inside, 2:] - regions[inside, :2], axis=-1)
+        return int(inside[np.argmin(area)])
+
+    def _region_paths(self, region):
+        """
+        Indices of the paths in the region, or None for all
+        """
+        if region is None:
+            return None
+        return self.region_index[region]
+
+    def _region_segments_of(self, region):
+        """
+        segments of the paths in the region, or all of them if None
+        """
+        if region is None:
+            return self.segments
+        if region not in self._region_segments:
+            x0, x1, owner = self.segments
+            inside = self.region_id[owner] == region
+            self._region_segments[region] = (
+                x0[inside], x1[inside], owner[inside])
+        return self._region_segments[region]
+
+
+class Calibration:
+    """
+    Conversion from the page coordinate to the data values of a figure.
+
+    The values, or their log10 for the log axes, are an affine transform of
+    the page coordinate, `values = page @ matrix + offset`, so that rotated
+    or skewed axes are also supported.
+    """
+    SCALES = ('linear', 'log')
+
+    def __init__(self, matrix=((1, 0), (0, 1)), offset=(0, 0),
+                 xscale='linear', yscale='linear'):
+        for scale in (xscale, yscale):
+            if scale not in self.SCALES:
+                raise ValueError('scale must be one of {}. Given {}'.format(
+                    self.SCALES, scale))
+        self.matrix = np.array(matrix, dtype=float).reshape(2, 2)
+        self.offset = np.array(offset, dtype=float).reshape(2)
+        self.xscale = xscale
+        self.yscale = yscale
+
+    @property
+    def _is_log(self):
+        return np.array([self.xscale == 'log', self.yscale == 'log'])
+
+    @classmethod
+    def from_axes(cls, x, y, xscale='linear', yscale='linear'):
+        """
+        Calibration of axes parallel to the page, from two reference points
+        on each axis, x = [(pic0, real0), (pic1, real1)], where pic is the
+        position in the page coordinate and real is the value.
+        The axis given None is not converted.
+        """
+        scales = []
+        for points, scale in [(x, xscale), (y, yscale)]:
+            if points is None:
+                scales.append((1.0, 0.0))
+                continue
+            (p0, r0), (p1, r1) = points
+            if scale == 'log':
+                r0, r1 = np.log10(r0), np.log10(r1)
+            if p0 == p1:
+                raise ValueError('two reference points are at the same '
+                                 'position')
+            a = (r1 - r0) / (p1 - p0)
+            scales.append((a, r0 - a * p0))
+        return cls(np.diag([scales[0][0], scales[1][0]]),
+                   [scales[0][1], scales[1][1]], xscale, yscale)
+
+    @classmethod
+    def from_points(cls, pic, real, xscale='linear', yscale='linear'):
+        """
+        Calibration of general axes, from three or more points in the page
+        coordinate pic (n, 2) and their values real (n, 2).
+        With more than three points, it is fitted by the least squares.
+        """
+        pic = np.asarray(pic, dtype=float)
+        real = np.array(real, dtype=float)
+        if len(pic) < 3:
+            raise ValueError('at least three points are necessary')
+        obj = cls(xscale=xscale, yscale=yscale)
+        real[:, obj._is_log] = np.log10(real[:, obj._is_log])
+        design = np.concatenate([pic, np.ones((len(pic), 1))], axis=1)
+        coef, _, rank, _ = np.linalg.lstsq(design, real, rcond=None)
+        if rank < 3:
+            raise ValueError('the points are on a line')
+        obj.matrix, obj.offset = coef[:2], coef[2]
+        return obj
+
+    def transform(self, points):
+        """
+        Values of the points (..., 2) in the page coordinate
+        """
+        values = np.asarray(points, dtype=float) @ self.matrix + self.offset
+        is_log = self._is_log
+        if is_log.any():
+            values = np.where(is_log, 10**values, values)
+        return values
+
+    def inverse(self, values):
+        """
+        Positions in the page coordinate of the values (..., 2)
+        """
+        values = np.asarray(values, dtype=float)
+        is_log = self._is_log
+        if is_log.any():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.where(is_log, np.log10(values), values)
+        return (values - self.offset) @ np.linalg.inv(self.matrix)
+
+    def to_dict(self):
+        """
+        A json serializable representation, which is read by from_dict
+        """
+        return {'matrix': self.matrix.tolist(), 'offset': self.offset.tolist(),
+                'xscale': self.xscale, 'yscale': self.yscale}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Construct from to_dict(), or from reference points in the form of
+        {'x': [[pic0, real0], [pic1, real1]], 'y': ..., 'xscale', 'yscale'}
+        or {'pic': [[x, y], ...], 'real': [[x, y], ...], ...}.
+        """
+        scales = {k: d[k] for k in ('xscale', 'yscale') if k in d}
+        if 'matrix' in d:
+            return cls(d['matrix'], d.get('offset', (0, 0)), **scales)
+        if 'pic' in d:
+            return cls.from_points(d['pic'], d['real'], **scales)
+        return cls.from_axes(d.get('x'), d.get('y'), **scales)
+
+    def __eq__(self, other):
+        return (isinstance(other, Calibration) and
+                self.to_dict() == other.to_dict())
+
+    def __repr__(self):
+        return 'Calibration({})'.format(self.to_dict())
@@ -0,0 +1,170 @@
+"""
+Decimation of dense polylines, e.g. a simulated spectrum with hundreds of
+thousands of vertices, for display and export.
+
+All the functions take the vertices of many polylines at once, with the
+offsets where the vertices of i-th polyline are
+points[offsets[i]:offsets[i + 1]], and return the indices of the vertices
+kept, so that the full resolution data is still available.
+"""
+import numpy as np
+
+
+def _offsets(points, offsets):
+    if offsets is None:
+        return np.array([0, len(points)], dtype=np.int64)
+    return np.asarray(offsets, dtype=np.int64)
+
+
+def _ends(offsets):
+    """
+    The first and last vertices of the non-empty polylines
+    """
+    counts = np.diff(offsets)
+    return offsets[:-1][counts > 0], offsets[1:][counts > 0] - 1
+
+
+def rdp(points, tolerance, offsets=None):
+    """
+    Ramer-Douglas-Peucker simplification of the polylines.
+
+    tolerance: the largest distance of the removed vertices from the
+        simplified polylines, a scalar or (tx, ty) for each axis, in the
+        units of points, e.g. the data units of the calibrated values.
+    Returns the sorted indices of the vertices kept.
+
+    All the pending intervals of all the polylines are split at once at each
+    iteration, so that the number of the iterations is the depth of the
+    recursion rather than the number of the intervals. Only the vertices
+    inside the pending intervals are visited at each iteration.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    tolerance = np.broadcast_to(np.asarray(tolerance, dtype=float), (2, ))
+    if (tolerance <= 0).any():
+        return np.arange(len(points))
+    x, y = (points / tolerance).T
+    offsets = _offsets(points, offsets)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[np.concatenate(_ends(offsets))] = True
+    # the vertices to be visited and the ends of their intervals
+    counts = np.diff(offsets)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    idx = np.flatnonzero(~keep)
+    start, stop = offsets[owner[idx]], offsets[owner[idx] + 1] - 1
+    while len(idx) > 0:
+        x0, y0 = x[start], y[start]
+        dx, dy = x[stop] - x0, y[stop] - y0
+        px, py = x[idx] - x0, y[idx] - y0
+        # the squared distance from the segment start-stop
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.clip((px * dx + py * dy) / (dx * dx + dy * dy), 0, 1)
+        t[np.isnan(t)] = 0
+        px -= t * dx
+        py -= t * dy
+        d2 = px * px + py * py
+        d2[np.isnan(d2)] = np.inf
+        # the intervals are contiguous in idx
+        boundary = np.concatenate([[True], start[1:] != start[:-1]])
+        first = np.flatnonzero(boundary)
+        interval = np.cumsum(boundary) - 1
+        largest = np.maximum.reduceat(d2, first)
+        # the first vertex at the largest distance in each interval
+        hit = np.flatnonzero(d2 == largest[interval])
+        hit = hit[np.concatenate([[True], interval[hit][1:] !=
+                                  interval[hit][:-1]])]
+        split = largest > 1.0
+        keep[idx[hit][split]] = True
+        middle = idx[hit][interval]
+        left = idx < middle
+        stop = np.where(left, middle, stop)
+        start = np.where(left, start, middle)
+        pending = split[interval] & (idx != middle)
+        idx, start, stop = idx[pending], start[pending], stop[pending]
+    return np.flatnonzero(keep)
+
+
+def minmax(points, n_buckets, offsets=None, axis=1):
+    """
+    Min/max decimation, which keeps the first, last, smallest and largest
+    vertices along axis in each of n_buckets buckets of consecutive vertices
+    of each polyline. The envelope of a dense signal is preserved.
+    Returns the sorted indices of the vertices kept.
+    """
+    points = np.asarray(points).reshape(-1, 2)
+    offsets = _offsets(points, offsets)
+    counts = np.diff(offsets)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    position = np.arange(len(points)) - offsets[owner]
+    # the bucket of each vertex, numbered through the polylines
+    n = np.maximum(np.minimum(counts, n_buckets), 1)
+    bucket = (position * n[owner]) // np.maximum(counts[owner], 1)
+    bucket += np.repeat(np.cumsum(n) - n, counts)
+    keep = np.zeros(len(points), dtype=bool)
+    if len(points) == 0:
+        return np.flatnonzero(keep)
+    change = np.flatnonzero(np.diff(bucket)) + 1
+    keep[np.concatenate([[0], change])] = True
+    keep[np.concatenate([change - 1, [len(points) - 1]])] = True
+    values = points[:, axis]
+    for sign in (1, -1):
+        # sorted by the bucket and then by the value
+        order = np.lexsort([sign * values, bucket])
+        first = np.concatenate([[True], bucket[order][1:] !=
+                                bucket[order][:-1]])
+        keep[order[first]] = True
+    return np.flatnonzero(keep)
+
+
+def subset_offsets(indices, offsets):
+    """
+    The offsets of the polylines made of points[indices]
+    """
+    return np.searchsorted(indices, offsets)
+
+
+class LevelOfDetail:
+    """
+    Levels of the polylines simplified by rdp with the tolerance doubled at
+    each level, from the full resolution at level 0, until each polyline
+    is reduced to its end points. The tolerances which remove no vertices
+    are skipped, and that of each level is in tolerances.
+
+    Each level is simplified from the previous one, so that the distance of
+    the removed vertices from level k is at most 2 * tolerances[k].
+    """
+    def __init__(self, points, tolerance, offsets=None, max_levels=32):
+        self.points = np.asarray(points).reshape(-1, 2)
+        self.offsets = _offsets(self.points, offsets)
+        tolerance = np.asarray(tolerance, dtype=float)
+        self.tolerances = [np.zeros_like(tolerance)]
+        self.indices = [np.arange(len(self.points))]
+        n_ends = len(np.unique(np.concatenate(_ends(self.offsets))))
+        for _ in range(max_levels):
+            index = self.indices[-1]
+            if len(index) <= n_ends:
+                break
+            kept = rdp(self.points[index], tolerance,
+                       subset_offsets(index, self.offsets))
+            if len(kept) < len(index):
+                self.tolerances.append(tolerance)
+                self.indices.append(index[kept])
+            tolerance = tolerance * 2
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, level):
+        """
+        The vertices and their offsets at level
+        """
+        index = self.indices[level]
+        return self.points[index], subset_offsets(index, self.offsets)
+
+    def level_for(self, max_points):
+        """
+        The finest level with at most max_points vertices
+        """
+        for level, index in enumerate(self.indices):
+            if len(index) <= max_points:
+                return level
+        return len(self.indices) - 1
@@ -0,0 +1,392 @@
+"""
+Writers of the digitized series, with the metadata such as the calibration.
+
+    with export.open_exporter('out.npz', metadata={'calibration': ...}) as f:
+        f.write('data', x=x, y=y)
+        f.write('fit', x=x_fit, y=y_fit)
+    series, metadata = export.load('out.npz')
+
+The format is chosen by the extension of the file,
+
+    .txt, .dat  text by np.savetxt, a block for each series
+    .csv        a table with the series name in the first column
+    .npz        {name}_{column} arrays
+    directory   {name}_{column}.npy files, which can be memory-mapped
+    .h5, .hdf5  a group for each series (requires h5py)
+    .parquet    a table with the series column (requires pyarrow)
+    .arrow, .feather  the same in Arrow IPC format (requires pyarrow)
+
+The arrays are written in chunks as they are, without building the whole
+text or table in memory.
+"""
+import csv
+import json
+import os
+import zipfile
+import numpy as np
+
+
+# the rows written at once to the text and table formats
+CHUNK_ROWS = 1 << 16
+
+
+class Exporter:
+    """
+    Base class of the writers. Each series is a set of 1d columns of the
+    same length, written by write(name, **columns).
+    """
+    format = None
+    extensions = ()
+
+    def __init__(self, filename, metadata=None):
+        self.filename = filename
+        self.metadata = dict(metadata or {})
+        # name -> the names of the columns
+        self.series = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, name, **columns):
+        name = str(name)
+        if name in self.series:
+            raise ValueError('series {!r} is already written'.format(name))
+        columns = {k: np.asarray(v).reshape(-1) for k, v in columns.items()}
+        if len({len(v) for v in columns.values()}) > 1:
+            raise ValueError('the columns of {!r} have different lengths'
+                             .format(name))
+        self._write(name, columns)
+        self.series[name] = list(columns)
+
+    def _write(self, name, columns):
+        raise NotImplementedError
+
+    def _metadata_json(self):
+        return json.dumps(dict(self.metadata, series=self.series))
+
+    def close(self):
+        pass
+
+
+class TextExporter(Exporter):
+    """
+    np.savetxt of the columns of each series, with the name and the metadata
+    in the comments
+    """
+    format = 'txt'
+    extensions = ('.txt', '.dat')
+
+    def __init__(self, filename, metadata=None, fmt='%.18e'):
+        super().__init__(filename, metadata)
+        self.fmt = fmt
+        self.file = open(filename, 'w')
+        if self.metadata:
+            self.file.write('# {}\n'.format(json.dumps(self.metadata)))
+
+    def _write(self, name, columns):
+        self.file.write('# {}: {}\n'.format(name, ' '.join(columns)))
+        values = list(columns.values())
+        n = len(values[0]) if values else 0
+        for start in range(0, n, CHUNK_ROWS):
+            np.savetxt(self.file, np.stack(
+                [v[start:start + CHUNK_ROWS] for v in values], axis=1),
+                fmt=self.fmt)
+
+    def close(self):
+        self.file.close()
+
+
+class CSVExporter(Exporter):
+    """
+    A table with columns series and those of the series, which are the same
+    for all the series. The metadata is not written.
+    """
+    format = 'csv'
+    extensions = ('.csv', )
+
+    def __init__(self, filename, metadata=None):
+        super().__init__(filename, metadata)
+        self.file = open(filename, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.columns = None
+
+    def _write(self, name, columns):
+        if self.columns is None:
+            self.columns = list(columns)
+            self.writer.writerow(['series'] + self.columns)
+        elif list(columns) != self.columns:
+            raise ValueError('the columns differ from {}'.format(self.columns))
+        values = list(columns.values())
+        n = len(values[0]) if values else 0
+        for start in range(0, n, CHUNK_ROWS):
+            block = [v[start:start + CHUNK_ROWS].tolist() for v in values]
+            self.writer.writerows(
+                zip([name] * len(block[0]), *block))
+
+    def close(self):
+        self.file.close()
+
+
+class NPZExporter(Exporter):
+    """
+    {name}_{column} arrays and the metadata as json in 'metadata'
+    """
+    format = 'npz'
+    extensions = ('.npz', )
+
+    def __init__(self, filename, metadata=None):
+        super().__init__(filename, metadata)
+        self.zip = zipfile.ZipFile(filename, 'w')
+
+    def _write(self, name, columns):
+        for key, array in columns.items():
+            # streamed into the archive
+            with self.zip.open('{}_{}.npy'.format(name, key), 'w',
+                               force_zip64=True) as f:
+                np.lib.format.write_array(f, array)
+
+    def close(self):
+        with self.zip.open('metadata.npy', 'w') as f:
+            np.lib.format.write_array(f, np.array(self._metadata_json()))
+        self.zip.close()
+
+
+class NPYExporter(Exporter):
+    """
+    {name}_{column}.npy files and metadata.json in a directory, which are
+    read by np.load(..., mmap_mode='r') without loading them.
+    """
+    format = 'npy'
+
+    def __init__(self, filename, metadata=None):
+        super().__init__(filename, metadata)
+        os.makedirs(filename, exist_ok=True)
+
+    def _write(self, name, columns):
+        for key, array in columns.items():
+            out = np.lib.format.open_memmap(
+                os.path.join(self.filename, '{}_{}.npy'.format(name, key)),
+                mode='w+', dtype=array.dtype, shape=array.shape)
+            out[:] = array
+            out.flush()
+            del out
+
+    def close(self):
+        with open(os.path.join(self.filename, 'metadata.json'), 'w') as f:
+            f.write(self._metadata_json())
+
+
+class HDF5Exporter(Exporter):
+    """
+    A group for each series with a dataset for each column, and the metadata
+    as json in the attribute 'metadata' of the file
+    """
+    format = 'hdf5'
+    extensions = ('.h5', '.hdf5')
+
+    def __init__(self, filename, metadata=None):
+        import h5py
+        super().__init__(filename, metadata)
+        self.file = h5py.File(filename, 'w')
+
+    def _write(self, name, columns):
+        group = self.file.create_group(name)
+        for key, array in columns.items():
+            group.create_dataset(key, data=array)
+
+    def close(self):
+        self.file.attrs['metadata'] = self._metadata_json()
+        self.file.close()
+
+
+class ParquetExporter(Exporter):
+    """
+    A table with columns series and those of the series, written in record
+    batches. The columns are the same for all the series, and the metadata
+    is in that of the schema.
+    """
+    format = 'parquet'
+    extensions = ('.parquet', )
+
+    def __init__(self, filename, metadata=None):
+        import pyarrow
+        super().__init__(filename, metadata)
+        self.pa = pyarrow
+        self.writer = None
+        self.schema = None
+
+    def _open(self, schema):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.filename, schema)
+
+    def _write(self, name, columns):
+        pa = self.pa
+        if self.writer is None:
+            schema = pa.schema(
+                [('series', pa.string())] +
+                [(key, pa.from_numpy_dtype(v.dtype))
+                 for key, v in columns.items()],
+                metadata={'digitizer': json.dumps(self.metadata)})
+            self.writer = self._open(schema)
+            self.schema = schema
+        schema = self.schema
+        if list(columns) != schema.names[1:]:
+            raise ValueError('the columns differ from {}'.format(
+                schema.names[1:]))
+        n = len(next(iter(columns.values()))) if columns else 0
+        for start in range(0, n, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, n)
+            arrays = [pa.array([name] * (stop - start), pa.string())] + [
+                pa.array(v[start:stop], type=schema.field(k).type)
+                for k, v in columns.items()]
+            self.writer.write_batch(
+                pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ArrowExporter(ParquetExporter):
+    """
+    ParquetExporter in the Arrow IPC (feather) format
+    """
+    format = 'arrow'
+    extensions = ('.arrow', '.feather')
+
+    def _open(self, schema):
+        self.sink = self.pa.OSFile(self.filename, 'wb')
+        return self.pa.ipc.new_file(self.sink, schema)
+
+    def close(self):
+        super().close()
+        if self.writer is not None:
+            self.sink.close()
+
+
+EXPORTERS = [TextExporter, CSVExporter, NPZExporter, NPYExporter,
+             HDF5Exporter, ParquetExporter, ArrowExporter]
+_REQUIRES = {'hdf5': 'h5py', 'parquet': 'pyarrow', 'arrow': 'pyarrow'}
+
+
+def available_formats():
+    """
+    The formats whose dependencies are installed
+    """
+    formats = []
+    for exporter in EXPORTERS:
+        module = _REQUIRES.get(exporter.format)
+        if module is not None:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+        formats.append(exporter.format)
+    return formats
+
+
+def _format(filename, format=None):
+    if format is not None:
+        return format
+    if filename.endswith(os.sep) or os.path.isdir(filename):
+        return 'npy'
+    ext = os.path.splitext(filename)[1].lower()
+    for exporter in EXPORTERS:
+        if ext in exporter.extensions:
+            return exporter.format
+    if ext == '':
+        return 'txt'
+    raise ValueError('unknown format of {}'.format(filename))
+
+
+def open_exporter(filename, metadata=None, format=None):
+    """
+    The exporter of the format, which is chosen by the extension of
+    filename if None.
+    """
+    format = _format(filename, format)
+    for exporter in EXPORTERS:
+        if exporter.format == format:
+            return exporter(filename, metadata)
+    raise ValueError('unknown format {}'.format(format))
+
+
+def export(filename, series, metadata=None, format=None):
+    """
+    Write series, a dict of name -> dict of columns, into filename.
+    """
+    with open_exporter(filename, metadata, format) as f:
+        for name, columns in series.items():
+            f.write(name, **columns)
+
+
+def _split(names, values, columns):
+    """
+    Rows of each series in a table with the series column
+    """
+    names = np.asarray(names)
+    series = {}
+    for name in dict.fromkeys(names.tolist()):
+        rows = names == name
+        series[name] = {k: values[k][rows] for k in columns}
+    return series
+
+
+def load(filename, format=None, mmap_mode='r'):
+    """
+    Read a file written by an exporter other than text.
+    Returns (series, metadata), where series is a dict of
+    name -> dict of columns. The npy files are memory-mapped by mmap_mode.
+    """
+    format = _format(filename, format)
+    if format in ('npz', 'npy'):
+        if format == 'npz':
+            data = np.load(filename)
+            metadata = json.loads(str(data['metadata']))
+
+            def read(key):
+                return data[key]
+        else:
+            with open(os.path.join(filename, 'metadata.json')) as f:
+                metadata = json.load(f)
+
+            def read(key):
+                return np.load(os.path.join(filename, key + '.npy'),
+                               mmap_mode=mmap_mode)
+        series = {name: {k: read('{}_{}'.format(name, k)) for k in columns}
+                  for name, columns in metadata.pop('series').items()}
+        return series, metadata
+    if format == 'hdf5':
+        import h5py
+        with h5py.File(filename, 'r') as f:
+            metadata = json.loads(f.attrs['metadata'])
+            series = {name: {k: f[name][k][()] for k in columns}
+                      for name, columns in metadata.pop('series').items()}
+        return series, metadata
+    if format in ('parquet', 'arrow'):
+        import pyarrow
+        if format == 'parquet':
+            import pyarrow.parquet
+            table = pyarrow.parquet.read_table(filename)
+        else:
+            with pyarrow.memory_map(filename) as source:
+                table = pyarrow.ipc.open_file(source).read_all()
+        raw = (table.schema.metadata or {}).get(b'digitizer', b'{}')
+        columns = table.column_names[1:]
+        values = {k: table.column(k).to_numpy() for k in columns}
+        return (_split(table.column('series').to_numpy(zero_copy_only=False),
+                       values, columns), json.loads(raw))
+    if format == 'csv':
+        with open(filename, newline='') as f:
+            rows = list(csv.reader(f))
+        if len(rows) == 0:
+            return {}, {}
+        columns = rows[0][1:]
+        table = np.array([r[1:] for r in rows[1:]], dtype=float).reshape(
+            -1, len(columns))
+        values = {k: table[:, i] for i, k in enumerate(columns)}
+        return _split([r[0] for r in rows[1:]], values, columns), {}
+    raise ValueError('{} files cannot be read'.format(format))
@@ -1,21 +1,81 @@
 import numpy as np
 
 
+def _dot(a, b):
+    return np.einsum('...i,...i->...', a, b)
+
+
 def distance2(x, x0, x1=None):
     """
     Obtain the distance between a path x0-x1 and x.
+
+    All the arguments broadcast against each other along the leading axes,
+    so x can be a single point (2, ) or many points (m, 1, 2) while x0 and x1
+    are the segments (n, 2).
+    If x1 is None, the distance to the point x0 is returned.
     """
-    x0 = x0 - x
+    x = np.asarray(x)
+    x0 = np.asarray(x0) - x
     if x1 is None:
-        return x0 @ x0
-    x1 = x1 - x
+        return _dot(x0, x0)
+    x1 = np.asarray(x1) - x
     dx = x1 - x0
-    if dx @ x0 < 0.0 and dx @ x1 > 0.0:
+    d0 = _dot(x0, x0)
+    d1 = _dot(x1, x1)
+    dx2 = _dot(dx, dx)
+    with np.errstate(divide='ignore', invalid='ignore'):
         # x is inside x0 and x1
         x_sum = x0 + x1
-        return 0.25 * (x_sum @ x_sum - (x0 @ x0 - x1 @ x1)**2 / (dx @ dx))
-
+        inside = 0.25 * (_dot(x_sum, x_sum) - (d0 - d1)**2 / dx2)
     # x is outside x0 and x1
-    return np.minimum(x0 @ x0, x1 @ x1)
+    outside = np.minimum(d0, d1)
+    is_inside = (_dot(dx, x0) < 0.0) & (_dot(dx, x1) > 0.0)
+    return np.where(is_inside, np.maximum(inside, 0.0), outside)
 
 
+def project(x, x0, x1):
+    """
+    Project x onto the segments x0-x1.
+
+    Returns the position along each segment t (0 <= t <= 1) and the
+    projected point x0 + t (x1 - x0). Broadcasts in the same way as distance2.
+    """
+    x = np.asarray(x)
+    x0 = np.asarray(x0)
+    dx = np.asarray(x1) - x0
+    dx2 = _dot(dx, dx)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(dx2 > 0.0, _dot(x - x0, dx) / dx2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return t, x0 + t[..., np.newaxis] * dx
+
+
+def k_nearest(x, x0, x1=None, k=1):
+    """
+    Indices of the k segments x0-x1 (or points x0) closest to a point x,
+    sorted by the distance, and their squared distances.
+    nan-distances are regarded as infinitely far.
+    """
+    return argsmallest(distance2(x, x0, x1), k)
+
+
+def argsmallest(values, k=1):
+    """
+    Indices of the k smallest values along the last axis, sorted by the value,
+    and the values themselves. nan is ignored.
+    """
+    values = np.asarray(values)
+    values = np.where(np.isnan(values), np.inf, values)
+    k = min(k, values.shape[-1])
+    if k == 0:
+        return (np.zeros(values.shape[:-1] + (0, ), dtype=int),
+                np.zeros(values.shape[:-1] + (0, )))
+    idx = np.argpartition(values, k - 1, axis=-1)[..., :k]
+    v = np.take_along_axis(values, idx, axis=-1)
+    order = np.argsort(v, axis=-1)
+    idx = np.take_along_axis(idx, order, axis=-1)
+    v = np.take_along_axis(v, order, axis=-1)
+    if values.ndim == 1:
+        # drop the entries without finite value
+        idx, v = idx[np.isfinite(v)], v[np.isfinite(v)]
+    return idx, v
@@ -10,51 +10,105 @@ from PyQt5.QtWidgets import (
     QRadioButton, QInputDialog, QLabel, QDesktopWidget, QScrollArea,
     QGraphicsView, QGraphicsScene, QGraphicsItem, QGraphicsRectItem, QVBoxLayout)
 from PyQt5.QtGui import QBrush, QColor, QImage, QPainter, QPixmap, QPen
-from PyQt5.QtCore import Qt, QObject, QEvent
+from PyQt5.QtCore import Qt, QObject, QEvent, QTimer, pyqtSignal
 
 from PyQt5.QtWebEngineWidgets import QWebEngineView
-
-from PyQt5.QtSvg import QGraphicsSvgItem
-#
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-# from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
-# from matplotlib.figure import Figure
-#import matplotlib.pyplot as plt
 #
+import os
 import sys
-from math import log10
+import json
+from concurrent.futures import ThreadPoolExecutor
 
-import fitz
 try:
-    from . import core
+    from . import core, autocalibrate, export
 except ImportError:
     import core
+    import autocalibrate
+    import export
+
+
+# the file types of saveToFile
+_SAVE_FILTERS = [
+    ('txt', 'Text (*.txt *.dat)'), ('csv', 'CSV (*.csv)'),
+    ('npz', 'NumPy (*.npz)'), ('hdf5', 'HDF5 (*.h5 *.hdf5)'),
+    ('parquet', 'Parquet (*.parquet)'), ('arrow', 'Arrow (*.arrow *.feather)')]
+
+# the rows of the selected values shown at once
+_READOUT_ROWS = 200
+# the events within this interval [ms] update the readout once
+_READOUT_DELAY = 50
+
+# replaces the children of the overlay group by the given svg elements
+_OVERLAY_SCRIPT = """
+(function() {{
+    var overlay = document.getElementById('digitizer-overlay');
+    if (overlay === null) {{
+        overlay = document.createElementNS('http://www.w3.org/2000/svg', 'g');
+        overlay.id = 'digitizer-overlay';
+        document.querySelector('svg').appendChild(overlay);
+    }}
+    var doc = new DOMParser().parseFromString({}, 'image/svg+xml');
+    var nodes = Array.from(doc.documentElement.childNodes).map(
+        function(node) {{ return document.importNode(node, true); }});
+    overlay.replaceChildren.apply(overlay, nodes);
+}})();
+"""
 
 
 class SvgView(QWebEngineView):
+    # If True, the page is loaded once and the selection is drawn over it.
+    # Otherwise, the whole page is loaded again for every selection.
+    use_overlay = True
+    # If True, the clicked path is looked up in the hit buffer of the page
+    # rather than measured from all the paths
+    use_hit_buffer = True
+
     def __init__(self):
         super().__init__()
         self._original_paths = None
         self._selected_path = None
         self._selected_group = None
         self._selected_point = None
+        # incremented whenever the selection changes
+        self.selection_version = 0
         self._previous_pos = (0, 0)
         self.loadFinished.connect(self._scroll_to_previous)
+        self.loadFinished.connect(self._record_load)
         self._pressed_position = None
+        # index of the figure clicked last, which the selection is limited to
+        self.region = None
+        self._load_started = None
 
     def _scroll_to_previous(self):
         page = self.page()
         # page.runJavaScript('window.scrollTo({}, "smooth");'.format(
         #    self._previous_pos[0]))
 
+    def _record_load(self):
+        if self._load_started is not None:
+            core.profile_event(
+                'webengine_load', self._load_started,
+                time.perf_counter() - self._load_started)
+            self._load_started = None
+
     def loadSvg(self, txt):
-        self._original_paths = core.Paths(txt)
+        self.loadPaths(core.Paths(txt))
+
+    def loadPaths(self, paths):
+        self._original_paths = paths
+        self.region = None
+        # the selection in the previous page
+        self._selected_path = None
+        self._selected_group = None
+        self._selected_point = None
+        self.selection_version += 1
         self.setHtml(self._original_paths.svg)
 
     def setHtml(self, txt):
         self.scroll(0, 0)
         pos = self.page().scrollPosition()
         self._previous_pos = pos.x(), pos.y()
+        self._load_started = time.perf_counter()
         super().setHtml(txt)
 
     def svd_position(self, pos):
@@ -80,29 +134,55 @@ class SvgView(QWebEngineView):
     def onRelease(self, event):
         current_position = self.svd_position(
             np.array([event.pos().x(), event.pos().y()]))
-        if self._original_paths is not None:
+        if self._original_paths is None:
+            return
+        with core.profile_stage('select'):
+            # limit the search to the figure at the pressed position
+            self.region = self._original_paths.region_at(
+                self._pressed_position)
             # find if there is a path inside the selected region
             self._selected_path = self._original_paths.find_inside(
-                self._pressed_position, current_position)
+                self._pressed_position, current_position, self.region)
 
             if self._selected_path is None:
                 # consider the release position
-                self._selected_path = self._original_paths.find_nearest(current_position)
+                if self.use_hit_buffer:
+                    self._selected_path = \
+                        self._original_paths.hit_buffer.find_nearest(
+                            current_position, self.region)
+                else:
+                    self._selected_path = self._original_paths.find_nearest(
+                        current_position, self.region)
             self._selected_point = self._original_paths.find_nearest_point(
                 self._selected_path, current_position
             )
+            self.selection_version += 1
             self.draw()
     
     def draw(self):
         if not self.is_selected():
             return
         if self.is_group:
-            new_svg = self._original_paths.appended_svd(
-                self._selected_group)
+            given_path, point = self._selected_group, None
         else:
-            new_svg = self._original_paths.appended_svd(
-                self._selected_path, self._selected_point)
-        self.setHtml(new_svg)
+            given_path, point = self._selected_path, self._selected_point
+        if self.use_overlay:
+            self.setOverlay(
+                self._original_paths.overlay_svg(given_path, point))
+        else:
+            self.setHtml(
+                self._original_paths.appended_svd(given_path, point))
+
+    def setOverlay(self, txt):
+        """
+        Draw the svg elements over the loaded page
+        """
+        svg = '<svg xmlns="http://www.w3.org/2000/svg">{}</svg>'.format(txt)
+        start = time.perf_counter()
+        self.page().runJavaScript(
+            _OVERLAY_SCRIPT.format(json.dumps(svg)),
+            lambda _: core.profile_event(
+                'overlay_js', start, time.perf_counter() - start))
 
     def is_selected(self):
         if self._selected_path is None or len(self._selected_path.abs_path) == 0:
@@ -113,13 +193,20 @@ class SvgView(QWebEngineView):
     def is_group(self):
         return self._selected_group is not None
 
-    def select_group(self):
+    def select_group(self, shape=False):
+        """
+        shape: only the paths with the same shape, e.g. markers
+        """
         if self.is_selected():
-            self._selected_group = self._original_paths.group(self._selected_path)        
+            self._selected_group = self._original_paths.group(
+                self._selected_path, shape=shape, region=self.region)
+            self.selection_version += 1
         self.draw()
 
     def unselect_group(self):
-        self._selected_group = None
+        if self._selected_group is not None:
+            self._selected_group = None
+            self.selection_version += 1
         self.draw()
 
     def selected(self, use_center=False):
@@ -133,7 +220,8 @@ class SvgView(QWebEngineView):
             # draw highlighted svd
             paths = self._selected_group
             if use_center:
-                return np.stack([p.center for p in paths], axis=0)
+                return self._original_paths.centers[
+                    [p.index for p in paths]]
             else:
                 return np.concatenate([p.abs_path for p in paths], axis=0)
         else:
@@ -143,6 +231,119 @@ class SvgView(QWebEngineView):
                 return np.stack(self._selected_path.abs_path, axis=0)
 
 
+def _format_readout(title, values, page, calibration=None):
+    """
+    The text of the page-th _READOUT_ROWS rows of the values, which may be
+    large and is formatted in a worker thread
+    """
+    n_pages = max((len(values) - 1) // _READOUT_ROWS + 1, 1)
+    page = min(max(page, 0), n_pages - 1)
+    rows = values[page * _READOUT_ROWS:(page + 1) * _READOUT_ROWS]
+    if calibration is not None:
+        rows = calibration.transform(rows)
+    if n_pages == 1:
+        return '{}\n{}'.format(title, rows)
+    return '{} rows {}-{} of {} (page {}/{})\n{}'.format(
+        title, page * _READOUT_ROWS, page * _READOUT_ROWS + len(rows) - 1,
+        len(values), page + 1, n_pages, rows)
+
+
+def _save_target(fname, selected):
+    """
+    The file name and the format to save with the filter selected in the
+    dialog. The extension of the filter is added if fname has none, and the
+    format of the filter is used unless the extension is of another format.
+    """
+    for format, name in _SAVE_FILTERS:
+        if name != selected:
+            continue
+        if os.path.splitext(fname)[1] == '':
+            # the first extension of the filter, e.g. ".npz" of "(*.npz)"
+            return fname + name.split('(*')[1].split()[0].rstrip(')'), format
+        try:
+            export._format(fname)
+        except ValueError:
+            return fname, format
+        return fname, None
+    return fname, None
+
+
+def _load_page(filename, page, backend):
+    n_page = core.n_pages(filename) - 1
+    page = min(page, n_page)
+    paths = core.load_page(filename, page, backend=backend)
+    # generate the svg, the regions and the hit buffer here rather than in
+    # the ui thread
+    paths.svg
+    paths.regions
+    if SvgView.use_hit_buffer:
+        paths.hit_buffer
+    return n_page, paths
+
+
+class PageLoader(QObject):
+    """
+    Loads pages in worker threads, and emits loaded(n_page, paths) or
+    failed(error) in the ui thread for the latest request.
+    The pages next to the requested one are loaded in advance, and kept in
+    the page cache of core.
+    """
+    loaded = pyqtSignal(int, object)
+    failed = pyqtSignal(object)
+    # emitted from the worker threads
+    _finished = pyqtSignal(int, object)
+
+    def __init__(self, max_workers=2, prefetch=1):
+        super().__init__()
+        self.prefetch = prefetch
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._futures = {}
+        self._request = 0
+        self._finished.connect(self._on_finished)
+
+    def _submit(self, filename, page, backend):
+        key = (filename, page, backend)
+        if key not in self._futures:
+            self._futures[key] = self._executor.submit(
+                _load_page, filename, page, backend)
+        return self._futures[key]
+
+    def request(self, filename, page, backend='drawings'):
+        self._request += 1
+        request = self._request
+        wanted = [page] + [
+            p for i in range(1, self.prefetch + 1)
+            for p in (page + i, page - i) if p >= 0]
+        # cancel the stale requests not started yet
+        for key, future in list(self._futures.items()):
+            if future.done() or (
+                    key[0] != filename or key[1] not in wanted or
+                    key[2] != backend) and future.cancel():
+                del self._futures[key]
+
+        future = self._submit(filename, page, backend)
+        future.add_done_callback(
+            lambda future: self._finished.emit(request, future))
+        for p in wanted[1:]:
+            self._submit(filename, p, backend)
+
+    def _on_finished(self, request, future):
+        if request != self._request or future.cancelled():
+            return
+        try:
+            n_page, paths = future.result()
+        except Exception as e:
+            self.failed.emit(e)
+        else:
+            self.loaded.emit(n_page, paths)
+
+    def shutdown(self):
+        # the pages loading now are not emitted
+        self._request += 1
+        self._futures.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
 # Main Windows
 class Windows(QMainWindow):
 
@@ -161,6 +362,10 @@ class Windows(QMainWindow):
         #
         self.show()
 
+    def closeEvent(self, event):
+        self.CentralWidget.shutdown()
+        super().closeEvent(event)
+
     def InitWindow(self):
 
         self.setWindowTitle(self.title)
@@ -173,6 +378,8 @@ class Windows(QMainWindow):
 
 # Main Widget
 class MainWidget(QWidget):
+    # emitted from the readout formatter thread
+    _readoutFormatted = pyqtSignal(int, object)
 
     def __init__(self, parent):
         super().__init__()
@@ -191,10 +398,13 @@ class MainWidget(QWidget):
         self.XScaleType = 'linear'
         self.YScaleType = 'linear'
         self.FigureType = 'marker'
+        self.Backend = 'drawings'
         
         # output
         self.Xsampled = None
         self.Ysampled = None
+        # the raw values of the series added, saved together
+        self.Series = {}
         #
         self.x = None
         self.y = None
@@ -206,9 +416,28 @@ class MainWidget(QWidget):
         self.HintLabel,
         self.X0Label, self.Y0Label,
         self.X1Label, self.Y1Label,
-        self.IsMarker, self.IsLine
+        self.IsMarker, self.IsLine,
+        self.UseDrawings, self.UseSvg
         ) = self.initUI()
 
+        self.Loader = PageLoader()
+        self.Loader.loaded.connect(self.pageLoaded)
+        self.Loader.failed.connect(self.pageFailed)
+
+        # the readout of the selected values is updated only when the
+        # selection or the calibration changes, once for a burst of events
+        self._readout_key = None
+        self._readout = None
+        self._readout_shown = False
+        self._readout_page = 0
+        self._readout_request = 0
+        self._readoutTimer = QTimer(self)
+        self._readoutTimer.setSingleShot(True)
+        self._readoutTimer.setInterval(_READOUT_DELAY)
+        self._readoutTimer.timeout.connect(self._display_value)
+        self._formatter = ThreadPoolExecutor(1)
+        self._readoutFormatted.connect(self._readoutDone)
+
         self.show()
 
 
@@ -225,9 +454,16 @@ class MainWidget(QWidget):
         LoadPageButton.valueChanged.connect(self.reloadImage)
         LoadPageButton.setMaximum(0)
         LoadPageButton.setMinimum(0)
+        UseDrawings = QRadioButton('drawings')
+        UseDrawings.setChecked(True)
+        UseSvg = QRadioButton('svg')
+        UseDrawings.clicked.connect(self.setBackend)
+        UseSvg.clicked.connect(self.setBackend)
         #
-        LayoutSx1.addWidget(LoadFileButton,0,0)
-        LayoutSx1.addWidget(LoadPageButton,1,0)
+        LayoutSx1.addWidget(LoadFileButton,0,0,1,2)
+        LayoutSx1.addWidget(LoadPageButton,1,0,1,2)
+        LayoutSx1.addWidget(UseDrawings,2,0)
+        LayoutSx1.addWidget(UseSvg,2,1)
         VBoxSx1.setLayout(LayoutSx1)
         # ----------------------------------
         VBoxSx2 = QGroupBox()
@@ -251,6 +487,8 @@ class MainWidget(QWidget):
         X1Button.clicked.connect(self.select_X1)
         Y0Button.clicked.connect(self.select_Y0)
         Y1Button.clicked.connect(self.select_Y1)
+        AutoButton = QPushButton('Auto',self)
+        AutoButton.clicked.connect(self.autoCalibrate)
         #
         LayoutSx2.addWidget(X0Button,0,0)
         LayoutSx2.addWidget(X0Label,0,1)
@@ -260,6 +498,7 @@ class MainWidget(QWidget):
         LayoutSx2.addWidget(Y0Label,2,1)
         LayoutSx2.addWidget(Y1Button,3,0)
         LayoutSx2.addWidget(Y1Label,3,1)
+        LayoutSx2.addWidget(AutoButton,4,0)
         #
         VBoxSx2.setLayout(LayoutSx2)
         # ----------------------------------
@@ -314,8 +553,11 @@ class MainWidget(QWidget):
 
         SaveToFileButton = QPushButton('Save to File',self)
         SaveToFileButton.clicked.connect(self.saveToFile)
+        AddSeriesButton = QPushButton('Add series',self)
+        AddSeriesButton.clicked.connect(self.addSeries)
         
         LayoutSx6.addWidget(SaveToFileButton,0,0)
+        LayoutSx6.addWidget(AddSeriesButton,0,1)
         VBoxSx6.setLayout(LayoutSx6)
         # ----------------------------------
         VBoxSx7 = QGroupBox()
@@ -327,7 +569,16 @@ class MainWidget(QWidget):
         HintLabel.setTextInteractionFlags(Qt.TextSelectableByMouse)
         HintLabel.setText('')
 
+        PreviousButton = QPushButton('<',self)
+        PreviousButton.setMaximumWidth(30)
+        PreviousButton.clicked.connect(lambda: self.turnReadout(-1))
+        NextButton = QPushButton('>',self)
+        NextButton.setMaximumWidth(30)
+        NextButton.clicked.connect(lambda: self.turnReadout(1))
+
         LayoutSx7.addWidget(HintLabel,1,0)
+        LayoutSx7.addWidget(PreviousButton,1,1)
+        LayoutSx7.addWidget(NextButton,1,2)
         VBoxSx7.setLayout(LayoutSx7)
         # ----------------------------------
         # Second Column (Figure)
@@ -369,7 +620,7 @@ class MainWidget(QWidget):
         return (LoadPageButton, 
                 Xlinear, Xlog, Ylinear, Ylog, WebView, HintLabel,
                 X0Label, Y0Label, X1Label, Y1Label,
-                IsMarker, IsLine)
+                IsMarker, IsLine, UseDrawings, UseSvg)
 
     def loadImage(self):
         self.filename, _ = QFileDialog.getOpenFileName()
@@ -378,16 +629,17 @@ class MainWidget(QWidget):
     def reloadImage(self):
         if self.filename is None:
             return
-        page = self.Page.value()
-        try:
-            n_page = core.n_pages(self.filename) - 1
-            page = np.minimum(page, n_page)
-            txt = core._to_svg(self.filename, page)
-            self.WebView.loadSvg(txt)
-            self.Page.setMaximum(n_page)
-        except RuntimeError:
-            # Not a valid file
-            self.HintLabel.setText('invalid file')        
+        self.Loader.request(self.filename, self.Page.value(), self.Backend)
+
+    def pageLoaded(self, n_page, paths):
+        self.WebView.loadPaths(paths)
+        self.Series = {}
+        self.Page.setMaximum(n_page)
+        self._scheduleReadout()
+
+    def pageFailed(self, error):
+        # Not a valid file
+        self.HintLabel.setText('invalid file')
 
     def eventFilter(self, source, event):
         if (event.type() == QEvent.ChildAdded and
@@ -403,7 +655,7 @@ class MainWidget(QWidget):
               source in self._glwidget):
             self.WebView.onRelease(event)
         
-        self._display_value()
+        self._scheduleReadout()
         return super().eventFilter(source, event)
 
     def _select(self, x_or_y):
@@ -428,6 +680,7 @@ class MainWidget(QWidget):
                 self.X0pic = pic
                 self.X0real = real
                 self.X0Label.setText(str(self.X0real))
+                self._scheduleReadout()
 
     def select_X1(self):
         if self.WebView._selected_path is not None:
@@ -436,6 +689,7 @@ class MainWidget(QWidget):
                 self.X1pic = pic
                 self.X1real = real
                 self.X1Label.setText(str(self.X1real))
+                self._scheduleReadout()
 
     def select_Y0(self):
         if self.WebView._selected_path is not None:
@@ -444,6 +698,7 @@ class MainWidget(QWidget):
                 self.Y0pic = pic
                 self.Y0real = real
                 self.Y0Label.setText(str(self.Y0real))
+                self._scheduleReadout()
 
     def select_Y1(self):
         if self.WebView._selected_path is not None:
@@ -452,71 +707,181 @@ class MainWidget(QWidget):
                 self.Y1pic = pic
                 self.Y1real = real
                 self.Y1Label.setText(str(self.Y1real))
+                self._scheduleReadout()
+
+    def autoCalibrate(self):
+        """
+        Set the axis values from the ticks and their labels in the figure
+        clicked last, or in the page
+        """
+        paths = self.WebView._original_paths
+        if paths is None or paths.source is None:
+            return
+        result = autocalibrate.calibrate(
+            paths, autocalibrate.load_labels(*paths.source),
+            self.WebView.region)
+        if result.calibration is None:
+            self.HintLabel.setText('The axes are not found.')
+            return
+        for axis, fit in [('X', result.x), ('Y', result.y)]:
+            for i, end in [('0', 0), ('1', -1)]:
+                setattr(self, axis + i + 'pic', fit.ticks[end])
+                setattr(self, axis + i + 'real', fit.values[end])
+                getattr(self, axis + i + 'Label').setText(
+                    str(fit.values[end]))
+            getattr(self, axis + fit.scale).setChecked(True)
+        self.XScaleType, self.YScaleType = result.x.scale, result.y.scale
+        self.HintLabel.setText(
+            'Calibrated with confidence {:.2f}'.format(result.confidence))
+
+    def setBackend(self):
+        if self.UseDrawings.isChecked():
+            self.Backend = 'drawings'
+        elif self.UseSvg.isChecked():
+            self.Backend = 'svg'
+        self.reloadImage()
 
     def setXScaleType(self):
         if self.Xlinear.isChecked():
             self.XScaleType = 'linear'
         elif self.Xlog.isChecked():
             self.XScaleType = 'log'
+        self._scheduleReadout()
 
     def setYScaleType(self):
         if self.Ylinear.isChecked():
             self.YScaleType = 'linear'
         elif self.Ylog.isChecked():
             self.YScaleType = 'log'
+        self._scheduleReadout()
 
     def setGraphType(self):
         if self.IsLine.isChecked():
             self.FigureType = 'line'
         elif self.IsMarker.isChecked():
             self.FigureType = 'marker'
+        self._scheduleReadout()
+
+    def calibration(self):
+        """
+        core.Calibration from the reference points, or None if they are not
+        ready
+        """
+        if any(v is None for v in [
+            self.X0pic, self.X1pic, self.Y0pic, self.Y1pic,
+            self.X0real, self.Y0real, self.X1real, self.Y1real]
+        ):
+            return None
+        try:
+            return core.Calibration.from_axes(
+                [(self.X0pic, self.X0real), (self.X1pic, self.X1real)],
+                [(self.Y0pic, self.Y0real), (self.Y1pic, self.Y1real)],
+                self.XScaleType, self.YScaleType)
+        except ValueError:
+            # the same position is picked twice
+            return None
+
+    def _readoutKey(self):
+        return (self.WebView.selection_version, self.FigureType,
+                self.XScaleType, self.YScaleType,
+                self.X0pic, self.X1pic, self.Y0pic, self.Y1pic,
+                self.X0real, self.X1real, self.Y0real, self.Y1real)
 
-    def _convert(self, x, x0pic, x1pic, x0real, x1real, use_log=False):
-        if use_log:
-            val = self._convert(
-                x, x0pic, x1pic, 
-                np.log10(x0real), np.log10(x1real), use_log=False)
-            return 10**val
-        return (x - x0pic) / (x1pic - x0pic) * (x1real - x0real) + x0real
+    def _scheduleReadout(self):
+        """
+        Update the readout shortly if the selection or the calibration is
+        changed
+        """
+        if (hasattr(self, 'WebView') and
+                self._readoutKey() != self._readout_key and
+                not self._readoutTimer.isActive()):
+            self._readoutTimer.start()
 
-    def convert_x(self, x):
-        return self._convert(
-            x, self.X0pic, self.X1pic, self.X0real, self.X1real, 
-            self.XScaleType == 'log')
+    def _updateSelected(self):
+        """
+        Update Xsampled and Ysampled from the selection if it is changed.
+        Returns True if updated.
+        """
+        key = self._readoutKey()
+        if key == self._readout_key:
+            return False
+        self._readout_key = key
+        xy = self.WebView.selected(use_center=self.FigureType == 'marker')
+        if xy is None:
+            # nothing selected, or the selected path is removed
+            if self._readout is not None:
+                self.HintLabel.setText('')
+            self.Xsampled = self.Ysampled = None
+            self._readout = None
+            # the values being formatted are not shown
+            self._readout_request += 1
+            return True
+        self.Xsampled, self.Ysampled = xy[:, 0], xy[:, 1]
+        calibration = self.calibration()
+        if calibration is not None:
+            self._readout = ('**** calibrated values ****', xy, calibration)
+        else:
+            self._readout = ('#### raw values ####', xy, None)
+        self._readout_page = 0
+        self._readout_shown = False
+        return True
 
-    def convert_y(self, y):
-        return self._convert(
-            y, self.Y0pic, self.Y1pic, self.Y0real, self.Y1real, 
-            self.YScaleType == 'log')
+    def shutdown(self):
+        """
+        Stop the worker threads loading the pages and formatting the values
+        """
+        self._readoutTimer.stop()
+        self.Loader.shutdown()
+        self._formatter.shutdown(wait=False, cancel_futures=True)
 
     def _display_value(self):
         if not hasattr(self, 'WebView'):
             return
-        xy = self.WebView.selected(use_center=self.FigureType == 'marker')
-        if xy is None:
+        self._updateSelected()
+        if self._readout is not None and not self._readout_shown:
+            self._showReadout()
+
+    def _showReadout(self):
+        title, xy, calibration = self._readout
+        self._readout_shown = True
+        self._readout_request += 1
+        if len(xy) <= _READOUT_ROWS:
+            self.HintLabel.setText(_format_readout(
+                title, xy, 0, calibration))
             return
-        self.Xsampled, self.Ysampled = xy[:, 0], xy[:, 1]
+        request = self._readout_request
+        self.HintLabel.setText('{} formatting {} rows'.format(title, len(xy)))
+        future = self._formatter.submit(
+            _format_readout, title, xy, self._readout_page, calibration)
+        future.add_done_callback(
+            lambda future: self._readoutFormatted.emit(request, future))
+
+    def _readoutDone(self, request, future):
+        if request != self._readout_request or future.cancelled():
+            return
+        try:
+            self.HintLabel.setText(future.result())
+        except Exception as e:
+            self.HintLabel.setText('Failed to show the values: {}'.format(e))
 
-        if all(v is not None for v in [
-            self.X0pic, self.X1pic, self.Y0pic, self.Y1pic,
-            self.X0real, self.Y0real, self.X1real, self.Y1real]
-        ):
-            self.HintLabel.setText(
-                '**** calibrated values ****\n{}'.format(
-                    np.stack([
-                        self.convert_x(self.Xsampled), self.convert_y(self.Ysampled)
-                    ], axis=1))
-            )            
-        else:
-            self.HintLabel.setText(
-                '#### raw values ####\n{}'.format(
-                    np.stack([self.Xsampled, self.Ysampled], axis=1))
-            )            
+    def turnReadout(self, step):
+        """
+        Show the next (step=1) or previous (step=-1) rows of the readout
+        """
+        if self._readout is None:
+            return
+        n_pages = (len(self._readout[1]) - 1) // _READOUT_ROWS + 1
+        page = min(max(self._readout_page + step, 0), n_pages - 1)
+        if page != self._readout_page:
+            self._readout_page = page
+            self._showReadout()
 
     def findGroup(self):
-        self.WebView.select_group()
+        self.WebView.select_group(shape=self.FigureType == 'marker')
+        self._scheduleReadout()
 
     def saveToFile(self):
+        self._updateSelected()
         for x, label in [
             (self.X0pic, 'X0'), (self.X1pic, 'X1'),
             (self.X0real, 'X0'), (self.X1real, 'X1'),
@@ -528,12 +893,49 @@ class MainWidget(QWidget):
                 self.HintLabel.setText('Please pick {}'.format(label))
                 return
 
-        fname, isOK = QFileDialog.getSaveFileName(self)
-        if isOK:
-            array = np.stack([
-                self.convert_x(self.Xsampled), self.convert_y(self.Ysampled)
-            ], axis=1)
-            np.savetxt(fname, array)
+        calibration = self.calibration()
+        if calibration is None:
+            self.HintLabel.setText('Please pick different X0, X1, Y0, Y1')
+            return
+
+        series = self.Series or {
+            'data': np.stack([self.Xsampled, self.Ysampled], axis=1)}
+        filters = ';;'.join(
+            name for format, name in _SAVE_FILTERS
+            if format in export.available_formats())
+        fname, selected = QFileDialog.getSaveFileName(self, filter=filters)
+        if fname:
+            fname, format = _save_target(fname, selected)
+            paths = self.WebView._original_paths
+            metadata = {'calibration': calibration.to_dict()}
+            if paths is not None and paths.source is not None:
+                metadata['source'] = {'pdf': str(paths.source[0]),
+                                      'page': int(paths.source[1])}
+            try:
+                with export.open_exporter(fname, metadata, format) as f:
+                    for name, xy in series.items():
+                        xy = calibration.transform(xy)
+                        f.write(name, x=xy[:, 0], y=xy[:, 1])
+            except (ValueError, OSError) as e:
+                self.HintLabel.setText('Failed to save: {}'.format(e))
+                return
+            self.HintLabel.setText('Saved {} series to {}'.format(
+                len(series), fname))
+            self.Series = {}
+
+    def addSeries(self):
+        """
+        Keep the selected values as a series, to save several series in a
+        file
+        """
+        self._updateSelected()
+        if self.Xsampled is None:
+            self.HintLabel.setText('Please pick data')
+            return
+        name = 'series{}'.format(len(self.Series))
+        self.Series[name] = np.stack([self.Xsampled, self.Ysampled], axis=1)
+        self.HintLabel.setText('Added {} with {} points'.format(
+            name, len(self.Xsampled)))
 
 
 class ScrollLabel(QScrollArea):
@@ -0,0 +1,153 @@
+"""
+A raster of the segments drawn at each pixel of a page, to find the path at
+a clicked point by looking up the pixels around it rather than measuring
+the distance to all the paths.
+"""
+import numpy as np
+
+try:
+    from . import geometry
+except ImportError:
+    import geometry
+
+
+class HitBuffer:
+    """
+    The segments of a page rasterized at dpi, kept as the sorted pairs of
+    the pixels and the segments passing through them, so that the paths
+    hidden by others are also found.
+
+    The pixels within radius around a point are looked up first, and only the
+    segments found there are measured, so that find_nearest returns the same
+    path as Paths.find_nearest, which measures all the segments.
+
+    Only the segments inside the page box of the paths are rasterized, and
+    the others, e.g. those drawn far outside of the page, are always
+    measured. If the page needs more than max_cells pixels or max_samples
+    samples, nothing is rasterized and find_nearest measures all the
+    segments.
+    """
+    max_cells = 1 << 26
+    max_samples = 1 << 24
+
+    def __init__(self, paths, dpi=72, radius=8):
+        self.paths = paths
+        self.dpi = dpi
+        self.radius = radius
+        # pixels per the page unit
+        self.scale = dpi / paths._from_inch(1.0)
+        self.origin = np.zeros(2)
+        self.shape = (0, 0)
+        self._pixels = self._segments = np.zeros(0, dtype=np.int64)
+        x0, x1, owner = paths.segments
+        valid = np.isfinite(x0).all(axis=-1) & np.isfinite(x1).all(axis=-1)
+        xmin = np.minimum(x0, x1)
+        xmax = np.maximum(x0, x1)
+        if paths.page_box is not None:
+            box = np.asarray(paths.page_box, dtype=float)
+            inside = valid & np.all(box[:2] <= xmin, axis=-1) & np.all(
+                xmax <= box[2:], axis=-1)
+        elif valid.any():
+            inside = valid
+            box = np.concatenate(
+                [xmin[valid].min(axis=0), xmax[valid].max(axis=0)])
+        else:
+            inside = valid
+        # the segments measured for every point
+        self._outside = np.flatnonzero(~inside)
+        self.rasterized = False
+        if not inside.any():
+            return
+        self.origin = np.floor(box[:2])
+        shape = np.ceil((box[2:] - self.origin) * self.scale).astype(
+            np.int64)[::-1] + 1
+        if np.prod(shape) > self.max_cells:
+            self._outside = np.arange(len(owner))
+            return
+        self.shape = tuple(int(n) for n in shape)
+        self.rasterized = self._rasterize(np.flatnonzero(inside))
+        if not self.rasterized:
+            self._outside = np.arange(len(owner))
+
+    def _pixel(self, x):
+        return (x - self.origin) * self.scale
+
+    def _rasterize(self, segments):
+        """
+        Draw the segments by sampling each of them at every half pixel.
+        Returns False if they need more than max_samples samples.
+        """
+        x0, x1, owner = self.paths.segments
+        p0, p1 = self._pixel(x0[segments]), self._pixel(x1[segments])
+        n = np.ceil(2 * np.abs(p1 - p0).max(axis=-1)).astype(np.int64) + 1
+        if n.sum() > self.max_samples:
+            return False
+        first = np.cumsum(n) - n
+        segment = np.repeat(np.arange(len(n)), n)
+        t = (np.arange(len(segment)) - first[segment]) / np.maximum(
+            n[segment] - 1, 1)
+        points = p0[segment] + t[:, np.newaxis] * (p1 - p0)[segment]
+        i, j = np.floor(points).astype(np.int64).T
+        pixel = np.clip(j, 0, self.shape[0] - 1) * self.shape[1] + np.clip(
+            i, 0, self.shape[1] - 1)
+        n_segments = np.int64(len(owner))
+        pairs = np.sort(pixel * n_segments + segments[segment])
+        pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+        self._pixels, self._segments = np.divmod(pairs, n_segments)
+        return True
+
+    def segments_around(self, point, radius=None):
+        """
+        Indices of Paths.segments within radius pixels around point = (x, y)
+        in the page unit
+        Only the rasterized segments are included.
+        """
+        radius = self.radius if radius is None else radius
+        height, width = self.shape
+        i, j = np.floor(self._pixel(point)).astype(int)
+        rows = np.arange(max(j - radius, 0), min(j + radius + 1, height))
+        i0, i1 = max(i - radius, 0), min(i + radius + 1, width)
+        if len(rows) == 0 or i0 >= i1:
+            return np.zeros(0, dtype=np.int64)
+        # the pixels in each row of the window are contiguous
+        start = np.searchsorted(self._pixels, rows * width + i0)
+        stop = np.searchsorted(self._pixels, rows * width + i1)
+        return np.unique(np.concatenate(
+            [self._segments[a:b] for a, b in zip(start, stop)]))
+
+    def paths_around(self, point, radius=None):
+        """
+        Indices of the paths within radius pixels around point = (x, y) in
+        the page unit
+        """
+        return np.unique(
+            self.paths.segments[2][self.segments_around(point, radius)])
+
+    def find_nearest(self, point, region=None):
+        """
+        The path nearest to point = (x, y) with unit inch, as
+        Paths.find_nearest, limited to the region of the index if given
+        """
+        paths = self.paths
+        x = paths._from_inch(np.array(point))
+        x0, x1, owner = paths.segments
+
+        def distance2(radius):
+            index = np.union1d(self.segments_around(x, radius), self._outside)
+            if region is not None:
+                index = index[paths.region_id[owner[index]] == region]
+            return index, np.nan_to_num(
+                geometry.distance2(x, x0[index], x1[index]), nan=np.inf)
+
+        if not self.rasterized:
+            return paths.find_nearest(point, region)
+        index, d2 = distance2(self.radius)
+        if len(index) == 0 or np.isinf(d2).all():
+            return paths.find_nearest(point, region)
+        # the nearest segment may be outside the window, as far as the
+        # nearest found in it, and the rasterized segments are off by up to a
+        # pixel
+        nearest = np.sqrt(d2.min()) * self.scale
+        if np.ceil(nearest + 1) > self.radius:
+            index, d2 = distance2(int(np.ceil(nearest + 1)))
+        return paths.paths[owner[index[np.argmin(d2)]]]
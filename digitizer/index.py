@@ -0,0 +1,285 @@
+"""
+An index of the series in all the pages of a document, to find where a
+series appears.
+
+    python -m digitizer.index thesis.pdf
+    python -m digitizer.index thesis.pdf --style stroke=#1f77b4
+
+A series is the paths with the same style, or with the same style and the
+same shape, e.g. the markers of a scatter plot. The pages are loaded in
+parallel, and merged into the index as they finish, so that the pages done
+so far can be queried while the others are loading.
+"""
+import argparse
+import collections
+import concurrent.futures
+import sys
+import threading
+import numpy as np
+
+try:
+    from . import core
+except ImportError:
+    import core
+
+
+Occurrence = collections.namedtuple('Occurrence', ['page', 'region', 'index'])
+
+
+def summarize_page(pdf, page, backend='drawings', cache_dir=None):
+    """
+    The styles, shapes and regions of the paths in a page, which is small
+    enough to be sent from the worker processes.
+    """
+    if cache_dir is not None:
+        try:
+            from . import cache
+        except ImportError:
+            import cache
+        paths = cache.GeometryCache(cache_dir).load_page(
+            pdf, page, backend=backend)
+    else:
+        paths = core.load_page(pdf, page, backend=backend)
+    return {'styles': paths.styles, 'style_id': paths.style_id,
+            'signature': paths.shape_signature(),
+            'region_id': paths.region_id, 'regions': paths.regions}
+
+
+class DocumentIndex:
+    """
+    Index of the series in the pages of pdf.
+
+    jobs: the number of worker processes. If 0, the pages are loaded in
+        this process by build().
+
+    with DocumentIndex(pdf) as index:
+        index.start()
+        index.find(style={'stroke': '#1f77b4'})  # the pages done so far
+        index.wait()
+        index.find(style={'stroke': '#1f77b4'})  # all the pages
+    """
+    def __init__(self, pdf, backend='drawings', jobs=None, cache_dir=None):
+        self.pdf = pdf
+        self.backend = backend
+        self.jobs = jobs
+        self.cache_dir = cache_dir
+        self.n_pages = core.n_pages(pdf)
+        # the styles in the whole document
+        self.styles = []
+        self._style_ids = {}
+        # (style, signature) -> list of Occurrence
+        self._series = collections.defaultdict(list)
+        # page -> regions
+        self.regions = {}
+        self.failed = {}
+        self._lock = threading.Lock()
+        # notified when a page started in the workers is merged or failed,
+        # since the futures are done before their callbacks merge them
+        self._merged = threading.Condition(threading.Lock())
+        self._n_started = 0
+        self._n_merged = 0
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add_page(self, page, summary):
+        """
+        Merge the summary of a page into the index
+        """
+        with self._lock:
+            ids = []
+            for style in summary['styles']:
+                if style not in self._style_ids:
+                    self._style_ids[style] = len(self.styles)
+                    self.styles.append(style)
+                ids.append(self._style_ids[style])
+            style_id = np.array(ids + [0], dtype=np.int64)[
+                summary['style_id']]
+            key = np.stack([style_id,
+                            summary['signature'].view(np.int64),
+                            summary['region_id'].astype(np.int64)], axis=1)
+            unique, inverse = np.unique(key, axis=0, return_inverse=True)
+            index = core._index_by(inverse.reshape(-1), len(unique))
+            for (style, signature, region), idx in zip(
+                    unique.tolist(), index):
+                self._series[style, signature % 2**64].append(
+                    Occurrence(page, region, idx))
+            self.regions[page] = summary['regions']
+
+    def _pages(self, pages):
+        return range(self.n_pages) if pages is None else pages
+
+    def build(self, pages=None):
+        """
+        Index the pages in this process
+        """
+        for page in self._pages(pages):
+            try:
+                summary = summarize_page(
+                    self.pdf, page, self.backend, self.cache_dir)
+            except Exception as e:
+                with self._lock:
+                    self.failed[page] = e
+                continue
+            self.add_page(page, summary)
+
+    def start(self, pages=None):
+        """
+        Start indexing the pages in the worker processes, from the first
+        page. Returns immediately.
+        """
+        if self.jobs == 0:
+            self.build(pages)
+            return
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.jobs, initializer=core.set_cache_size, initargs=(1, 1))
+        for page in self._pages(pages):
+            future = self._executor.submit(
+                summarize_page, self.pdf, page, self.backend, self.cache_dir)
+            with self._merged:
+                self._n_started += 1
+            future.add_done_callback(
+                lambda future, page=page: self._on_done(page, future))
+
+    def _on_done(self, page, future):
+        try:
+            if future.cancelled():
+                return
+            try:
+                summary = future.result()
+            except Exception as e:
+                with self._lock:
+                    self.failed[page] = e
+                return
+            self.add_page(page, summary)
+        finally:
+            with self._merged:
+                self._n_merged += 1
+                self._merged.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the pages started to be merged into the index. Returns True
+        if all of them are done.
+        """
+        with self._merged:
+            return self._merged.wait_for(
+                lambda: self._n_merged >= self._n_started, timeout)
+
+    @property
+    def pages_done(self):
+        """
+        The pages indexed so far
+        """
+        with self._lock:
+            return sorted(self.regions)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _style_matches(self, style, exact=False):
+        if style is None:
+            return None
+        style = core._normalize_style(style)
+        if exact:
+            return {self._style_ids[style]} if style in self._style_ids \
+                else set()
+        items = set(style)
+        return {i for i, s in enumerate(self.styles) if items <= set(s)}
+
+    def find(self, style=None, shape=None, exact=False):
+        """
+        Where the series appears in the pages indexed so far.
+
+        style: a dict of the style, matching the paths having all of its
+            items, or only those having exactly the style if exact is True.
+            Any style if None.
+        shape: the shape signature of the paths, as Paths.shape_signature.
+            Any shape if None.
+        Returns a list of Occurrence(page, region, index) sorted by the page
+        and the region, where index is the indices of the paths in the
+        page.
+        """
+        with self._lock:
+            styles = self._style_matches(style, exact)
+            found = collections.defaultdict(list)
+            for (s, signature), occurrences in self._series.items():
+                if styles is not None and s not in styles:
+                    continue
+                if shape is not None and signature != int(shape):
+                    continue
+                for occurrence in occurrences:
+                    found[occurrence.page, occurrence.region].append(
+                        occurrence.index)
+        return [Occurrence(page, region, np.sort(np.concatenate(index)))
+                for (page, region), index in sorted(found.items())]
+
+    def find_series(self, paths, path, shape=False):
+        """
+        Where the series of path in paths, a page of this document, appears.
+        If shape is True, only the paths having the same shape are included.
+        """
+        signature = paths.shape_signature()[path.index] if shape else None
+        return self.find(dict(paths.styles[path.style_id]), signature,
+                         exact=True)
+
+    def series(self):
+        """
+        A list of (style dict, shape signature, pages, number of paths) of
+        all the series indexed so far, from the most common one.
+        """
+        with self._lock:
+            result = [
+                (dict(self.styles[s]), signature,
+                 sorted({o.page for o in occurrences}),
+                 sum(len(o.index) for o in occurrences))
+                for (s, signature), occurrences in self._series.items()]
+        return sorted(result, key=lambda r: -r[3])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m digitizer.index',
+        description='Find where the series appear in a pdf file.')
+    parser.add_argument('pdf')
+    parser.add_argument('--style', nargs='*', default=None,
+                        metavar='KEY=VALUE',
+                        help='list the pages of the series with this style')
+    parser.add_argument('--shape', default=None,
+                        help='the shape signature in hex, as listed')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='the number of processes')
+    parser.add_argument('--backend', choices=core.BACKENDS,
+                        default='drawings')
+    parser.add_argument('--cache-dir', default=None,
+                        help='use the geometry cache in this directory')
+    args = parser.parse_args(argv)
+
+    with DocumentIndex(args.pdf, args.backend, args.jobs,
+                       args.cache_dir) as index:
+        index.start()
+        index.wait()
+        for page, error in sorted(index.failed.items()):
+            print('page {} failed: {}'.format(page, error), file=sys.stderr)
+        if args.style is None and args.shape is None:
+            for style, signature, pages, n in index.series():
+                print('{:>8} paths  {:016x}  pages {}  {}'.format(
+                    n, signature, ','.join(map(str, pages)),
+                    ' '.join('{}={}'.format(*item) for item in style.items())))
+            return 0
+        style = dict(s.split('=', 1) for s in args.style or [])
+        shape = None if args.shape is None else int(args.shape, 16)
+        for page, region, idx in index.find(style, shape):
+            print('page {} figure {}: {} paths'.format(page, region, len(idx)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+A local service digitizing pdf files for several clients, e.g. notebooks
+and scripts, which share the opened documents and the loaded pages.
+
+    python -m digitizer.server --port 8765 --root papers/
+    curl 'http://127.0.0.1:8765/pages?pdf=paper.pdf'
+    curl -d '{"pdf": "paper.pdf", "page": 2, "point": [100, 200]}' \
+        http://127.0.0.1:8765/nearest
+
+Each endpoint takes the query parameters of GET or a json object of POST,
+and returns a json object,
+
+    /pages    pdf -> n_pages
+    /page     pdf, page -> n_paths, styles with the number of their paths,
+              regions
+    /nearest  pdf, page, point, k=1, figure -> paths, a list of
+              index, style, bbox and distance
+    /group    pdf, page, point or index, shape=false, figure -> index
+    /extract  pdf and the spec of batch -> pages, a list of
+              page, path, x and y
+
+The pdf files are relative to the root directory, and outside of it are
+refused. All the positions are in the page coordinate as in batch, and the
+missing values are NaN as Python's json. Nothing is fetched from the
+network, and the service listens only on the local host by default.
+"""
+import argparse
+import concurrent.futures
+import http.server
+import inspect
+import json
+import os
+import sys
+import threading
+import urllib.parse
+import numpy as np
+
+try:
+    from . import core, batch
+except ImportError:
+    import core
+    import batch
+
+
+class RequestError(ValueError):
+    """
+    An invalid request, answered with the status
+    """
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _number(value, type=float):
+    try:
+        return type(value)
+    except (TypeError, ValueError):
+        raise RequestError('not a number: {!r}'.format(value))
+
+
+def _point(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    if np.shape(value) != (2, ):
+        raise RequestError('point must be [x, y]')
+    return np.array([_number(v) for v in value])
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def _numbers(value, n, name):
+    if isinstance(value, str):
+        value = value.split(',')
+    if np.shape(value) != (n, ):
+        raise RequestError('{} must be {} numbers'.format(name, n))
+    return [_number(v) for v in value]
+
+
+def _spec(spec):
+    """
+    The spec of batch with its values checked, so that an invalid spec is
+    refused rather than failing in the extraction
+    """
+    spec = dict(spec)
+    pages = spec.get('page', 0)
+    spec['page'] = _number(pages, int) if np.ndim(pages) == 0 else [
+        _number(page, int) for page in pages]
+    if spec.get('figure') is not None:
+        spec['figure'] = _number(spec['figure'], int)
+    if spec.get('region') is not None:
+        spec['region'] = _numbers(spec['region'], 4, 'region')
+    if spec.get('point') is not None:
+        spec['point'] = _point(spec['point']).tolist()
+    if spec.get('style') is not None and not isinstance(spec['style'], dict):
+        raise RequestError('style must be an object')
+    for key in ('group', 'marker'):
+        if key in spec:
+            spec[key] = _flag(spec[key])
+    decimate = spec.get('decimate')
+    if isinstance(decimate, str) and ',' in decimate:
+        decimate = decimate.split(',')
+    if decimate is not None:
+        spec['decimate'] = _number(decimate) if np.ndim(decimate) == 0 \
+            else _numbers(decimate, 2, 'decimate')
+    if 'min_confidence' in spec:
+        spec['min_confidence'] = _number(spec['min_confidence'])
+    calibration = spec.get('calibration')
+    if calibration and calibration != 'auto':
+        if not isinstance(calibration, dict):
+            raise RequestError('calibration must be an object or "auto"')
+        try:
+            core.Calibration.from_dict(calibration)
+        except (TypeError, ValueError, KeyError, IndexError) as e:
+            raise RequestError('invalid calibration: {}'.format(e))
+    return spec
+
+
+# the number of the locks shared by the pages
+_N_LOCKS = 64
+
+
+class Service:
+    """
+    The queries of the endpoints, which run in a pool of worker threads
+    sharing the pages loaded by core, or by the geometry cache if cache_dir
+    is given.
+
+    root: the directory of the pdf files
+    jobs: the number of the worker threads
+    """
+    endpoints = ('pages', 'page', 'nearest', 'group', 'extract')
+
+    def __init__(self, root='.', backend='drawings', jobs=None,
+                 cache_dir=None, timeout=None):
+        self.root = os.path.realpath(root)
+        self.backend = backend
+        self.timeout = timeout
+        self._load_page = core.load_page
+        if cache_dir is not None:
+            try:
+                from . import cache
+            except ImportError:
+                import cache
+            self._load_page = cache.GeometryCache(cache_dir).load_page
+        self._executor = concurrent.futures.ThreadPoolExecutor(jobs)
+        # the locks of the pages, since a Paths is not thread-safe. A page
+        # uses one of them by its hash, so that they are bounded however
+        # many pages are served
+        self._locks = [threading.Lock() for _ in range(_N_LOCKS)]
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def call(self, endpoint, params):
+        """
+        Run the endpoint with params in a worker thread and returns its
+        result
+        """
+        if endpoint not in self.endpoints:
+            raise RequestError('unknown endpoint {!r}'.format(endpoint), 404)
+        method = getattr(self, endpoint)
+        try:
+            inspect.signature(method).bind(**params)
+        except TypeError as e:
+            # unknown or missing parameters
+            raise RequestError(str(e))
+        future = self._executor.submit(method, **params)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            raise RequestError('timed out', 503)
+
+    def _pdf(self, pdf):
+        path = os.path.realpath(os.path.join(self.root, str(pdf)))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise RequestError('{} is outside of the root'.format(pdf), 403)
+        if not os.path.isfile(path):
+            raise RequestError('{} is not found'.format(pdf), 404)
+        return path
+
+    def _paths(self, pdf, page):
+        """
+        The Paths of the page and its lock
+        """
+        pdf = self._pdf(pdf)
+        page = _number(page, int)
+        if not 0 <= page < core.n_pages(pdf):
+            raise RequestError('page {} is not in {}'.format(page, pdf))
+        lock = self._locks[hash((pdf, page)) % len(self._locks)]
+        return self._load_page(pdf, page, backend=self.backend), lock
+
+    def pages(self, pdf):
+        return {'n_pages': core.n_pages(self._pdf(pdf))}
+
+    def page(self, pdf, page):
+        paths, lock = self._paths(pdf, page)
+        with lock:
+            counts = np.bincount(paths.style_id, minlength=len(paths.styles))
+            return {'n_paths': len(paths.paths),
+                    'styles': [dict(style, n_paths=int(n)) for style, n in
+                               zip(paths.styles, counts)],
+                    'regions': paths.regions.tolist()}
+
+    def nearest(self, pdf, page, point, k=1, figure=None):
+        paths, lock = self._paths(pdf, page)
+        point = _point(point)
+        region = None if figure is None else _number(figure, int)
+        with lock:
+            found = paths.find_k_nearest(
+                paths._to_inch(point), _number(k, int), region)
+            return {'paths': [
+                {'index': p.index, 'style': dict(paths.styles[p.style_id]),
+                 'bbox': paths.bbox[p.index].tolist(),
+                 'distance': float(np.sqrt(p.distance2(point)))}
+                for p in found]}
+
+    def group(self, pdf, page, point=None, index=None, shape=False,
+              figure=None):
+        paths, lock = self._paths(pdf, page)
+        shape = _flag(shape)
+        with lock:
+            if index is not None:
+                index = _number(index, int)
+                if not 0 <= index < len(paths.paths):
+                    raise RequestError('no path {}'.format(index))
+                group = paths.group_index(
+                    paths.paths[index], shape=shape,
+                    region=None if figure is None else _number(figure, int))
+            elif point is not None:
+                spec = {'point': _point(point).tolist(), 'group': True,
+                        'marker': shape}
+                if figure is not None:
+                    spec['figure'] = _number(figure, int)
+                group = batch.select(paths, spec)
+            else:
+                raise RequestError('point or index is required')
+            return {'index': np.asarray(group).tolist()}
+
+    def extract(self, pdf, **spec):
+        """
+        batch.process of the pages loaded in this service
+        """
+        spec = _spec(spec)
+        pages = spec['page']
+        if np.ndim(pages) == 0:
+            pages = [pages]
+        results = []
+        for page in pages:
+            paths, lock = self._paths(pdf, page)
+            with lock:
+                page_spec = spec
+                if spec.get('calibration') == 'auto':
+                    page_spec = dict(spec, calibration=batch._auto_calibration(
+                        paths, paths.source[0], page, spec))
+                index, x, y = batch.extract(paths, page_spec)
+            results.append({'page': int(page), 'path': index.tolist(),
+                            'x': x.tolist(), 'y': y.tolist()})
+        return {'pages': results}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def _respond(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _call(self, params):
+        endpoint = urllib.parse.urlsplit(self.path).path.strip('/')
+        try:
+            self._respond(200, self.server.service.call(endpoint, params))
+        except RequestError as e:
+            self._respond(e.status, {'error': str(e)})
+        except Exception as e:
+            # errors in the endpoints, not in the request
+            self._respond(500, {'error': repr(e)})
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        self._call({k: v[-1] for k, v in query.items()})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self._respond(400, {'error': 'invalid json: {}'.format(e)})
+            return
+        if not isinstance(params, dict):
+            self._respond(400, {'error': 'a json object is required'})
+            return
+        self._call(params)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class DigitizerServer(http.server.ThreadingHTTPServer):
+    """
+    The http server of service
+
+        server = DigitizerServer(('127.0.0.1', 8765), Service('papers'))
+        server.serve_forever()
+    """
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        super().__init__(address, _Handler)
+        self.service = service
+        self.verbose = verbose
+
+    def server_close(self):
+        super().server_close()
+        self.service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m digitizer.server',
+        description='Serve the digitizer to the local clients.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--root', default='.',
+                        help='the directory of the pdf files')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='the number of worker threads')
+    parser.add_argument('--backend', choices=core.BACKENDS,
+                        default='drawings')
+    parser.add_argument('--cache-dir', default=None,
+                        help='use the geometry cache in this directory')
+    parser.add_argument('--documents', type=int, default=None,
+                        help='the number of the documents kept open')
+    parser.add_argument('--pages', type=int, default=None,
+                        help='the number of the pages kept loaded')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds allowed for each request')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    core.set_cache_size(documents=args.documents, pages=args.pages)
+    service = Service(args.root, args.backend, args.jobs, args.cache_dir,
+                      args.timeout)
+    server = DigitizerServer((args.host, args.port), service, args.verbose)
+    print('serving {} on http://{}:{}'.format(
+        service.root, *server.server_address[:2]), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from .. import autocalibrate
+
+
+filename = '../example_pdfs/test_figure1.pdf'
+
+
+@pytest.mark.parametrize('text, value', [
+    ('0.5', 0.5), ('−1', -1), ('1e3', 1000), ('10^3', 1000),
+    ('10^{-2}', 0.01), ('$10^{-2}$', 0.01), ('10³', 1000),
+    ('10⁻²', 0.01), ('x', None), ('1.2.3', None), ('', None)])
+def test_parse_number(text, value):
+    assert autocalibrate.parse_number(text) == value
+
+
+def test_fit_axis():
+    positions = np.array([10, 20, 30, 40])
+    fit = autocalibrate.fit_axis(positions, [1, 10, 100, 1000])
+    assert fit.scale == 'log'
+    assert np.allclose(fit.slope * positions + fit.intercept, [0, 1, 2, 3])
+    assert autocalibrate.fit_axis(positions, [0, 1, 2, 3]).scale == 'linear'
+
+    # minus signs are lost
+    fit = autocalibrate.fit_axis(positions, [1, 0, 1, 2])
+    assert (fit.values == [-1, 0, 1, 2]).all()
+    fit = autocalibrate.fit_axis(positions, [1, 0, 1, 2], increasing=False)
+    assert (fit.values == [1, 0, -1, -2]).all()
+    assert fit.confidence == pytest.approx(0.6)
+
+
+def test_calibrate():
+    result = autocalibrate.calibrate_page(filename, 0)
+    assert result.confidence > 0.7
+    assert result.x.scale == result.y.scale == 'linear'
+    assert np.allclose(result.x.values, np.linspace(-1, 1, 9))
+    assert np.allclose(result.y.values, np.linspace(1, -0.2, 7))
+    # the ticks are mapped to their labels
+    ticks = np.stack([result.x.ticks[:7], result.y.ticks], axis=1)
+    assert np.allclose(result.calibration.transform(ticks),
+                       np.stack([result.x.values[:7], result.y.values], 1),
+                       atol=1e-4)
+
+    # no axis in the region
+    result = autocalibrate.calibrate_page(filename, 0, region=[0, 0, 10, 10])
+    assert result.calibration is None
+    assert result.confidence == 0
+
+
+def test_labels():
+    labels = autocalibrate.load_labels(filename, 0)
+    assert len(labels.value) == len(labels.bbox) == len(labels.text) == 16
+    blocks = [{'lines': [{'spans': [
+        {'size': 10, 'chars': [
+            {'c': c, 'bbox': (x, 0, x + 5, 10)}
+            for x, c in zip([0, 5], '10')]},
+        {'size': 7, 'chars': [
+            {'c': c, 'bbox': (x, -3, x + 3, 5)}
+            for x, c in zip([10, 13], '−2')]},
+        {'size': 10, 'chars': [
+            {'c': c, 'bbox': (x, 0, x + 5, 10)}
+            for x, c in zip([30, 35, 40], ' 5a')]}]}]}]
+    labels = autocalibrate.labels_from_text(blocks)
+    assert labels.text == ['10^−2']
+    assert labels.value == pytest.approx([0.01])
+    assert np.allclose(labels.bbox, [[0, -3, 16, 10]])
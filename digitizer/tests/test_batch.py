@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+import csv
+import json
+import multiprocessing
+import shutil
+import signal
+import time
+from .. import core, batch
+
+
+filename = '../example_pdfs/test_figure1.pdf'
+
+
+def test_select():
+    paths = core.load_page(filename, 0)
+    point = paths.centers[np.argmax(paths.size2)]
+    i = paths.find_nearest(paths._to_inch(point)).index
+    assert (batch.select(paths, {'point': point.tolist()}) == [i]).all()
+
+    group = batch.select(paths, {'point': point.tolist(), 'group': True})
+    assert [paths.paths[j] for j in group] == paths.group(paths.paths[i])
+
+    style = dict(paths.styles[paths.style_id[i]])
+    by_style = batch.select(paths, {'style': style})
+    assert (by_style == group).all()
+
+    region = paths.bbox[i]
+    assert i in batch.select(paths, {'region': region.tolist(),
+                                     'style': style})
+    assert len(batch.select(paths, {'region': [0, 0, 0.1, 0.1]})) == 0
+    assert (batch.select(paths, {'figure': 0, 'style': style}) ==
+            by_style).all()
+    assert len(batch.select(paths, {'figure': 1, 'style': style})) == 0
+
+
+def test_select_point():
+    # the same paths as the gui picks
+    paths = core.load_page('../example_pdfs/1908.10464.pdf', 4)
+    rng = np.random.RandomState(0)
+    region = int(np.argmax([len(i) for i in paths.region_index]))
+    for point in paths.centers[rng.choice(len(paths.paths), 20)] + 0.5:
+        expected = paths.find_nearest(paths._to_inch(point))
+        assert batch.select(paths, {'point': point.tolist()}).tolist() == [
+            expected.index]
+        expected = paths.hit_buffer.find_nearest(
+            paths._to_inch(point), region)
+        assert batch.select(paths, {'point': point.tolist(),
+                                    'figure': region}).tolist() == [
+            expected.index]
+        # the nearest one of the style
+        style = dict(paths.styles[expected.style_id])
+        [i] = batch.select(paths, {'point': point.tolist(), 'style': style})
+        assert paths.style_id[i] == expected.style_id
+
+
+def test_extract():
+    paths = core.load_page(filename, 0)
+    spec = {'point': paths.centers[np.argmax(paths.size2)].tolist()}
+    i = batch.select(paths, spec)[0]
+    index, x, y = batch.extract(paths, spec)
+    assert (index == i).all()
+    assert np.allclose(np.stack([x, y], axis=1), paths.paths[i].abs_path)
+
+    spec.update(marker=True, calibration={
+        'x': [[0, 0], [1, 2]], 'y': [[0, 1], [1, 10]], 'yscale': 'log'})
+    index, x, y = batch.extract(paths, spec)
+    assert np.allclose(x, 2 * paths.centers[i, 0])
+    assert np.allclose(y, 10**paths.centers[i, 1])
+
+
+@pytest.mark.parametrize('jobs', [0, 2])
+def test_run_csv(tmp_path, jobs):
+    pdfs = tmp_path / 'pdfs'
+    pdfs.mkdir()
+    for name in ['a.pdf', 'b.pdf']:
+        shutil.copy(filename, str(pdfs / name))
+    (pdfs / 'broken.pdf').write_text('not a pdf')
+    spec = {'page': 0, 'style': {'stroke': '#1f77b4'}}
+
+    output = str(tmp_path / 'out.csv')
+    failed = batch.run(batch.find_pdfs([str(pdfs)]), spec, output,
+                       jobs=jobs, progress=None)
+    assert list(failed) == [str(pdfs / 'broken.pdf')]
+
+    paths = core.load_page(filename, 0)
+    _, x, y = batch.extract(paths, spec)
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2 * len(x)
+    assert np.allclose([float(r['x']) for r in rows[:len(x)]], x)
+
+
+def _stuck(pdf, *args):
+    if pdf.endswith('stuck.pdf'):
+        # as the native code, which ignores SIGALRM
+        signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+        time.sleep(60)
+    return _process(pdf, *args)
+
+
+_process = batch.process
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='the workers need the patched process')
+def test_run_overdue(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'process', _stuck)
+    monkeypatch.setattr(batch, '_GRACE', 0.5)
+    stuck = str(tmp_path / 'stuck.pdf')
+    shutil.copy(filename, stuck)
+    output = str(tmp_path / 'out.csv')
+    start = time.monotonic()
+    failed = batch.run([stuck, filename], {'page': 0}, output, jobs=2,
+                       timeout=1.0, progress=None)
+    assert time.monotonic() - start < 30
+    assert list(failed) == [stuck]
+    assert isinstance(failed[stuck], TimeoutError)
+    assert multiprocessing.active_children() == []
+
+
+def test_main_npz(tmp_path):
+    spec = tmp_path / 'spec.json'
+    spec.write_text(json.dumps({'page': [0], 'marker': True}))
+    output = str(tmp_path / 'out.npz')
+    assert batch.main([filename, filename, '--spec', str(spec), '-o', output,
+                       '-j', '1', '--timeout', '60', '-q']) == 0
+    paths = core.load_page(filename, 0)
+    with np.load(output) as data:
+        assert sorted(data.keys()) == [
+            'metadata', 'test_figure1-1_p0_path', 'test_figure1-1_p0_x',
+            'test_figure1-1_p0_y',
+            'test_figure1_p0_path', 'test_figure1_p0_x', 'test_figure1_p0_y']
+        assert np.allclose(data['test_figure1_p0_x'], paths.centers[:, 0],
+                           equal_nan=True)
+
+
+def test_auto_calibration():
+    spec = {'style': {'stroke': '#1f77b4'}, 'calibration': 'auto'}
+    [(page, index, x, y)] = batch.process(filename, spec)
+    assert x.min() >= -1.1 and x.max() <= 1.1
+    assert y.min() >= -0.3 and y.max() <= 1.1
+
+    spec['min_confidence'] = 0.9
+    with pytest.raises(ValueError):
+        batch.process(filename, spec)
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+import os
+import shutil
+from .. import core, cache
+
+
+filename = '../example_pdfs/test_figure1.pdf'
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # the pages loaded in memory are not read from the disk
+    core.clear_cache()
+    yield
+    core.clear_cache()
+
+
+@pytest.mark.parametrize('backend', core.BACKENDS)
+def test_round_trip(tmp_path, backend):
+    geometry_cache = cache.GeometryCache(str(tmp_path / 'cache'))
+    assert geometry_cache.load(filename, 0, backend) is None
+    expected = geometry_cache.load_page(filename, 0, backend)
+    actual = geometry_cache.load(filename, 0, backend)
+    assert actual is not None
+    # memory-mapped read-only
+    assert not actual.vertices.flags.writeable
+    assert actual.source == (filename, 0)
+
+    assert np.allclose(actual.vertices, expected.vertices)
+    assert (actual.offsets == expected.offsets).all()
+    assert (actual.style_id == expected.style_id).all()
+    assert np.allclose(actual.bbox, expected.bbox, equal_nan=True)
+    assert actual.styles == expected.styles
+    for p0, p1 in zip(actual.paths[:10], expected.paths[:10]):
+        assert p0.attributes.get('stroke') == p1.attributes.get('stroke')
+    point = expected.centers[np.isfinite(expected.centers).all(axis=1)][0]
+    assert actual.find_nearest(point).index == \
+        expected.find_nearest(point).index
+
+    # the same Paths while it is in memory
+    assert geometry_cache.load_page(filename, 0, backend) is expected
+    core.clear_cache()
+    assert geometry_cache.load_page(filename, 0, backend) is not expected
+
+    # float32 is a separate entry
+    assert geometry_cache.load(filename, 0, backend, np.float32) is None
+    assert len(geometry_cache.entries()) == 1
+
+
+def test_key(tmp_path):
+    geometry_cache = cache.GeometryCache(str(tmp_path / 'cache'))
+    geometry_cache.load_page(filename, 0)
+    # identical content shares the entry
+    pdf = str(tmp_path / 'copy.pdf')
+    shutil.copy(filename, pdf)
+    assert geometry_cache.load(pdf, 0) is not None
+
+    # so do the curve tolerance, also given by core.CURVE_TOLERANCE
+    assert geometry_cache.load(pdf, 0, curve_tolerance=0.5) is None
+    tolerance = core.CURVE_TOLERANCE
+    core.CURVE_TOLERANCE = 0.5
+    try:
+        assert geometry_cache.load(pdf, 0) is None
+    finally:
+        core.CURVE_TOLERANCE = tolerance
+    assert geometry_cache.load(pdf, 0, curve_tolerance=tolerance) is not None
+
+    # parser updates invalidate the entry
+    version = core.PARSER_VERSION
+    core.PARSER_VERSION += 1
+    try:
+        assert geometry_cache.load(pdf, 0) is None
+    finally:
+        core.PARSER_VERSION = version
+
+
+def test_evict_purge(tmp_path):
+    geometry_cache = cache.GeometryCache(str(tmp_path / 'cache'))
+    geometry_cache.load_page(filename, 0, 'drawings')
+    entry = geometry_cache.entries()[0]
+    os.utime(entry['path'], (0, 0))
+    geometry_cache.load_page(filename, 0, 'svg')
+    entries = geometry_cache.entries()
+    assert [e['backend'] for e in entries] == ['drawings', 'svg']
+    assert geometry_cache.size() == sum(e['size'] for e in entries)
+
+    geometry_cache.evict(geometry_cache.size() - 1)
+    assert [e['backend'] for e in geometry_cache.entries()] == ['svg']
+
+    geometry_cache.purge(filename)
+    assert geometry_cache.entries() == []
+    geometry_cache.load_page(filename, 0)
+    cache.main(['--dir', geometry_cache.directory, 'info'])
+    cache.main(['--dir', geometry_cache.directory, 'purge'])
+    assert geometry_cache.entries() == []
+
+
+def test_size_estimate(tmp_path):
+    geometry_cache = cache.GeometryCache(str(tmp_path / 'cache'))
+    geometry_cache.load_page(filename, 0, 'drawings')
+    geometry_cache.load_page(filename, 0, 'svg')
+    assert geometry_cache._estimated_size() == geometry_cache.size()
+
+    # the least recently used entry is removed when the estimate exceeds
+    geometry_cache.max_size = geometry_cache.size()
+    os.utime(geometry_cache.entries()[0]['path'], (0, 0))
+    geometry_cache.load_page(filename, 0, 'drawings', np.float32)
+    assert len(geometry_cache.entries()) == 2
+    assert geometry_cache._estimated_size() == geometry_cache.size()
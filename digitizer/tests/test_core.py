@@ -1,6 +1,10 @@
 import numpy as np
 import pytest
+import concurrent.futures
 import os
+import time
+import json
+import shutil
 import fitz
 from .. import core
 
@@ -9,19 +13,19 @@ filename = '../example_pdfs/test_figure1.pdf'
 # filename2 = '../example_pdfs/1908.10464.pdf'
 filename2 = '../example_pdfs/example2.pdf'
 
-def test_to_svg():
-    with open('test.svg', 'w') as f:
+def test_to_svg(tmp_path):
+    with open(str(tmp_path / 'test.svg'), 'w') as f:
         f.write(core._to_svg(filename, page=0))
-    with open('test_svg.txt', 'w') as f:
+    with open(str(tmp_path / 'test_svg.txt'), 'w') as f:
         f.write(core._to_svg(filename, page=0))
     
-    pix_doc = fitz.open("test.svg")
+    pix_doc = fitz.open(str(tmp_path / 'test.svg'))
     pix = pix_doc.getPagePixmap(0)
-    pix.writePNG("test.png")
+    pix.writePNG(str(tmp_path / 'test.png'))
 
 
-def test_to_svg2():
-    with open('test2.svg', 'w') as f:
+def test_to_svg2(tmp_path):
+    with open(str(tmp_path / 'test2.svg'), 'w') as f:
         f.write(core._to_svg(filename2, page=2))
 
 
@@ -36,16 +40,413 @@ def test_distance():
         else:
             print(path.abs_path)
 
-def test_selected():
+def test_selected(tmp_path):
     paths = core.Paths(core._to_svg(filename, page=0))
     path = paths.find_nearest([200, 130])
-    with open('test_append.svg', 'w') as f:
+    with open(str(tmp_path / 'test_append.svg'), 'w') as f:
         f.write(paths.appended_svd(path))
 
-def test_group():
+def test_group(tmp_path):
     paths = core.Paths(core._to_svg(filename, page=0))
     path = paths.find_nearest([200, 130])
     paths.group(path)
-    with open('test_append2.svg', 'w') as f:
+    with open(str(tmp_path / 'test_append2.svg'), 'w') as f:
         f.write(paths.appended_svd(path))
 
+
+def test_find_k_nearest():
+    paths = core.Paths(core._to_svg(filename, page=0))
+    point = np.array([2.0, 1.5])
+    nearest = paths.find_k_nearest(point, k=3)
+    distances = [p.distance2(paths._from_inch(point)) for p in paths.paths]
+    expected = np.argsort(np.where(np.isnan(distances), np.inf, distances))
+    assert [paths.paths.index(p) for p in nearest] == list(expected[:3])
+    assert nearest[0] is paths.find_nearest(point)
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_store(dtype):
+    paths = core.Paths(core._to_svg(filename, page=0), dtype=dtype)
+    assert paths.vertices.dtype == dtype
+    assert len(paths.offsets) == len(paths.paths) + 1
+    for path in paths.paths:
+        abs_path = path.abs_path
+        if len(abs_path) == 0:
+            assert path.size2 == 0
+            continue
+        assert np.allclose(path.center, 0.5 * (
+            np.max(abs_path, axis=0) + np.min(abs_path, axis=0)))
+        assert path.is_inside(np.min(abs_path, axis=0), np.max(abs_path, axis=0))
+
+@pytest.mark.parametrize(('d', 'expected'), [
+    ('M 1.0 2.0 L 3.0 4.0', [[1, 2], [3, 4]]),
+    ('M1,2L3,4', [[1, 2], [3, 4]]),
+    ('M1-2l3-4-1.5.5', [[1, -2], [4, -6], [2.5, -5.5]]),
+    ('M1 2H3V4h1v1Z', [[1, 2], [3, 2], [3, 4], [4, 4], [4, 5], [1, 2]]),
+    ('M0 0 1 1 2 0', [[0, 0], [1, 1], [2, 0]]),
+    ('m1 1 1 1zm1 0 1 1', [[1, 1], [2, 2], [1, 1], [2, 1], [3, 2]]),
+    ('M0 0C1 1 2 1 3 0S5-1 6 0', [[0, 0], [3, 0], [6, 0]]),
+    ('M0 0Q1 1 2 0T4 0t2 0', [[0, 0], [2, 0], [4, 0], [6, 0]]),
+    ('M0 0A1 1 0 011 1a1 1 0 1 0 1 1', [[0, 0], [1, 1], [2, 2]]),
+    ('M1e1 2E-1', [[10, 0.2]]),
+    ('', np.zeros((0, 2))),
+])
+def test_parse_path_data(d, expected):
+    assert np.allclose(core._parse_path_data(d), expected)
+
+
+@pytest.mark.parametrize(('transform', 'x', 'expected'), [
+    ('matrix(1,0,0,-1,0,10)', [1, 2], [1, 8]),
+    ('matrix(0 1 -1 0 0 0)', [1, 2], [-2, 1]),
+    ('translate(1) scale(2, 3)', [1, 2], [3, 6]),
+    ('scale(2) translate(1, 1)', [1, 2], [4, 6]),
+    ('rotate(90, 1, 1)', [2, 1], [1, 2]),
+])
+def test_compute_abs_path(transform, x, expected):
+    d = 'M{} {}'.format(*x)
+    assert np.allclose(core._compute_abs_path(d, transform), [expected])
+
+
+def test_compute_abs_paths():
+    ds = ['M1 2L3 4', '', 'M1,1', 'm1 1 1 1z']
+    transforms = ['matrix(2,0,0,2,0,0)', '', None, 'translate(1, 1) scale(2)']
+    vertices, offsets = core._compute_abs_paths(ds, transforms)
+    assert np.allclose(offsets, [0, 2, 2, 3, 6])
+    for i, (d, t) in enumerate(zip(ds, transforms)):
+        assert np.allclose(
+            vertices[offsets[i]:offsets[i + 1]],
+            core._compute_abs_path(d, t).reshape(-1, 2))
+    assert np.allclose(vertices, [[2, 4], [6, 8], [1, 1],
+                                  [3, 3], [5, 5], [3, 3]])
+
+
+
+@pytest.mark.parametrize('tolerance', [1.0, 0.1, 0.01])
+def test_flatten(tolerance):
+    from .. import geometry
+    d = 'M0 0C0 10 10 10 10 0q5 -5 10 0'
+    transform = 'matrix(2,0,0,2,1,1)'
+    vertices = core._compute_abs_path(d, transform, tolerance)
+    # the curves sampled densely
+    t = np.linspace(0, 1, 201)[:, np.newaxis]
+    cubic = (3 * (1 - t)**2 * t * [0, 10] + 3 * (1 - t) * t**2 * [10, 10] +
+             t**3 * [10, 0])
+    quadratic = 2 * (1 - t) * t * [15, -5] + (1 - t)**2 * [10, 0] + \
+        t**2 * [20, 0]
+    exact = np.concatenate([cubic, quadratic]) * 2 + 1
+    distance = geometry.distance2(
+        exact[:, np.newaxis], vertices[:-1], vertices[1:]).min(axis=1)
+    assert np.sqrt(distance.max()) <= tolerance
+    # the end points are kept
+    assert np.allclose(vertices[[0, -1]], [[1, 1], [41, 1]])
+    assert len(vertices) < len(core._compute_abs_path(
+        d, transform, tolerance / 4))
+    assert len(core._compute_abs_path(d, transform, np.inf)) == 3
+
+    # the drawings of PyMuPDF
+    drawing = {'items': [('c', (0, 0), (0, 10), (10, 10), (10, 0))],
+               'color': (0, 0, 0)}
+    paths = core.Paths.from_drawings([drawing], curve_tolerance=tolerance)
+    assert np.allclose(paths.vertices, core._compute_abs_path(
+        'M0 0C0 10 10 10 10 0', None, tolerance))
+
+
+@pytest.mark.parametrize('backend', core.BACKENDS)
+def test_load_page(backend):
+    paths = core.load_page(filename, 0, backend=backend)
+    assert len(paths.paths) > 0
+    point = np.array([2.0, 1.5])
+    path = paths.find_nearest(point)
+    # the both backends find the same marker
+    expected = core.load_page(filename, 0, backend='svg').find_nearest(point)
+    assert np.allclose(path.center, expected.center, atol=1e-3)
+    assert path in paths.group(path)
+    assert paths.svg.startswith('<svg')
+
+
+def test_close_subpath(tmp_path):
+    pdf = str(tmp_path / 'subpaths.pdf')
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=200)
+    shape = page.new_shape()
+    shape.draw_polyline([(10, 10), (50, 10), (50, 50)])
+    shape.draw_polyline([(100, 100), (150, 100), (150, 150)])
+    shape.finish(color=(0, 0, 0), closePath=True)
+    shape.commit()
+    doc.save(pdf)
+    # closed to the start of the second subpath, not of the drawing
+    expected = core.load_page(pdf, 0, backend='svg').vertices
+    assert np.allclose(expected[-1], [100, 100])
+    paths = core.load_page(pdf, 0, backend='drawings')
+    assert np.allclose(paths.vertices, expected)
+
+    # older PyMuPDF sets closePath rather than adding the closing line
+    with fitz.open(pdf) as doc:
+        [drawing] = doc[0].get_drawings()
+    drawing = dict(drawing, items=drawing['items'][:-1], closePath=True)
+    paths = core.Paths.from_drawings([drawing])
+    assert np.allclose(paths.vertices, expected)
+
+
+def test_load_page_invalid_backend():
+    with pytest.raises(ValueError):
+        core.load_page(filename, 0, backend='png')
+
+
+def test_stream(tmp_path):
+    svg = core._to_svg(filename, page=0)
+    expected = core.Paths(svg)
+    fname = tmp_path / 'test.svg'
+    fname.write_text(svg)
+    with open(fname) as f:
+        paths = core.Paths(
+            f, stream=True, memory_limit=1000, chunk_size=100)
+    assert paths.svg is None
+    assert paths.d == [None] * len(paths.paths)
+    assert np.allclose(paths.vertices, expected.vertices)
+    assert np.allclose(paths.offsets, expected.offsets)
+    assert np.allclose(paths.style_id, expected.style_id)
+    assert paths.styles == expected.styles
+
+    point = np.array([2.0, 1.5])
+    assert (paths.find_nearest(point).index ==
+            expected.find_nearest(point).index)
+    # svg is generated from the source
+    paths.source = (filename, 0)
+    assert paths.svg == svg
+
+
+def test_cache(tmp_path):
+    core.clear_cache()
+    pdf = str(tmp_path / 'test.pdf')
+    shutil.copy(filename, pdf)
+    assert core.n_pages(pdf) == 1
+    paths = core.load_page(pdf, 0)
+    assert core.load_page(pdf, 0) is paths
+    assert core.load_page(pdf, 0, backend='svg') is not paths
+    assert core._to_svg(pdf, 0) is core._to_svg(pdf, 0)
+    assert len(core._documents) == 1
+
+    # modified files are read again
+    stat = os.stat(pdf)
+    os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert core.load_page(pdf, 0) is not paths
+    assert len(core._documents) == 2
+
+    core.set_cache_size(documents=1, pages=1)
+    assert len(core._documents) == 1
+    assert len(core._pages) == 1
+    core.clear_cache()
+    assert len(core._documents) == 0
+    core.set_cache_size(documents=4, pages=16)
+
+
+def test_cache_stream(tmp_path):
+    core.clear_cache()
+    paths = core.load_page(filename, 0, backend='svg', stream=True)
+    assert not any(key[-1] == 'svg' for key in core._pages._items)
+    assert paths.d[0] is None
+
+
+def test_cache_threads(monkeypatch):
+    core.clear_cache()
+    loaded = []
+
+    def load_page(*args, **kwargs):
+        loaded.append(args)
+        time.sleep(0.1)
+        return object()
+
+    monkeypatch.setattr(core, '_load_page', load_page)
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        pages = list(executor.map(
+            lambda _: core.load_page(filename, 0), range(4)))
+    assert len(loaded) == 1
+    assert all(page is pages[0] for page in pages)
+    assert core._loading == {}
+    core.clear_cache()
+
+
+def test_lru_cache():
+    evicted = []
+    cache = core._LRUCache(2, on_evict=evicted.append)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert evicted == [2]
+    assert 'a' in cache and 'c' in cache
+    assert cache.get('b') is None
+
+
+def test_normalize_style():
+    assert core._normalize_style(
+        {'stroke': '#F00', 'stroke-width': '.50', 'fill': 'rgb(0, 0, 255)',
+         'stroke-dasharray': '1.0,2'}) == core._normalize_style(
+        {'style': 'stroke: red; stroke-width: 0.5', 'fill': '#0000ff',
+         'stroke-dasharray': '1 2'})
+    assert core._normalize_style({'fill': 'none', 'id': 'a'}) == (
+        ('fill', 'none'), ('id', 'a'))
+
+
+def test_style_index():
+    paths = core.Paths.from_arrays(
+        np.arange(10).reshape(5, 2), [0, 1, 2, 3, 4, 5],
+        [{'stroke': '#000000'}, {'stroke': '#ff0000'}, {'stroke': 'black'},
+         {'stroke': '#FF0000', 'stroke-width': '1.0'},
+         {'stroke': '#f00', 'stroke-width': '1'}])
+    assert len(paths.styles) == 3
+    assert [p.index for p in paths.group(paths.paths[2])] == [0, 2]
+    assert [p.index for p in paths.group(paths.paths[4])] == [3, 4]
+    assert [(i, n) for i, n, _ in paths.style_groups()] == [
+        (0, 2), (2, 2), (1, 1)]
+    assert paths.style_groups()[-1][2] == {'stroke': '#ff0000'}
+
+    paths = core.load_page(filename, 0)
+    for i, n, style in paths.style_groups():
+        assert sum(paths.style_id == i) == n
+
+
+def test_profile(tmp_path):
+    core.clear_cache()
+    core.reset_profile()
+    core.load_page(filename, 0, backend='svg')
+    assert core.profile_report() == {}
+
+    core.enable_profiling(memory=True)
+    try:
+        core.clear_cache()
+        paths = core.load_page(filename, 0, backend='svg')
+        paths.find_nearest([2.0, 1.5])
+    finally:
+        core.disable_profiling()
+    report = core.profile_report()
+    for stage in ['load_page', 'to_svg', 'parse_svg', 'compute_abs_paths']:
+        assert report[0][stage]['count'] == 1
+    assert report[None]['find_nearest']['count'] == 1
+    assert report[0]['load_page']['total'] >= report[0]['parse_svg']['total']
+    assert report[0]['load_page']['peak_memory'] >= \
+        report[0]['parse_svg']['peak_memory'] > 0
+    assert 'parse_svg' in core.format_profile()
+
+    core.save_trace(str(tmp_path / 'trace.json'))
+    with open(str(tmp_path / 'trace.json')) as f:
+        trace = json.load(f)
+    assert len(trace['traceEvents']) == sum(
+        s['count'] for stages in report.values() for s in stages.values())
+    core.reset_profile()
+
+
+def test_shape_signature():
+    square = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+    triangle = np.array([[0, 0], [1, 0], [0.5, 1], [0, 0]])
+    distorted = square + [[0, 0], [0.002, 0], [0, 0], [0, 0], [0, 0]]
+    shapes = [square + [3, 4], triangle, distorted + [10, 2],
+              triangle + [5, 5], square * 2, np.zeros((0, 2)), square]
+    vertices = np.concatenate(shapes)
+    offsets = np.cumsum([0] + [len(s) for s in shapes])
+    styles = [{'fill': '#000000'}] * 6 + [{'fill': '#ff0000'}]
+    paths = core.Paths.from_arrays(vertices, offsets, styles)
+
+    signature = paths.shape_signature()
+    assert signature[0] == signature[2] == signature[6]
+    assert signature[1] == signature[3]
+    assert len(set(signature[[0, 1, 4, 5]].tolist())) == 4
+    assert paths.shape_signature(tolerance=1e-4)[0] != \
+        paths.shape_signature(tolerance=1e-4)[2]
+
+    assert [p.index for p in paths.group(paths.paths[0])] == [0, 1, 2, 3, 4, 5]
+    assert [p.index for p in paths.group(paths.paths[0], shape=True)] == [0, 2]
+    assert np.allclose(paths.group_centers(paths.paths[1]),
+                       [[0.5, 0.5], [5.5, 5.5]])
+
+
+def test_series():
+    paths = core.load_page(filename, 0)
+    for series in paths.series_index:
+        assert len(set(paths.style_id[series].tolist())) == 1
+        assert len(set(np.diff(paths.offsets)[series].tolist())) == 1
+    assert sum(len(s) for s in paths.series_index) == len(paths.paths)
+
+
+def test_regions():
+    # two figures side by side on a background, and a line of text
+    def rect(x0, y0, x1, y1):
+        return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]])
+
+    shapes = [rect(0, 0, 300, 120), rect(10, 10, 110, 110),
+              rect(170, 10, 270, 110),
+              np.array([[10, 100], [60, 50], [110, 20]]),
+              np.array([[170, 100], [220, 50], [270, 20]]),
+              rect(50, 50, 52, 52), rect(200, 40, 202, 42),
+              np.array([[10, 300], [250, 300]])]
+    vertices = np.concatenate(shapes).astype(float)
+    offsets = np.cumsum([0] + [len(s) for s in shapes])
+    styles = [{'fill': '#ffffff'}] * 3 + [{'stroke': '#ff0000'}] * 2 + [
+        {'fill': '#0000ff'}] * 2 + [{'stroke': '#000000'}]
+    paths = core.Paths.from_arrays(vertices, offsets, styles)
+
+    assert np.allclose(paths.frames(), [[10, 10, 110, 110],
+                                        [170, 10, 270, 110]])
+    assert (paths.region_id == [-1, 0, 1, 0, 1, 0, 1, 2]).all()
+    assert np.allclose(paths.regions[:2], [[10, 10, 110, 110],
+                                           [170, 10, 270, 110]])
+    assert paths.region_at(np.array([100, 100]) / 72) == 0
+    assert paths.region_at(np.array([140, 200]) / 72) is None
+
+    assert len(paths.group(paths.paths[3])) == 2
+    region = paths.region_at(np.array([200, 100]) / 72)
+    assert region == 1
+    assert [p.index for p in paths.group(paths.paths[4], region=region)] == [4]
+    assert [p.index for p in paths.group(
+        paths.paths[4], shape=True, region=region)] == [4]
+    # the nearest path in the region
+    assert paths.find_nearest(np.array([100, 30]) / 72, region).index == 2
+    assert paths.find_inside([0, 0], [5, 2], region).index == 2
+    # the other queries are not limited
+    assert paths.find_nearest(np.array([100, 30]) / 72).index == 3
+    assert paths.find_inside([0, 0], [5, 2]).index == 0
+
+
+def test_regions_page():
+    paths = core.load_page('../example_pdfs/1908.10464.pdf', 4)
+    assert len(paths.frames()) == 3
+    # the subplots are separated, even though their lines are not clipped
+    for frame in paths.frames():
+        i = paths.region_at(paths._to_inch(0.5 * (frame[:2] + frame[2:])))
+        center = paths.centers[paths.region_index[i]]
+        assert np.mean(np.all((frame[:2] - paths.region_margin <= center) &
+                              (center <= frame[2:] + paths.region_margin),
+                              axis=-1)) > 0.9
+
+
+def test_calibration():
+    calibration = core.Calibration.from_axes(
+        [(10, 0), (110, 1)], [(200, 1), (100, 100)], yscale='log')
+    assert np.allclose(calibration.transform([[10, 200], [60, 150]]),
+                       [[0, 1], [0.5, 10]])
+    points = np.random.RandomState(0).uniform(0, 300, size=(1000, 2))
+    assert np.allclose(calibration.inverse(calibration.transform(points)),
+                       points)
+    # only x axis
+    assert np.allclose(core.Calibration.from_axes(
+        [(10, 0), (110, 1)], None).transform([60, 150]), [0.5, 150])
+    with pytest.raises(ValueError):
+        core.Calibration.from_axes([(10, 0), (10, 1)], [(0, 0), (1, 1)])
+
+    # rotated and skewed axes
+    matrix = np.array([[0.5, 0.2], [-0.1, 1.5]])
+    real = points[:3] @ matrix + [1, 2]
+    calibration = core.Calibration.from_points(points[:3], real)
+    assert np.allclose(calibration.transform(points), points @ matrix + [1, 2])
+    assert np.allclose(calibration.inverse(calibration.transform(points)),
+                       points)
+    with pytest.raises(ValueError):
+        core.Calibration.from_points([[0, 0], [1, 1], [2, 2]], real)
+
+    restored = core.Calibration.from_dict(
+        json.loads(json.dumps(calibration.to_dict())))
+    assert restored == calibration
+    assert core.Calibration.from_dict(
+        {'pic': points[:3].tolist(), 'real': real.tolist()}) == restored
+    with pytest.raises(ValueError):
+        core.Calibration(xscale='symlog')
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from .. import core, batch, decimate, geometry
+
+
+def _rdp(points, tolerance):
+    """
+    The recursive implementation for reference
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+    d2 = geometry.distance2(points[1:-1], points[0], points[-1])
+    i = np.argmax(d2) + 1
+    if d2[i - 1] <= tolerance**2:
+        return [0, len(points) - 1]
+    left = _rdp(points[:i + 1], tolerance)
+    right = _rdp(points[i:], tolerance)
+    return left[:-1] + [j + i for j in right]
+
+
+def _spectrum(n, seed=0):
+    rng = np.random.RandomState(seed)
+    x = np.linspace(0, 10, n)
+    y = np.sin(3 * x) + np.exp(-(x - 5)**2 / 0.01) + 0.01 * rng.randn(n)
+    return np.stack([x, y], axis=1)
+
+
+@pytest.mark.parametrize('tolerance', [0.001, 0.05, 0.5])
+def test_rdp(tolerance):
+    points = _spectrum(2000)
+    kept = decimate.rdp(points, tolerance)
+    assert kept.tolist() == _rdp(points, tolerance)
+
+    # several polylines at once
+    offsets = [0, 500, 500, 501, 2000]
+    kept = decimate.rdp(points, tolerance, offsets)
+    expected = [0, 500] + [j + 501 for j in _rdp(points[501:], tolerance)]
+    expected = _rdp(points[:500], tolerance) + expected[1:]
+    assert kept.tolist() == expected
+
+
+def test_rdp_anisotropic():
+    points = _spectrum(1000) * [1000, 1]
+    kept = decimate.rdp(points, (1000 * 0.05, 0.05))
+    assert kept.tolist() == _rdp(points / [1000, 1], 0.05)
+
+
+def test_minmax():
+    points = _spectrum(10000)
+    kept = decimate.minmax(points, 100)
+    assert len(kept) <= 400
+    assert kept[0] == 0 and kept[-1] == len(points) - 1
+    assert (np.diff(kept) > 0).all()
+    # the envelope is preserved
+    assert points[kept, 1].max() == points[:, 1].max()
+    assert points[kept, 1].min() == points[:, 1].min()
+
+    kept = decimate.minmax(points, 100, [0, 10, 10000])
+    assert set(range(10)) <= set(kept.tolist())
+
+
+def test_level_of_detail():
+    points = _spectrum(5000)
+    lod = decimate.LevelOfDetail(points, 0.001, [0, 2500, 5000])
+    sizes = [len(index) for index in lod.indices]
+    assert sizes[0] == 5000 and sizes[-1] == 4
+    assert (np.diff(sizes) < 0).all()
+    vertices, offsets = lod[1]
+    assert offsets.tolist() == [0, np.searchsorted(lod.indices[1], 2500),
+                                sizes[1]]
+    assert lod.level_for(5000) == 0
+    assert sizes[lod.level_for(100)] <= 100
+
+
+def test_paths_decimated():
+    points = _spectrum(30000) * [50, 20]
+    paths = core.Paths.from_arrays(
+        points, [0, 30000], [{'stroke': '#000000'}])
+    [v] = paths.decimated([0], 1000)
+    assert 2 <= len(v) <= 1000
+    assert np.isin(v, points).all()
+    [v] = paths.decimated([0], 30000)
+    assert len(v) == 30000
+
+    svg = paths.overlay_svg(paths.paths[0])
+    assert svg.count(' L ') < paths.overlay_max_vertices
+
+
+def test_extract_decimate():
+    paths = core.load_page('../example_pdfs/test_figure1.pdf', 0)
+    spec = {'style': {'stroke': '#1f77b4'}}
+    index, x, y = batch.extract(paths, spec)
+    spec['decimate'] = 1.0
+    index_d, x_d, y_d = batch.extract(paths, spec)
+    assert len(x_d) < len(x)
+    assert set(index_d) == set(index)
+    assert np.isin(x_d, x).all()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from .. import export
+
+
+series = {'data': {'x': np.linspace(0, 1, 5), 'y': np.arange(5.0)},
+          'fit': {'x': np.array([0.5]), 'y': np.array([2.0])}}
+metadata = {'calibration': {'matrix': [[1, 0], [0, 1]], 'offset': [0, 0],
+                            'xscale': 'linear', 'yscale': 'log'}}
+
+
+@pytest.mark.parametrize('name, module', [
+    ('out.npz', None), ('out', None), ('out.csv', None),
+    ('out.h5', 'h5py'), ('out.parquet', 'pyarrow'), ('out.arrow', 'pyarrow')])
+def test_roundtrip(tmp_path, name, module):
+    if module is not None:
+        pytest.importorskip(module)
+    filename = str(tmp_path / name)
+    if name == 'out':
+        # a directory of npy files
+        filename += '/'
+    export.export(filename, series, metadata)
+    loaded, loaded_metadata = export.load(filename)
+    assert list(loaded) == list(series)
+    for key, columns in series.items():
+        for column, value in columns.items():
+            assert np.allclose(loaded[key][column], value)
+    if not name.endswith('.csv'):
+        assert loaded_metadata == metadata
+    if name == 'out':
+        assert isinstance(loaded['data']['x'], np.memmap)
+
+
+def test_text(tmp_path):
+    filename = str(tmp_path / 'out.txt')
+    with export.open_exporter(filename, metadata) as f:
+        f.write('data', **series['data'])
+    values = np.loadtxt(filename)
+    assert np.allclose(values, np.stack(list(series['data'].values()), 1))
+
+
+def test_invalid(tmp_path):
+    with pytest.raises(ValueError):
+        export.open_exporter(str(tmp_path / 'out.xyz'))
+    with export.open_exporter(str(tmp_path / 'out.npz')) as f:
+        f.write('data', x=[0, 1], y=[0, 1])
+        with pytest.raises(ValueError):
+            f.write('data', x=[0, 1], y=[0, 1])
+        with pytest.raises(ValueError):
+            f.write('other', x=[0, 1], y=[0])
+    assert 'npz' in export.available_formats()
+
+
+def test_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'CHUNK_ROWS', 2)
+    filename = str(tmp_path / 'out.csv')
+    export.export(filename, series)
+    loaded, _ = export.load(filename)
+    assert np.allclose(loaded['data']['y'], series['data']['y'])
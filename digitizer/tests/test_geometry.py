@@ -13,3 +13,36 @@ def test_distance2(x0, x1, x, distance_squared):
     x = np.array(x)
     assert np.allclose(geometry.distance2(x, x0, x1), distance_squared)
 
+
+
+def test_distance2_broadcast():
+    rng = np.random.RandomState(0)
+    x0 = rng.randn(30, 2)
+    x1 = rng.randn(30, 2)
+    x = rng.randn(5, 2)
+    actual = geometry.distance2(x[:, np.newaxis], x0, x1)
+    assert actual.shape == (5, 30)
+    for i in range(5):
+        for j in range(30):
+            # brute force along the segment
+            t = np.linspace(0, 1, 10001)[:, np.newaxis]
+            dx = x0[j] + t * (x1[j] - x0[j]) - x[i]
+            expected = np.min(np.sum(dx**2, axis=-1))
+            assert np.allclose(actual[i, j], expected, atol=1e-6)
+
+
+def test_project():
+    x0 = np.array([[0, 0], [0, 0], [1, 1]])
+    x1 = np.array([[2, 0], [0, 2], [1, 1]])
+    t, x = geometry.project([1, 1], x0, x1)
+    assert np.allclose(t, [0.5, 0.5, 0])
+    assert np.allclose(x, [[1, 0], [0, 1], [1, 1]])
+    assert np.allclose(
+        geometry.distance2([1, 1], x), geometry.distance2([1, 1], x0, x1))
+
+
+def test_k_nearest():
+    x0 = np.array([[0, 0], [0, 3], [0, 1], [0, 2]])
+    idx, d2 = geometry.k_nearest([0, 0.9], x0, k=2)
+    assert np.allclose(idx, [2, 0])
+    assert np.allclose(d2, [0.01, 0.81])
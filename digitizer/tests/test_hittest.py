@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from .. import core, hittest
+
+
+@pytest.mark.parametrize('filename, page', [
+    ('../example_pdfs/test_figure1.pdf', 0),
+    ('../example_pdfs/1908.10464.pdf', 4)])
+@pytest.mark.parametrize('dpi', [36, 72, 150])
+def test_find_nearest(filename, page, dpi):
+    paths = core.load_page(filename, page)
+    buffer = hittest.HitBuffer(paths, dpi=dpi, radius=4)
+    assert buffer.rasterized
+    assert len(buffer._outside) == 0
+
+    rng = np.random.RandomState(0)
+    xmin, xmax = np.nanmin(paths.bbox[:, :2], axis=0), np.nanmax(
+        paths.bbox[:, 2:], axis=0)
+    points = xmin + rng.uniform(size=(50, 2)) * (xmax - xmin)
+    # points on the paths
+    vertices = paths.vertices[np.isfinite(paths.vertices).all(axis=1)]
+    points = np.concatenate(
+        [points, vertices[rng.randint(len(vertices), size=50)] + 0.3])
+    for point in points / 72:
+        expected = paths.find_nearest(point)
+        found = buffer.find_nearest(point)
+        assert np.isclose(expected.distance2(point * 72),
+                          found.distance2(point * 72))
+
+
+def test_region():
+    paths = core.load_page('../example_pdfs/1908.10464.pdf', 4)
+    region = int(np.argmax([len(i) for i in paths.region_index]))
+    center = paths.regions[region].reshape(2, 2).mean(axis=0) / 72
+    found = paths.hit_buffer.find_nearest(center, region)
+    assert paths.region_id[found.index] == region
+    assert found.index == paths.find_nearest(center, region).index
+    assert paths.hit_buffer is paths.hit_buffer
+
+
+@pytest.mark.parametrize('page_box', [None, [0, 0, 600, 800]])
+def test_off_page(page_box):
+    # a path far beyond the page
+    vertices = [[-20000, -20000], [20000, 20000],
+                [100, 100], [200, 100], [100, 300], [100, 400]]
+    paths = core.Paths.from_arrays(
+        vertices, [0, 2, 4, 6], [{'stroke': '#000000'}] * 3)
+    paths.page_box = page_box
+    buffer = hittest.HitBuffer(paths)
+    assert buffer.rasterized == (page_box is not None)
+    for point in [(150, 101), (100, 350), (5, 6), (300, 290)]:
+        point = np.array(point) / 72
+        assert (buffer.find_nearest(point).index ==
+                paths.find_nearest(point).index)
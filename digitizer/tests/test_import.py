@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+
+# seconds allowed to import a module after numpy, which all of them need
+IMPORT_BUDGET = 0.5
+HEAVY = ['fitz', 'pymupdf', 'PyQt5', 'matplotlib', 'urllib.request']
+
+_SCRIPT = """
+import json, sys, time
+import numpy
+loaded = set(sys.modules)
+start = time.perf_counter()
+import {module}
+print(json.dumps({{
+    'time': time.perf_counter() - start,
+    'heavy': [m for m in {heavy!r} if m in set(sys.modules) - loaded]}}))
+"""
+
+
+def _measure(module):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    script = _SCRIPT.format(module=module, heavy=HEAVY)
+    # the first run compiles the modules
+    for _ in range(2):
+        output = subprocess.run(
+            [sys.executable, '-c', script], cwd=root, check=True,
+            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+@pytest.mark.parametrize('module', [
+    'digitizer', 'digitizer.core', 'digitizer.batch', 'digitizer.index',
+    'digitizer.export', 'digitizer.cache'])
+def test_headless_import(module):
+    result = _measure(module)
+    assert result['heavy'] == []
+    assert result['time'] < IMPORT_BUDGET
@@ -0,0 +1,62 @@
+import time
+import pytest
+from .. import core, batch, index
+
+
+filename = '../example_pdfs/test_figure1.pdf'
+
+
+@pytest.mark.parametrize('jobs', [0, 2])
+def test_document_index(jobs):
+    paths = core.load_page(filename, 0)
+    style = {'stroke': '#1f77b4'}
+    with index.DocumentIndex(filename, jobs=jobs) as doc:
+        doc.start()
+        assert doc.wait(timeout=60)
+        assert doc.pages_done == [0]
+        [found] = doc.find(style)
+        assert found.page == 0 and found.region == 0
+        assert (found.index == batch.select(paths, {'style': style})).all()
+
+        path = paths.paths[found.index[0]]
+        [series] = doc.find_series(paths, path, shape=True)
+        assert (series.index == paths.group_index(path, shape=True)).all()
+        [series] = doc.find_series(paths, path)
+        assert (series.index == paths.group_index(path)).all()
+        # only the explicit filter matches the paths having more items
+        assert doc.find(style, exact=True) == []
+
+        assert sum(len(o.index) for o in doc.find()) == len(paths.paths)
+        assert sum(s[3] for s in doc.series()) == len(paths.paths)
+        assert doc.find({'stroke': '#123456'}) == []
+
+
+def test_incremental():
+    doc = index.DocumentIndex(filename, jobs=0)
+    assert doc.find() == []
+    doc.build(pages=[0])
+    assert doc.pages_done == [0]
+    doc.build(pages=[5])
+    assert list(doc.failed) == [5]
+
+
+def test_wait_merged(monkeypatch):
+    add_page = index.DocumentIndex.add_page
+
+    def delayed(self, page, summary):
+        # the callback merging a page runs after its future is done
+        if page == 1:
+            time.sleep(0.5)
+        add_page(self, page, summary)
+
+    monkeypatch.setattr(index.DocumentIndex, 'add_page', delayed)
+    with index.DocumentIndex('../example_pdfs/1908.10464.pdf',
+                             jobs=2) as doc:
+        doc.start(pages=[0, 1, 2])
+        assert doc.wait(timeout=60)
+        assert doc.pages_done == [0, 1, 2]
+
+
+def test_main(capsys):
+    assert index.main([filename, '-j', '0', '--style', 'stroke=#1f77b4']) == 0
+    assert capsys.readouterr().out.startswith('page 0 figure 0:')
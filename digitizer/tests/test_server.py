@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pytest
+from .. import core, batch, server
+
+
+root = '../example_pdfs'
+filename = 'test_figure1.pdf'
+
+
+@pytest.fixture(scope='module')
+def url():
+    httpd = server.DigitizerServer(
+        ('127.0.0.1', 0), server.Service(root, jobs=2))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(url, endpoint, params=None, query=''):
+    data = None if params is None else json.dumps(params).encode()
+    try:
+        with urllib.request.urlopen(
+                '{}/{}{}'.format(url, endpoint, query), data) as f:
+            return f.status, json.load(f)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_pages(url):
+    assert request(url, 'pages', query='?pdf=' + filename) == (
+        200, {'n_pages': 1})
+    status, body = request(url, 'page', {'pdf': filename, 'page': 0})
+    paths = core.load_page(os.path.join(root, filename), 0)
+    assert status == 200
+    assert body['n_paths'] == len(paths.paths)
+    assert sum(s['n_paths'] for s in body['styles']) == len(paths.paths)
+    assert np.allclose(body['regions'], paths.regions)
+
+
+def test_nearest_group(url):
+    paths = core.load_page(os.path.join(root, filename), 0)
+    point = paths.centers[np.argmax(paths.size2)] + 1
+    expected = paths.find_k_nearest(paths._to_inch(point), 3)
+    status, body = request(url, 'nearest', {
+        'pdf': filename, 'page': 0, 'point': point.tolist(), 'k': 3})
+    assert status == 200
+    assert [p['index'] for p in body['paths']] == [
+        p.index for p in expected]
+
+    status, body = request(url, 'group', query='?pdf={}&page=0&point={}'
+                           .format(filename, '{},{}'.format(*point)))
+    assert status == 200
+    assert body['index'] == batch.select(
+        paths, {'point': point.tolist(), 'group': True}).tolist()
+
+
+def test_extract_query(url):
+    # the values of GET are strings
+    point = core.load_page(os.path.join(root, filename), 0).centers[0] + 1
+    status, body = request(url, 'extract', query='?pdf={}&point={},{}'
+                           '&decimate=0.5'.format(filename, *point))
+    assert status == 200
+    # an index for each of the vertices kept
+    assert np.unique(body['pages'][0]['path']).tolist() == batch.select(
+        core.load_page(os.path.join(root, filename), 0),
+        {'point': point.tolist()}).tolist()
+
+
+def test_group_figure(url):
+    paths = core.load_page(os.path.join(root, filename), 0)
+    index = int(np.flatnonzero(paths.region_id == 0)[0])
+    status, body = request(url, 'group', {
+        'pdf': filename, 'page': 0, 'index': index, 'figure': 1})
+    assert status == 200
+    assert body['index'] == []
+    status, body = request(url, 'group', {
+        'pdf': filename, 'page': 0, 'index': index, 'figure': 0})
+    assert body['index'] == paths.group_index(
+        paths.paths[index], region=0).tolist()
+
+
+def test_extract(url):
+    spec = {'page': 0, 'style': {'stroke': '#1f77b4'},
+            'calibration': {'x': [[0, 0], [1, 2]], 'y': [[0, 1], [1, 10]]}}
+    status, body = request(url, 'extract', dict(spec, pdf=filename))
+    assert status == 200
+    [(page, index, x, y)] = batch.process(os.path.join(root, filename), spec)
+    [result] = body['pages']
+    assert result['page'] == page
+    assert result['path'] == index.tolist()
+    assert np.allclose(result['x'], x)
+
+
+@pytest.mark.parametrize('endpoint, params, status', [
+    ('unknown', {}, 404),
+    ('pages', {'pdf': '../digitizer/core.py'}, 403),
+    ('pages', {'pdf': 'missing.pdf'}, 404),
+    ('page', {'pdf': filename, 'page': 5}, 400),
+    ('nearest', {'pdf': filename, 'page': 0, 'point': [1]}, 400),
+    ('nearest', {'pdf': filename, 'page': 0}, 400),
+    ('group', {'pdf': filename, 'page': 0}, 400),
+    ('pages', {'pdf': filename, 'page': 0}, 400),
+    # invalid specs
+    ('extract', {'pdf': filename, 'calibration': {'x': 1}}, 400),
+    ('extract', {'pdf': filename, 'calibration': 'linear'}, 400),
+    ('extract', {'pdf': filename, 'decimate': 'fine'}, 400),
+    ('extract', {'pdf': filename, 'point': 'a,b'}, 400),
+    ('extract', {'pdf': filename, 'page': [0, 'last']}, 400),
+    ('extract', {'pdf': filename, 'region': [0, 0, 1]}, 400),
+])
+def test_errors(url, endpoint, params, status):
+    code, body = request(url, endpoint, params)
+    assert code == status
+    assert 'error' in body
+
+
+def test_locks():
+    service = server.Service(root, jobs=1)
+    try:
+        _, lock = service._paths(filename, 0)
+        assert service._paths(filename, 0)[1] is lock
+        for _ in range(10):
+            service._paths(filename, 0)
+        # not growing with the pages served
+        assert len(service._locks) == server._N_LOCKS
+    finally:
+        service.close()
+
+
+def test_cache_dir(tmp_path):
+    core.clear_cache()
+    service = server.Service(root, jobs=1, cache_dir=str(tmp_path))
+    try:
+        # the pages read from the disk are shared by the requests
+        assert service._paths(filename, 0)[0] is service._paths(
+            filename, 0)[0]
+    finally:
+        service.close()
+        core.clear_cache()